@@ -51,6 +51,10 @@ class AIAgentConfigAdmin(admin.ModelAdmin):
         ('Parameters', {
             'fields': ('temperature', 'max_tokens')
         }),
+        ('Rate Limits', {
+            'fields': ('max_concurrent_requests', 'requests_per_minute', 'tokens_per_minute',
+                       'user_requests_per_minute', 'queue_timeout_seconds')
+        }),
         ('System Prompt', {
             'fields': ('system_prompt',),
             'classes': ('wide',)
@@ -53,6 +53,16 @@ import json
 import asyncio
 from enum import Enum
 
+from asgiref.sync import sync_to_async
+
+from users.db_router import read_replica
+from users.forecasting import get_forecasts, summarize_forecasts, DEFAULT_HORIZON
+from users.kpi_engine import build_inventory_kpis, summarize_inventory_kpis, DEFAULT_PERIOD_DAYS
+from users.metrics import observe_agent_run
+from users.replenishment import ReplenishmentPolicy, build_replenishment_plan, summarize_replenishment
+from .llm import LLMGateway, LLMRequest, LLMUnavailable, get_llm_gateway
+from .rate_limit import get_agent_limiter
+
 
 class ProcessingStage(str, Enum):
     """Processing stages of the AI agent"""
@@ -104,12 +114,13 @@ class AIReportAgent:
     Coordinates the stages of report processing
     """
     
-    def __init__(self, config=None):
+    def __init__(self, config=None, llm: Optional[LLMGateway] = None):
         """
         Initializes the agent with optional configuration
         
         Args:
             config: Agent configuration (AIAgentConfig model or dict with model, temperature, etc.)
+            llm: LLM gateway (defaults to the process-wide cached gateway)
         """
         if config and hasattr(config, 'model_name'):
             # Is an instance of the AIAgentConfig model
@@ -127,6 +138,8 @@ class AIReportAgent:
                 'temperature': 0.7,
                 'max_tokens': 2000
             }
+        self.llm = llm or get_llm_gateway()
+        self.tokens_used = 0  # Provider tokens of this agent's LLM calls (cache hits cost none)
         self.stage_handlers = {
             ProcessingStage.INTERPRETING: self._interpret_request,
             ProcessingStage.PLANNING: self._plan_analysis,
@@ -284,17 +297,15 @@ class AIReportAgent:
         # Generate different data based on report type
         report_type = state.get('report_type', 'general_analysis')
         
+        records_processed = 45230
+        
         if report_type == 'inventory_analysis':
+            inventory_kpis = await sync_to_async(self._inventory_kpi_summary)()
             state['raw_data'] = {
-                'inventory': {
-                    'total_units': 45230,
-                    'total_value_eur': 2500000,
-                    'by_country': {'DE': 15000, 'FR': 12000, 'IT': 10000, 'ES': 8230},
-                    'by_category': {'Electronics': 18000, 'Components': 16000, 'Raw Materials': 11230}
-                },
-                'sales': {'last_30_days': 125000, 'last_90_days': 385000, 'growth_rate': 0.15},
-                'warehouse': {'utilization': 0.78, 'efficiency_score': 0.94, 'locations_active': 12}
+                'inventory_kpis': inventory_kpis,
+                'replenishment': await sync_to_async(self._replenishment_summary)()
             }
+            records_processed = inventory_kpis['records']
         
         elif report_type == 'sales_performance':
             state['raw_data'] = {
@@ -312,7 +323,8 @@ class AIReportAgent:
                     'repeat_customers': 0.68,
                     'average_order_value': 1705
                 },
-                'trends': {'month_1': 0.08, 'month_2': 0.15, 'month_3': 0.23}
+                'trends': {'month_1': 0.08, 'month_2': 0.15, 'month_3': 0.23},
+                'demand': await sync_to_async(self._demand_forecast_summary)()
             }
         
         elif report_type == 'risk_analysis':
@@ -352,7 +364,7 @@ class AIReportAgent:
             }
         
         state['data_summary'] = {
-            'records_processed': 45230,
+            'records_processed': records_processed,
             'time_range': 'last_90_days',
             'data_quality': 'high',
             'missing_values': 0
@@ -376,40 +388,39 @@ class AIReportAgent:
         
         # Calculate metrics specific by type
         if report_type == 'inventory_analysis':
-            total_inventory = data['inventory']['total_value_eur']
-            inventory_turnover = data['sales']['last_90_days'] / total_inventory * 4
+            kpis = data['inventory_kpis']
+            days_of_inventory = kpis['days_of_inventory']
             
             state['analysis_results'] = {
                 'kpis': {
-                    'total_inventory_eur': f"€{total_inventory:,.0f}",
-                    'turnover_rate': f"{inventory_turnover:.1f}x",
-                    'fill_rate': "94.3%",
-                    'warehouse_utilization': f"{data['warehouse']['utilization']*100:.1f}%",
-                    'efficiency_score': f"{data['warehouse']['efficiency_score']*100:.0f}%"
+                    'total_inventory_eur': f"€{kpis['total_value']:,.0f}",
+                    'turnover_rate': f"{kpis['turnover_rate']:.1f}x",
+                    'days_of_inventory': f"{days_of_inventory:,.0f} days" if days_of_inventory is not None else "No sales",
+                    'fill_rate': f"{kpis['fill_rate']*100:.1f}%",
+                    'slow_moving_items': f"{kpis['slow_moving_items']:,}",
+                    'warehouse_coverage': f"{kpis['warehouse_coverage']*100:.1f}%"
                 },
                 'trends': {
-                    'inventory_trend': 'stable',
-                    'sales_trend': 'increasing',
-                    'efficiency_trend': 'improving'
+                    'inventory_trend': self._inventory_trend(days_of_inventory),
+                    'aging_days_avg': kpis['average_aging_days'],
+                    'abc_distribution': kpis['abc_counts']
                 },
-                'top_insights': [
-                    "Inventory distributed mainly in Germany (33%) and France (27%)",
-                    "Annual turnover rate of 8.6x indicates good stock flow",
-                    "Warehouse utilization at 78% - adequate space for growth",
-                    "Electronics category represents 40% of total inventory"
-                ]
+                'top_insights': self._inventory_insights(kpis)
             }
-            state['recommendations'] = [
-                "Consider stock redistribution to Italy and Spain to improve local coverage",
-                "Turnover rate of 8.6x is healthy - maintain current replenishment strategy",
-                "Leverage 22% free capacity to plan 15-20% growth",
-                "Implement forecasting system for Electronics - most critical category"
-            ]
+            state['analysis_results']['kpis']['reorder_positions'] = (
+                f"{data['replenishment']['positions_to_order']:,} "
+                f"({data['replenishment']['units_to_order']:,} units)"
+            )
+            state['recommendations'] = (
+                self._replenishment_recommendations(data['replenishment'])
+                + self._inventory_recommendations(kpis)
+            )
         
         elif report_type == 'sales_performance':
             total_sales = data['sales']['total_sales_eur']
             growth = data['sales']['growth_rate'] * 100
             avg_order = data['customers']['average_order_value']
+            demand = data['demand']
             
             state['analysis_results'] = {
                 'kpis': {
@@ -417,19 +428,23 @@ class AIReportAgent:
                     'growth_rate': f"{growth:.1f}%",
                     'avg_order_value': f"€{avg_order:,.0f}",
                     'repeat_customer_rate': f"{data['customers']['repeat_customers']*100:.0f}%",
-                    'total_customers': f"{data['customers']['total_customers']:,}"
+                    'total_customers': f"{data['customers']['total_customers']:,}",
+                    'demand_forecast_units': f"{demand['forecast_total']:,.0f} units / {DEFAULT_HORIZON} days",
+                    'demand_variability': f"{demand['avg_cv']:.2f} CV" if demand['avg_cv'] is not None else "No sales",
+                    'seasonal_series': f"{demand['seasonal_series']} of {demand['series']}"
                 },
                 'trends': {
                     'sales_trend': 'strong_increasing',
                     'customer_trend': 'growing',
-                    'revenue_trend': 'accelerating'
+                    'revenue_trend': 'accelerating',
+                    'top_forecast_series': demand['top_series']
                 },
                 'top_insights': [
                     f"Sales growth of {growth:.1f}% indicates strong market demand",
                     "Germany leads with €1.85M in sales (38% of total)",
                     "Online channel is the largest contributor with 43% of total sales",
                     "Repeat customer rate of 68% shows good retention"
-                ]
+                ] + self._demand_insights(demand)
             }
             state['recommendations'] = [
                 "Expand 'Premium Electronics A' line which leads in sales",
@@ -515,11 +530,13 @@ class AIReportAgent:
         - Compose executive summary
         """
         state['report_title'] = self._generate_title(state)
+        narrative = await self._ask_llm(self._build_summary_prompt(state))
         
         # Prepare report data for visualization
         state['report_data'] = {
             'executive_summary': {
                 'overview': f"Complete {state['report_type'].replace('_', ' ')} analysis completed successfully",
+                'narrative': narrative,
                 'period': 'Last 90 days',
                 'records_analyzed': state['data_summary']['records_processed'],
                 'confidence_level': '98%'
@@ -555,6 +572,148 @@ class AIReportAgent:
         
         return state
     
+    def _inventory_kpi_summary(self) -> Dict[str, Any]:
+        """Real inventory KPIs from the KPI engine (runs in a worker thread, reads the replica)"""
+        with read_replica():
+            return summarize_inventory_kpis(build_inventory_kpis(), DEFAULT_PERIOD_DAYS)
+    
+    def _replenishment_summary(self) -> Dict[str, Any]:
+        """Reorder points and order quantities from the replenishment planner (runs in a worker thread, reads the replica)"""
+        policy = ReplenishmentPolicy.from_settings()
+        with read_replica():
+            return summarize_replenishment(build_replenishment_plan(policy=policy), policy)
+    
+    @staticmethod
+    def _replenishment_recommendations(plan: Dict[str, Any]) -> List[str]:
+        """Recommendations derived from the replenishment plan"""
+        if not plan['positions_to_order']:
+            return []
+        return [
+            f"Reorder {plan['positions_to_order']:,} product/store positions at or below their reorder point "
+            f"({plan['units_to_order']:,} units, €{plan['order_value']:,.0f}) - "
+            f"{plan['lead_time_days']:.0f}-day lead time, {plan['service_level']*100:.0f}% service level"
+        ]
+    
+    def _demand_forecast_summary(self) -> Dict[str, Any]:
+        """Per SKU/store demand forecasts, served from the forecast cache (runs in a worker thread)"""
+        return summarize_forecasts(get_forecasts())
+    
+    @staticmethod
+    def _demand_insights(demand: Dict[str, Any]) -> List[str]:
+        """Insights derived from the demand forecasts"""
+        if not demand['series']:
+            return ["No sales history available to forecast demand"]
+        insights = [
+            f"Forecast demand of {demand['forecast_total']:,.0f} units over the next {DEFAULT_HORIZON} days "
+            f"across {demand['series']} SKU/store series"
+        ]
+        if demand['avg_cv'] is not None and demand['avg_cv'] > 1:
+            insights.append(f"High demand variability (average CV {demand['avg_cv']:.2f}) - "
+                            f"safety stock should be sized per series")
+        if demand['seasonal_series']:
+            insights.append(f"{demand['seasonal_series']} series show a clear weekly seasonal pattern")
+        return insights
+    
+    @staticmethod
+    def _inventory_trend(days_of_inventory: Optional[float]) -> str:
+        """Classify coverage: days of inventory against a 30-90 day healthy band"""
+        if days_of_inventory is None:
+            return 'no_demand'
+        if days_of_inventory > 90:
+            return 'overstocked'
+        if days_of_inventory < 30:
+            return 'understocked'
+        return 'stable'
+    
+    @staticmethod
+    def _top_share(breakdown: Dict[str, int]) -> Optional[tuple]:
+        """Largest entry of a breakdown and its share of the total"""
+        total = sum(breakdown.values())
+        if not total:
+            return None
+        label, units = max(breakdown.items(), key=lambda item: item[1])
+        return label, units / total * 100
+    
+    def _inventory_insights(self, kpis: Dict[str, Any]) -> List[str]:
+        """Insights derived from the inventory KPI summary"""
+        if not kpis['records']:
+            return ["No inventory records found for the selected scope"]
+        
+        insights = [
+            f"{kpis['total_units']:,} units on hand across {kpis['records']:,} product/store positions",
+            f"Annualized turnover of {kpis['turnover_rate']:.1f}x over the last {kpis['period_days']} days",
+            f"{kpis['slow_moving_items']:,} slow-moving positions "
+            f"({kpis['slow_moving_items'] / kpis['records'] * 100:.0f}% of positions)",
+            f"{kpis['abc_counts']['A']:,} A-class positions drive 80% of sales value",
+        ]
+        top_country = self._top_share(kpis['by_country'])
+        if top_country:
+            insights.append(f"Inventory concentrated in {top_country[0]} ({top_country[1]:.0f}% of units)")
+        top_category = self._top_share(kpis['by_category'])
+        if top_category:
+            insights.append(f"{top_category[0]} category represents {top_category[1]:.0f}% of units")
+        return insights
+    
+    def _inventory_recommendations(self, kpis: Dict[str, Any]) -> List[str]:
+        """Recommendations derived from the inventory KPI summary"""
+        recommendations = []
+        if kpis['slow_moving_items']:
+            recommendations.append(
+                f"Review {kpis['slow_moving_items']:,} slow-moving positions for markdown or transfer"
+            )
+        if kpis['fill_rate'] < 0.95:
+            recommendations.append(
+                f"Fill rate at {kpis['fill_rate']*100:.1f}% - replenish out-of-stock A and B class items first"
+            )
+        days_of_inventory = kpis['days_of_inventory']
+        if days_of_inventory is not None and days_of_inventory > 90:
+            recommendations.append(
+                f"{days_of_inventory:,.0f} days of inventory on hand - reduce order quantities for C-class items"
+            )
+        if kpis['warehouse_coverage'] < 0.9:
+            recommendations.append(
+                f"Only {kpis['warehouse_coverage']*100:.0f}% of stock has a warehouse location - complete slotting"
+            )
+        if not recommendations:
+            recommendations.append("Inventory levels are healthy - maintain current replenishment strategy")
+        return recommendations
+    
+    async def _ask_llm(self, prompt: str) -> Optional[str]:
+        """
+        Send a prompt through the cached LLM gateway using this agent's configuration.
+
+        None when no provider serves the agent's model: the report then has no narrative.
+        """
+        try:
+            response = await self.llm.complete(LLMRequest(
+                model_name=self.config.get('model', 'gpt-4'),
+                prompt=prompt,
+                system_prompt=self.config.get('system_prompt', ''),
+                temperature=self.config.get('temperature', 0.7),
+                max_tokens=self.config.get('max_tokens', 2000),
+            ))
+        except LLMUnavailable as e:
+            print(f"  ⚠ {e}, no narrative")
+            return None
+        if not response.cached:
+            self.tokens_used += response.total_tokens
+        print(f"  ✓ LLM response ({'cache' if response.cached else response.model_name}, "
+              f"{0 if response.cached else response.total_tokens} tokens)")
+        return response.text
+    
+    def _build_summary_prompt(self, state: AIReportState) -> str:
+        """Prompt asking the model to narrate the already computed KPIs"""
+        kpis = state['analysis_results']['kpis']
+        lines = [
+            f"Write an executive summary for a {state['report_type'].replace('_', ' ')} report.",
+            f"User request: {state['user_request']}",
+            "KPIs:",
+        ]
+        lines += [f"- {name}: {value}" for name, value in kpis.items()]
+        lines.append("Insights:")
+        lines += [f"- {insight}" for insight in state['insights']]
+        return "\n".join(lines)
+    
     def _generate_title(self, state: AIReportState) -> str:
         """Generate appropriate title for the report"""
         report_types = {
@@ -620,8 +779,12 @@ async def process_ai_request(user_request: str, user_id: str, session_id: str, a
         
     Returns:
         Final state with generated report
+        
+    Raises:
+        RateLimitExceeded: the agent's concurrency or rate limits could not admit the request
     """
     agent = AIReportAgent(agent_config)
+    limiter = get_agent_limiter(agent_config)
     
     initial_state = AIReportState(
         user_request=user_request,
@@ -643,4 +806,13 @@ async def process_ai_request(user_request: str, user_id: str, session_id: str, a
         errors=[]
     )
     
-    return await agent.process_request(initial_state)
+    if limiter is None:
+        state = await agent.process_request(initial_state)
+    else:
+        async with limiter.limit(user_id, tokens=agent.config.get('max_tokens', 0)) as admission:
+            try:
+                state = await agent.process_request(initial_state)
+            finally:
+                admission.used_tokens = agent.tokens_used
+    observe_agent_run(state)
+    return state
@@ -0,0 +1,419 @@
+"""
+LLM gateway for the AI Reports agent
+
+Single entry point used by AIReportAgent to talk to language models.
+
+RESPONSIBILITIES:
+-----------------
+1. Client abstraction  → one `complete()` call regardless of provider
+2. Response cache      → keyed by (model_name, temperature, system_prompt, prompt)
+3. Request coalescing  → identical prompts in flight share one provider call
+4. Local fake model    → deterministic responses for tests and offline use
+                         (CLIENT='fake' only: 'auto' never substitutes it for
+                         a missing provider, see LLMUnavailable)
+
+CACHE BACKENDS:
+---------------
+- memory: in-process LRU with TTL (per worker)
+- sqlite: on-disk LRU with TTL, shared by every worker on the host
+
+Configure through `settings.AI_REPORTS_LLM` (see settings.py).
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, asdict, replace
+from typing import Any, Callable, Dict, Optional
+
+from users.metrics import LLM_CACHE_REQUESTS, LLM_TOKENS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class LLMRequest:
+    """Prompt sent to a model"""
+    model_name: str
+    prompt: str
+    system_prompt: str = ''
+    temperature: float = 0.7
+    max_tokens: int = 2000
+
+    def cache_key(self) -> str:
+        """Stable hash of the fields that determine the model output"""
+        payload = json.dumps(
+            [self.model_name, round(float(self.temperature), 4), self.system_prompt, self.prompt],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+@dataclass(frozen=True)
+class LLMResponse:
+    """Completion returned by a model (or by the cache)"""
+    text: str
+    model_name: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency_ms: float = 0.0
+    cached: bool = False
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)"""
+    return max(1, len(text) // 4) if text else 0
+
+
+# ============================================
+# Clients
+# ============================================
+
+class LLMUnavailable(Exception):
+    """No provider is configured for the model (CLIENT='auto' without its API key)"""
+
+
+class BaseLLMClient:
+    """Provider client interface"""
+    name = 'base'  # Part of the cache key: responses of different clients never mix
+
+    async def complete(self, request: LLMRequest) -> LLMResponse:
+        raise NotImplementedError
+
+
+class FakeLLMClient(BaseLLMClient):
+    """
+    Deterministic local model.
+
+    Returns the same text for the same request, costs no tokens from any
+    provider and never touches the network. Used in tests, benchmarks and
+    with CLIENT='fake'.
+    """
+    name = 'fake'
+
+    def __init__(self, latency_seconds: float = 0.0):
+        self.latency_seconds = latency_seconds
+        self.calls = 0
+
+    async def complete(self, request: LLMRequest) -> LLMResponse:
+        self.calls += 1
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+
+        digest = request.cache_key()[:8]
+        first_line = request.prompt.strip().splitlines()[0] if request.prompt.strip() else ''
+        text = f"[{request.model_name}:{digest}] {first_line[:200]}"
+
+        return LLMResponse(
+            text=text,
+            model_name=request.model_name,
+            prompt_tokens=estimate_tokens(request.system_prompt) + estimate_tokens(request.prompt),
+            completion_tokens=estimate_tokens(text),
+            latency_ms=self.latency_seconds * 1000,
+        )
+
+
+class LangChainChatClient(BaseLLMClient):
+    """OpenAI chat models through langchain-openai"""
+    name = 'openai'
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or os.getenv('OPENAI_API_KEY', '')
+
+    async def complete(self, request: LLMRequest) -> LLMResponse:
+        from langchain_openai import ChatOpenAI
+        from langchain.schema import HumanMessage, SystemMessage
+
+        chat = ChatOpenAI(
+            model=request.model_name,
+            temperature=request.temperature,
+            max_tokens=request.max_tokens,
+            openai_api_key=self.api_key,
+        )
+        messages = []
+        if request.system_prompt:
+            messages.append(SystemMessage(content=request.system_prompt))
+        messages.append(HumanMessage(content=request.prompt))
+
+        start = time.perf_counter()
+        result = await chat.agenerate([messages])
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        text = result.generations[0][0].text
+        usage = (result.llm_output or {}).get('token_usage', {})
+        return LLMResponse(
+            text=text,
+            model_name=request.model_name,
+            prompt_tokens=usage.get('prompt_tokens', estimate_tokens(request.prompt)),
+            completion_tokens=usage.get('completion_tokens', estimate_tokens(text)),
+            latency_ms=latency_ms,
+        )
+
+
+# ============================================
+# Response caches
+# ============================================
+
+class BaseResponseCache:
+    """Cache interface: LLMResponse by request key"""
+
+    def get(self, key: str) -> Optional[LLMResponse]:
+        raise NotImplementedError
+
+    def set(self, key: str, response: LLMResponse) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class InMemoryResponseCache(BaseResponseCache):
+    """Per-process LRU cache with TTL"""
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: Optional[float] = 86400):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[LLMResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, response = entry
+            if self.ttl_seconds is not None and time.time() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    def set(self, key: str, response: LLMResponse) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteResponseCache(BaseResponseCache):
+    """
+    On-disk LRU cache with TTL.
+
+    One SQLite file shared by all workers on the host. Reads refresh
+    `last_access`; writes evict expired rows and the least recently used
+    rows beyond `max_entries`.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000, ttl_seconds: Optional[float] = 86400):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS llm_response_cache ('
+            ' cache_key TEXT PRIMARY KEY,'
+            ' payload TEXT NOT NULL,'
+            ' created_at REAL NOT NULL,'
+            ' last_access REAL NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS llm_response_cache_last_access '
+            'ON llm_response_cache (last_access)'
+        )
+
+    def get(self, key: str) -> Optional[LLMResponse]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT payload, created_at FROM llm_response_cache WHERE cache_key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            payload, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._conn.execute('DELETE FROM llm_response_cache WHERE cache_key = ?', (key,))
+                return None
+            self._conn.execute(
+                'UPDATE llm_response_cache SET last_access = ? WHERE cache_key = ?', (now, key)
+            )
+        return LLMResponse(**json.loads(payload))
+
+    def set(self, key: str, response: LLMResponse) -> None:
+        now = time.time()
+        payload = json.dumps(asdict(response))
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO llm_response_cache (cache_key, payload, created_at, last_access) '
+                'VALUES (?, ?, ?, ?)',
+                (key, payload, now, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        """Drop expired rows, then the least recently used overflow"""
+        if self.ttl_seconds is not None:
+            self._conn.execute(
+                'DELETE FROM llm_response_cache WHERE created_at < ?', (now - self.ttl_seconds,)
+            )
+        self._conn.execute(
+            'DELETE FROM llm_response_cache WHERE cache_key IN ('
+            ' SELECT cache_key FROM llm_response_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,),
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute('DELETE FROM llm_response_cache')
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM llm_response_cache').fetchone()[0]
+
+
+# ============================================
+# Gateway
+# ============================================
+
+class LLMGateway:
+    """
+    Cached, coalescing front door to the model clients.
+
+    - Cache hit: returns the stored response, no tokens, no network
+    - Same request already in flight: waits for that call instead of
+      issuing a second one (works across threads and event loops)
+    - Otherwise: calls the client and stores the response
+    """
+
+    def __init__(self, client_for_model: Callable[[str], BaseLLMClient],
+                 cache: Optional[BaseResponseCache] = None):
+        self.client_for_model = client_for_model
+        self.cache = cache
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'tokens': 0}
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    async def complete(self, request: LLMRequest) -> LLMResponse:
+        """Raises LLMUnavailable when no client serves request.model_name"""
+        client = self.client_for_model(request.model_name)
+        key = f"{client.name}:{request.cache_key()}"
+
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.stats['hits'] += 1
+                LLM_CACHE_REQUESTS.labels('hit').inc()
+                return replace(cached, cached=True, latency_ms=0.0)
+
+        with self._lock:
+            pending = self._in_flight.get(key)
+            owner = pending is None
+            if owner:
+                pending = Future()
+                self._in_flight[key] = pending
+
+        if not owner:
+            self.stats['coalesced'] += 1
+            LLM_CACHE_REQUESTS.labels('coalesced').inc()
+            response = await asyncio.wrap_future(pending)
+            return replace(response, cached=True, latency_ms=0.0)
+
+        try:
+            self.stats['misses'] += 1
+            LLM_CACHE_REQUESTS.labels('miss').inc()
+            response = await client.complete(request)
+            self.stats['tokens'] += response.total_tokens
+            LLM_TOKENS.inc(response.total_tokens)
+            if self.cache is not None:
+                self.cache.set(key, response)
+            pending.set_result(response)
+            return response
+        except BaseException as exc:
+            pending.set_exception(exc)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def hit_rate(self) -> float:
+        """Share of requests served without calling a provider"""
+        served = self.stats['hits'] + self.stats['coalesced']
+        total = served + self.stats['misses']
+        return served / total if total else 0.0
+
+
+def build_client_factory(client_name: str) -> Callable[[str], BaseLLMClient]:
+    """
+    Map model names to clients.
+
+    'fake' always uses the local model. 'auto' uses OpenAI for gpt-* models
+    when OPENAI_API_KEY is set; any other model raises LLMUnavailable, so
+    canned text is never presented as a model's analysis.
+    """
+    if client_name == 'fake':
+        fake = FakeLLMClient()
+        return lambda model_name: fake
+
+    openai_client = LangChainChatClient() if os.getenv('OPENAI_API_KEY') else None
+    if openai_client is None:
+        logger.warning("AI_REPORTS_LLM CLIENT='auto' without OPENAI_API_KEY: "
+                       "reports are generated without an LLM narrative")
+
+    def client_for_model(model_name: str) -> BaseLLMClient:
+        if openai_client and model_name.lower().startswith('gpt'):
+            return openai_client
+        raise LLMUnavailable(f"No LLM provider configured for model {model_name}")
+
+    return client_for_model
+
+
+def build_response_cache(options: Dict[str, Any]) -> Optional[BaseResponseCache]:
+    """Create the cache backend described by settings.AI_REPORTS_LLM"""
+    backend = options.get('CACHE_BACKEND', 'memory')
+    max_entries = options.get('CACHE_MAX_ENTRIES', 10000)
+    ttl_seconds = options.get('CACHE_TTL_SECONDS', 86400)
+
+    if backend == 'sqlite':
+        return SQLiteResponseCache(options['CACHE_PATH'], max_entries=max_entries, ttl_seconds=ttl_seconds)
+    if backend == 'memory':
+        return InMemoryResponseCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+    return None
+
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway() -> LLMGateway:
+    """Process-wide gateway configured from settings"""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                from django.conf import settings
+                options = getattr(settings, 'AI_REPORTS_LLM', {})
+                _gateway = LLMGateway(
+                    client_for_model=build_client_factory(options.get('CLIENT', 'auto')),
+                    cache=build_response_cache(options),
+                )
+    return _gateway
@@ -0,0 +1,38 @@
+# Generated by Django 6.0.1 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_reports', '0003_chatmessage_agent_model_chatmessage_agent_name_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aiagentconfig',
+            name='max_concurrent_requests',
+            field=models.PositiveIntegerField(default=4),
+        ),
+        migrations.AddField(
+            model_name='aiagentconfig',
+            name='queue_timeout_seconds',
+            field=models.FloatField(default=10.0),
+        ),
+        migrations.AddField(
+            model_name='aiagentconfig',
+            name='requests_per_minute',
+            field=models.PositiveIntegerField(default=60),
+        ),
+        migrations.AddField(
+            model_name='aiagentconfig',
+            name='tokens_per_minute',
+            field=models.PositiveIntegerField(default=90000),
+        ),
+        migrations.AddField(
+            model_name='aiagentconfig',
+            name='user_requests_per_minute',
+            field=models.PositiveIntegerField(default=10),
+        ),
+    ]
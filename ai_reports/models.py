@@ -100,6 +100,14 @@ Sempre estruture seus relatórios com:
 - Recomendações
 - Próximos passos"""
     )
+    
+    # Limites de uso (0 = sem limite)
+    max_concurrent_requests = models.PositiveIntegerField(default=4)
+    requests_per_minute = models.PositiveIntegerField(default=60)
+    tokens_per_minute = models.PositiveIntegerField(default=90000)
+    user_requests_per_minute = models.PositiveIntegerField(default=10)
+    queue_timeout_seconds = models.FloatField(default=10.0)
+    
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -0,0 +1,281 @@
+"""
+Concurrency and rate limits for AI agents
+
+Every AIAgentConfig gets its own limiter with:
+- a process-wide slot count capping concurrent executions
+- a token bucket for requests per minute
+- a token bucket for LLM tokens per minute
+- one token bucket per user for requests per minute
+
+Requests that would exceed a limit wait in line for up to
+`queue_timeout_seconds`; beyond that RateLimitExceeded is raised with the
+number of seconds the caller should wait (surfaced as HTTP 429). A request
+that is rejected or cancelled before it runs gives its rate budgets back.
+The token budget is reserved at max_tokens; a run that reports what it
+used (Admission.used_tokens) gets the rest back.
+
+Limits are enforced per worker process. A value of 0 disables a limit.
+"""
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+
+class RateLimitExceeded(Exception):
+    """Raised when an agent request cannot be admitted within the queue timeout"""
+
+    def __init__(self, scope: str, retry_after: float):
+        self.scope = scope
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f"Rate limit exceeded ({scope}). Retry in {self.retry_after} seconds.")
+
+
+class TokenBucket:
+    """
+    Classic token bucket refilled continuously.
+
+    `reserve()` lets callers queue: tokens are taken immediately (the
+    balance may go negative) and the caller sleeps for the returned delay.
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float,
+                 clock: Callable[[], float] = time.monotonic):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.clock = clock
+        self._tokens = capacity
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.refill_per_second)
+        self._updated_at = now
+
+    def reserve(self, amount: float = 1, max_wait: float = 0) -> Tuple[bool, float]:
+        """
+        Take `amount` tokens if they become available within `max_wait` seconds.
+
+        Returns:
+            (admitted, wait_seconds) - when admitted the caller must wait
+            `wait_seconds` before proceeding; otherwise nothing is taken
+        """
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            wait = max(0.0, (amount - self._tokens) / self.refill_per_second)
+            if wait > max_wait:
+                return False, wait
+            self._tokens -= amount
+            return True, wait
+
+    def refund(self, amount: float) -> None:
+        """Give back tokens reserved but not used"""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+
+@dataclass(eq=False)
+class _Waiter:
+    loop: asyncio.AbstractEventLoop
+    future: asyncio.Future
+    granted: bool = False
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(True)
+
+
+class ConcurrencySlots:
+    """
+    Counting semaphore shared by every thread and event loop of the process.
+
+    Waiters are futures on their own event loop, so no thread blocks while
+    waiting. `release()` hands the slot straight to the oldest waiter; a
+    waiter that times out or is cancelled after being handed a slot gives
+    it back.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._in_use = 0
+        self._waiters: Deque[_Waiter] = deque()
+        self._lock = threading.Lock()
+
+    async def acquire(self, timeout: float) -> bool:
+        """Take a slot within `timeout` seconds; False when none became free"""
+        with self._lock:
+            if self._in_use < self.size and not self._waiters:
+                self._in_use += 1
+                return True
+            if timeout <= 0:
+                return False
+            loop = asyncio.get_running_loop()
+            waiter = _Waiter(loop, loop.create_future())
+            self._waiters.append(waiter)
+
+        try:
+            await asyncio.wait_for(waiter.future, timeout)
+            return True
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    self._waiters.remove(waiter)
+            if not granted:
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                return False
+            if isinstance(e, asyncio.CancelledError):
+                self.release()
+                raise
+            return True  # The slot arrived as the timeout fired
+
+    def release(self) -> None:
+        with self._lock:
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.granted = True  # The slot passes on, the count stays
+                waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+            else:
+                self._in_use -= 1
+
+
+@dataclass
+class Admission:
+    """Yielded by AgentRateLimiter.limit(): set used_tokens to give back the unused token budget"""
+    used_tokens: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class AgentLimits:
+    """Limits read from AIAgentConfig (0 = unlimited)"""
+    max_concurrent_requests: int = 0
+    requests_per_minute: int = 0
+    tokens_per_minute: int = 0
+    user_requests_per_minute: int = 0
+    queue_timeout_seconds: float = 0
+
+    @classmethod
+    def from_config(cls, config) -> 'AgentLimits':
+        return cls(
+            max_concurrent_requests=getattr(config, 'max_concurrent_requests', 0) or 0,
+            requests_per_minute=getattr(config, 'requests_per_minute', 0) or 0,
+            tokens_per_minute=getattr(config, 'tokens_per_minute', 0) or 0,
+            user_requests_per_minute=getattr(config, 'user_requests_per_minute', 0) or 0,
+            queue_timeout_seconds=getattr(config, 'queue_timeout_seconds', 0) or 0,
+        )
+
+
+def _per_minute_bucket(per_minute: int) -> Optional[TokenBucket]:
+    return TokenBucket(per_minute, per_minute / 60.0) if per_minute else None
+
+
+class AgentRateLimiter:
+    """Limiter for a single agent"""
+
+    def __init__(self, name: str, limits: AgentLimits):
+        self.name = name
+        self.limits = limits
+        self.slots = ConcurrencySlots(limits.max_concurrent_requests) if limits.max_concurrent_requests else None
+        self.request_bucket = _per_minute_bucket(limits.requests_per_minute)
+        self.token_bucket = _per_minute_bucket(limits.tokens_per_minute)
+        self._user_buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def _user_bucket(self, user_id: str) -> Optional[TokenBucket]:
+        if not self.limits.user_requests_per_minute:
+            return None
+        with self._lock:
+            bucket = self._user_buckets.get(user_id)
+            if bucket is None:
+                bucket = _per_minute_bucket(self.limits.user_requests_per_minute)
+                self._user_buckets[user_id] = bucket
+            return bucket
+
+    @staticmethod
+    def _refund(reserved: List[Tuple[TokenBucket, float]]) -> None:
+        for bucket, amount in reserved:
+            bucket.refund(amount)
+
+    def _reserve_rates(self, user_id: str, tokens: int) -> Tuple[float, List[Tuple[TokenBucket, float]]]:
+        """Reserve user, request and token budgets, all or nothing: (wait seconds, reserved budgets)"""
+        timeout = self.limits.queue_timeout_seconds
+        reserved = []
+        wait = 0.0
+        # A single user never queues: exceeding the per-user limit is an immediate 429
+        checks = [
+            (self._user_bucket(user_id), 1, 0, f"user {user_id} on agent {self.name}"),
+            (self.request_bucket, 1, timeout, f"requests per minute on agent {self.name}"),
+            (self.token_bucket, tokens, timeout, f"tokens per minute on agent {self.name}"),
+        ]
+        for bucket, amount, max_wait, scope in checks:
+            if bucket is None:
+                continue
+            admitted, bucket_wait = bucket.reserve(amount, max_wait)
+            if not admitted:
+                self._refund(reserved)
+                raise RateLimitExceeded(scope, bucket_wait)
+            reserved.append((bucket, amount))
+            wait = max(wait, bucket_wait)
+        return wait, reserved
+
+    @asynccontextmanager
+    async def limit(self, user_id: str, tokens: int = 0):
+        """Admit one agent execution reserving `tokens` LLM tokens, or raise RateLimitExceeded"""
+        started = time.monotonic()
+        wait, reserved = self._reserve_rates(user_id, tokens)
+        try:
+            if wait:
+                await asyncio.sleep(wait)
+            remaining = max(0.0, self.limits.queue_timeout_seconds - (time.monotonic() - started))
+            acquired = self.slots is None or await self.slots.acquire(remaining)
+        except asyncio.CancelledError:
+            self._refund(reserved)
+            raise
+        if not acquired:
+            self._refund(reserved)
+            raise RateLimitExceeded(f"concurrent requests on agent {self.name}",
+                                    self.limits.queue_timeout_seconds or 1)
+
+        admission = Admission()
+        try:
+            yield admission
+        finally:
+            if self.slots is not None:
+                self.slots.release()
+            if self.token_bucket is not None and admission.used_tokens is not None:
+                unused = min(tokens, self.token_bucket.capacity) - admission.used_tokens
+                if unused > 0:
+                    self.token_bucket.refund(unused)
+
+
+_limiters: Dict[str, AgentRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_agent_limiter(config) -> Optional[AgentRateLimiter]:
+    """
+    Process-wide limiter for an AIAgentConfig.
+
+    Rebuilt when the agent's limits change. Returns None for dict/None
+    configurations, which are not rate limited.
+    """
+    if config is None or not hasattr(config, 'model_name'):
+        return None
+
+    limits = AgentLimits.from_config(config)
+    key = str(getattr(config, 'pk', None) or config.name)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None or limiter.limits != limits:
+            limiter = AgentRateLimiter(config.name, limits)
+            _limiters[key] = limiter
+        return limiter
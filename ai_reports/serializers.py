@@ -39,7 +39,11 @@ class GeneratedReportSerializer(serializers.ModelSerializer):
 class AIAgentConfigSerializer(serializers.ModelSerializer):
     class Meta:
         model = AIAgentConfig
-        fields = ['id', 'name', 'model_name', 'temperature', 'max_tokens', 'system_prompt', 'is_active', 'created_at']
+        fields = [
+            'id', 'name', 'model_name', 'temperature', 'max_tokens', 'system_prompt',
+            'max_concurrent_requests', 'requests_per_minute', 'tokens_per_minute',
+            'user_requests_per_minute', 'queue_timeout_seconds', 'is_active', 'created_at'
+        ]
         read_only_fields = ['id', 'created_at']
 
 
@@ -1,3 +1,207 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import time
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from .agent import AIReportAgent
+from .llm import (
+    FakeLLMClient, InMemoryResponseCache, LLMGateway, LLMRequest, LLMUnavailable, SQLiteResponseCache,
+    build_client_factory
+)
+from .rate_limit import AgentLimits, AgentRateLimiter, RateLimitExceeded, TokenBucket
+
+
+class LLMGatewayTest(SimpleTestCase):
+    """Response cache and request coalescing of the LLM gateway"""
+
+    def setUp(self):
+        self.client = FakeLLMClient()
+        self.gateway = LLMGateway(lambda model_name: self.client, InMemoryResponseCache(max_entries=10))
+        self.request = LLMRequest(model_name='gpt-4', prompt='Summarize inventory', system_prompt='Analyst')
+
+    def test_fake_model_is_deterministic(self):
+        first = asyncio.run(self.client.complete(self.request))
+        second = asyncio.run(self.client.complete(self.request))
+        self.assertEqual(first.text, second.text)
+
+    def test_cache_key_depends_on_model_temperature_and_prompts(self):
+        keys = {
+            self.request.cache_key(),
+            LLMRequest(model_name='mistral', prompt='Summarize inventory', system_prompt='Analyst').cache_key(),
+            LLMRequest(model_name='gpt-4', prompt='Summarize inventory', system_prompt='Analyst',
+                       temperature=0.2).cache_key(),
+            LLMRequest(model_name='gpt-4', prompt='Summarize inventory', system_prompt='').cache_key(),
+            LLMRequest(model_name='gpt-4', prompt='Summarize sales', system_prompt='Analyst').cache_key(),
+        }
+        self.assertEqual(len(keys), 5)
+
+    def test_repeated_prompt_is_served_from_cache(self):
+        first = asyncio.run(self.gateway.complete(self.request))
+        second = asyncio.run(self.gateway.complete(self.request))
+
+        self.assertFalse(first.cached)
+        self.assertTrue(second.cached)
+        self.assertEqual(first.text, second.text)
+        self.assertEqual(self.client.calls, 1)
+        self.assertEqual(self.gateway.stats['hits'], 1)
+
+    def test_concurrent_identical_requests_are_coalesced(self):
+        self.client.latency_seconds = 0.05
+        gateway = LLMGateway(lambda model_name: self.client, cache=None)
+
+        async def burst():
+            return await asyncio.gather(*[gateway.complete(self.request) for _ in range(5)])
+
+        responses = asyncio.run(burst())
+        self.assertEqual(self.client.calls, 1)
+        self.assertEqual(len({r.text for r in responses}), 1)
+        self.assertEqual(gateway.stats['coalesced'], 4)
+
+    def test_auto_client_without_provider_gives_no_narrative(self):
+        api_key = os.environ.pop('OPENAI_API_KEY', None)
+        try:
+            with self.assertLogs('ai_reports.llm', 'WARNING'):
+                gateway = LLMGateway(build_client_factory('auto'), InMemoryResponseCache(max_entries=10))
+        finally:
+            if api_key is not None:
+                os.environ['OPENAI_API_KEY'] = api_key
+
+        with self.assertRaises(LLMUnavailable):
+            asyncio.run(gateway.complete(self.request))
+        agent = AIReportAgent({'model': 'mistral', 'temperature': 0.7, 'max_tokens': 100}, llm=gateway)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertIsNone(asyncio.run(agent._ask_llm('Summarize inventory')))
+
+    def test_memory_cache_evicts_least_recently_used(self):
+        cache = InMemoryResponseCache(max_entries=2)
+        response = asyncio.run(self.client.complete(self.request))
+        cache.set('a', response)
+        cache.set('b', response)
+        cache.get('a')
+        cache.set('c', response)
+
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+
+    def test_sqlite_cache_round_trip_and_ttl(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'cache.sqlite3')
+            response = asyncio.run(self.client.complete(self.request))
+
+            cache = SQLiteResponseCache(path, max_entries=10)
+            cache.set('key', response)
+            self.assertEqual(SQLiteResponseCache(path).get('key').text, response.text)
+
+            expired = SQLiteResponseCache(path, ttl_seconds=-1)
+            self.assertIsNone(expired.get('key'))
+
+
+class RateLimitTest(SimpleTestCase):
+    """Token buckets and per-agent limiter"""
+
+    def test_token_bucket_refills_over_time(self):
+        now = [0.0]
+        bucket = TokenBucket(capacity=2, refill_per_second=1, clock=lambda: now[0])
+
+        self.assertEqual(bucket.reserve(1), (True, 0.0))
+        self.assertEqual(bucket.reserve(1), (True, 0.0))
+        self.assertEqual(bucket.reserve(1), (False, 1.0))
+
+        now[0] = 1.0
+        self.assertEqual(bucket.reserve(1), (True, 0.0))
+
+    def test_token_bucket_queues_within_max_wait(self):
+        now = [0.0]
+        bucket = TokenBucket(capacity=1, refill_per_second=2, clock=lambda: now[0])
+        bucket.reserve(1)
+
+        admitted, wait = bucket.reserve(1, max_wait=1)
+        self.assertTrue(admitted)
+        self.assertAlmostEqual(wait, 0.5)
+
+    def test_user_limit_rejects_with_retry_after(self):
+        limiter = AgentRateLimiter('test', AgentLimits(user_requests_per_minute=1))
+
+        async def run_twice():
+            async with limiter.limit('42'):
+                pass
+            async with limiter.limit('42'):
+                pass
+
+        with self.assertRaises(RateLimitExceeded) as ctx:
+            asyncio.run(run_twice())
+        self.assertEqual(ctx.exception.retry_after, 60)
+
+        # Other users keep their own budget
+        async def other_user():
+            async with limiter.limit('7'):
+                return True
+
+        self.assertTrue(asyncio.run(other_user()))
+
+    def test_unused_token_budget_is_refunded(self):
+        limiter = AgentRateLimiter('test', AgentLimits(tokens_per_minute=100))
+
+        async def two_runs():
+            for _ in range(2):
+                async with limiter.limit('1', tokens=80) as admission:
+                    admission.used_tokens = 10
+
+        asyncio.run(two_runs())  # Without the refund the second run finds 20 tokens, not 90
+        self.assertAlmostEqual(limiter.token_bucket._tokens, 80, delta=1)
+
+    def test_concurrency_limit_times_out(self):
+        limiter = AgentRateLimiter('test', AgentLimits(max_concurrent_requests=1, queue_timeout_seconds=0.05))
+
+        async def overlapping():
+            async with limiter.limit('1'):
+                async with limiter.limit('2'):
+                    pass
+
+        with self.assertRaises(RateLimitExceeded):
+            asyncio.run(overlapping())
+
+    def test_rejected_or_cancelled_requests_refund_and_release(self):
+        limiter = AgentRateLimiter('test', AgentLimits(max_concurrent_requests=1, requests_per_minute=2,
+                                                       queue_timeout_seconds=0.05))
+
+        async def scenario():
+            async with limiter.limit('1'):
+                with self.assertRaises(RateLimitExceeded):
+                    async with limiter.limit('2'):
+                        pass
+                waiting = asyncio.ensure_future(limiter.limit('3').__aenter__())
+                await asyncio.sleep(0)
+                waiting.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await waiting
+            # Both budgets were given back and the slot is free again
+            async with limiter.limit('4'):
+                return limiter.slots._in_use
+
+        self.assertEqual(asyncio.run(scenario()), 1)
+
+    def test_slot_is_handed_to_a_waiter_on_another_event_loop(self):
+        limiter = AgentRateLimiter('test', AgentLimits(max_concurrent_requests=1, queue_timeout_seconds=5))
+        admitted = []
+
+        async def hold():
+            async with limiter.limit('1'):
+                await asyncio.sleep(0.05)
+
+        async def wait_for_slot():
+            async with limiter.limit('2'):
+                admitted.append(True)
+
+        holder = threading.Thread(target=asyncio.run, args=(hold(),))
+        holder.start()
+        time.sleep(0.01)
+        asyncio.run(wait_for_slot())
+        holder.join()
+        self.assertEqual(admitted, [True])
+        self.assertEqual(limiter.slots._in_use, 0)
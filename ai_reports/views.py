@@ -20,6 +20,7 @@ from .serializers import (
     AIReportStreamSerializer
 )
 from .agent import process_ai_request, ProcessingStage
+from .rate_limit import RateLimitExceeded
 from datetime import datetime
 
 # Import RBAC utilities
@@ -217,6 +218,19 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
             
             return Response(response_data, status=status.HTTP_201_CREATED)
         
+        except RateLimitExceeded as e:
+            response = Response(
+                {
+                    'error': str(e),
+                    'scope': e.scope,
+                    'retry_after_seconds': e.retry_after,
+                    'user_message_id': user_message.id,
+                },
+                status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
+            response['Retry-After'] = str(e.retry_after)
+            return response
+        
         except Exception as e:
             # Salvar mensagem de erro
             error_message = ChatMessage.objects.create(
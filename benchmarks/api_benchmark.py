@@ -0,0 +1,273 @@
+"""
+End-to-end API benchmark with latency and query-count budgets
+Execute: python benchmarks/api_benchmark.py [--scales 0.1,1] [--iterations 20] [--compare benchmarks/results/api-<sha>.json]
+
+For every scale factor the synthetic data generator seeds a fresh test
+database, then each endpoint is called through the full middleware stack
+with the Django test client and we record:
+- p50 / p95 / mean latency over --iterations calls (after --warmup calls)
+- SQL queries per call
+- peak Python memory of one call (tracemalloc, measured in a separate call)
+These are cold numbers: the response cache is disabled, so every call runs
+the view. GET endpoints are measured a second time with the cache enabled
+(warm_p50_ms / warm_p95_ms / warm_queries), i.e. repeated cache hits.
+
+Every measured call must return 2xx; otherwise the endpoint is reported as
+failed, no result file is written and the script exits with status 1.
+Results are written as JSON (default benchmarks/results/api-<commit>.json).
+With --compare, a previous result file is used as the budget: p95 slower
+by more than --tolerance or more queries than before is a regression and
+the script exits with status 1.
+
+The AI endpoint runs against the local fake model, so no API key is needed,
+and the benchmark agent has no rate limits.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import django
+
+# Setup Django
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'supply_unlimited.settings')
+os.environ.setdefault('AI_REPORTS_LLM_CLIENT', 'fake')
+os.environ.setdefault('AI_REPORTS_LLM_CACHE', 'memory')
+django.setup()
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+from django.urls import include, path
+
+from ai_reports.models import AIAgentConfig
+from users import views
+from users.models import Notification
+from users.synthetic_data import GeneratorConfig, clear_generated, generate
+
+# The users and AI reports apps mounted as in the project URLconf, plus the project's page
+# routes that templates reverse (after the users app, so /companies/ is its company_list)
+urlpatterns = [
+    path('', include('users.urls')),
+    path('api/ai-reports/', include('ai_reports.urls')),
+    path('inventory/', views.inventory_page, name='inventory'),
+    path('companies/', views.companies_page, name='companies'),
+    path('reports/', views.reports_page, name='reports'),
+    path('sales/', views.sales_page, name='sales'),
+    path('settings/', views.settings_view, name='settings'),
+    path('update-profile/', views.update_profile_view, name='update_profile'),
+    path('change-password/', views.change_password_view, name='change_password'),
+]
+
+# (name, method, path, body)
+ENDPOINTS = [
+    ('inventory_data', 'get', '/api/inventory/', None),
+    ('inventory_data_filtered', 'get', '/api/inventory/?stock=low-stock&search=Cable', None),
+    ('sales_data', 'get', '/api/sales/', None),
+    ('company_list', 'get', '/companies/', None),
+    ('export_inventory_csv', 'get', '/export/inventory/?format=csv', None),
+    ('export_inventory_json', 'get', '/export/inventory/?format=json', None),
+    ('notifications_list', 'get', '/api/notifications/', None),
+    ('notifications_unread', 'get', '/api/notifications/unread/', None),
+    ('notifications_unread_count', 'get', '/api/notifications/unread_count/', None),
+    ('notifications_mark_all_read', 'post', '/api/notifications/mark_all_read/', None),
+    ('send_message', 'post', '/api/ai-reports/messages/send/', {'message': 'Analyze inventory by country'}),
+]
+
+
+class BenchmarkError(Exception):
+    """A measured call failed: its timings are not a valid budget"""
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def seed(scale, days, seed_value, notifications):
+    """Synthetic dataset for one scale factor plus the benchmark user's notifications"""
+    clear_generated()
+    counts = generate(GeneratorConfig(scale=scale, days=days, seed=seed_value))
+    user, _ = User.objects.get_or_create(username='bench', defaults={'is_superuser': True, 'is_staff': True})
+    Notification.objects.filter(user=user).delete()
+    Notification.objects.bulk_create([
+        Notification(user=user, title=f'Notification {i}', message='Stock level changed', is_read=i % 3 == 0)
+        for i in range(notifications)
+    ])
+    # No rate limits: one user makes every call, so the default limits would measure the limiter
+    AIAgentConfig.objects.update_or_create(name='Benchmark Agent', defaults={
+        'model_name': 'mistral', 'temperature': 0.7, 'max_tokens': 2000, 'system_prompt': 'Benchmark agent',
+        'requests_per_minute': 0, 'tokens_per_minute': 0, 'user_requests_per_minute': 0,
+    })
+    return user, counts
+
+
+def call(client, method, url, body):
+    with contextlib.redirect_stdout(io.StringIO()):  # The AI agent prints its progress
+        if method == 'post':
+            return client.post(url, json.dumps(body or {}), content_type='application/json')
+        return client.get(url)
+
+
+def timed_calls(client, method, url, body, iterations, warmup):
+    """(sorted latencies, max queries, last response) over `iterations` calls; all must succeed"""
+    for _ in range(warmup):
+        call(client, method, url, body)
+
+    latencies, queries = [], []
+    for _ in range(iterations):
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = call(client, method, url, body)
+            latencies.append(time.perf_counter() - started)
+        queries.append(len(captured))
+        if not 200 <= response.status_code < 300:
+            raise BenchmarkError(f'{method.upper()} {url} returned {response.status_code}')
+    return sorted(latencies), max(queries), response
+
+
+def p95(latencies):
+    return round(latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000, 2)
+
+
+def measure(client, method, url, body, iterations, warmup):
+    with override_settings(RESPONSE_CACHE={**settings.RESPONSE_CACHE, 'ENABLED': False}):
+        latencies, queries, response = timed_calls(client, method, url, body, iterations, warmup)
+
+        tracemalloc.start()
+        call(client, method, url, body)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    content = response.getvalue() if response.streaming else response.content
+    result = {
+        'status': response.status_code,
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p95_ms': p95(latencies),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2),
+        'queries': queries,
+        'peak_memory_kb': round(peak / 1024, 1),
+        'response_bytes': len(content),
+    }
+    if method == 'get':
+        warm, warm_queries, _ = timed_calls(client, method, url, body, iterations, warmup)
+        result.update({
+            'warm_p50_ms': round(statistics.median(warm) * 1000, 2),
+            'warm_p95_ms': p95(warm),
+            'warm_queries': warm_queries,
+        })
+    return result
+
+
+def compare(report, baseline, tolerance):
+    """Regressions against a previous result file"""
+    problems = []
+    for scale, result in report['scales'].items():
+        previous = baseline.get('scales', {}).get(scale)
+        if not previous:
+            continue
+        for name, current in result['endpoints'].items():
+            before = previous['endpoints'].get(name)
+            if not before:
+                continue
+            if current['p95_ms'] > before['p95_ms'] * (1 + tolerance) and current['p95_ms'] - before['p95_ms'] > 1:
+                problems.append(f"scale {scale} {name}: p95 {before['p95_ms']}ms -> {current['p95_ms']}ms")
+            if current['queries'] > before['queries']:
+                problems.append(f"scale {scale} {name}: queries {before['queries']} -> {current['queries']}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--scales', default='0.1,0.5', help='Comma separated generator scale factors')
+    parser.add_argument('--days', type=int, default=90, help='Days of generated sales history')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--notifications', type=int, default=200)
+    parser.add_argument('--only', help='Comma separated endpoint names')
+    parser.add_argument('--output', help='Result file (default benchmarks/results/api-<commit>.json)')
+    parser.add_argument('--compare', help='Previous result file used as the budget')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95 slowdown (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    endpoints = [e for e in ENDPOINTS if not args.only or e[0] in args.only.split(',')]
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'database': connection.vendor,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'iterations': args.iterations,
+        'scales': {},
+    }
+
+    failures = []
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        with override_settings(ROOT_URLCONF=__name__, DEBUG=False):
+            for scale in [float(s) for s in args.scales.split(',')]:
+                started = time.perf_counter()
+                user, counts = seed(scale, args.days, args.seed, args.notifications)
+                print(f'Scale {scale}: seeded {counts["sales"]:,} sales, {counts["inventory"]:,} inventory rows '
+                      f'in {time.perf_counter() - started:.1f}s')
+                client = Client()
+                client.force_login(user)
+                results = {}
+                for name, method, url, body in endpoints:
+                    try:
+                        results[name] = measure(client, method, url, body, args.iterations, args.warmup)
+                    except BenchmarkError as e:
+                        failures.append(f'scale {scale} {name}: {e}')
+                        print(f'  {name:<30} FAILED {e}')
+                        continue
+                    r = results[name]
+                    print(f'  {name:<30} p50 {r["p50_ms"]:>9.2f}ms  p95 {r["p95_ms"]:>9.2f}ms  '
+                          f'{r["queries"]:>5} queries  {r["peak_memory_kb"]:>10,.0f} KB  [{r["status"]}]')
+                    if 'warm_p50_ms' in r:
+                        print(f'  {"  (cached)":<30} p50 {r["warm_p50_ms"]:>9.2f}ms  p95 {r["warm_p95_ms"]:>9.2f}ms  '
+                              f'{r["warm_queries"]:>5} queries')
+                report['scales'][str(scale)] = {'rows': counts, 'endpoints': results}
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    if failures:
+        # Not written: a result file with failed endpoints would become a wrong budget
+        print(f'{len(failures)} endpoint(s) failed, no result file written')
+        sys.exit(1)
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results', f'api-{commit}.json')
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Wrote {output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            problems = compare(report, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f'REGRESSION {problem}')
+        if problems:
+            sys.exit(1)
+        print(f'No regressions against {args.compare}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""
+Contention benchmark for the stock reservation API
+Execute: python benchmarks/reservation_contention.py [--workers 200] [--orders 5000]
+
+Fires many concurrent multi-line checkouts at a handful of hot SKUs and
+checks afterwards that:
+- no Inventory row went negative (no oversell)
+- final stock == initial stock - units of successful reservations (no lost update)
+- the ledger agrees with Inventory
+- retried requests (same idempotency key) never reserved twice
+
+Run it against PostgreSQL (USE_POSTGRESQL=True): SQLite serializes all
+writers, so it only shows lock timeouts. Creates its own BENCH-* rows and
+removes them at the end unless --keep is given.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import django
+
+# Setup Django
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'supply_unlimited.settings')
+django.setup()
+
+from django.db import OperationalError, connection
+from django.db.models import Sum
+
+from users.models import Company, Inventory, Product, StockMovement, StockReservation, Store
+from users.reservations import InsufficientStock, reserve_stock
+
+PREFIX = 'BENCH'
+
+
+def setup(hot_skus, stock):
+    company, _ = Company.objects.get_or_create(company_id=f'{PREFIX}-CO', defaults={
+        'name': 'Benchmark Co', 'country': 'Germany', 'city': 'Berlin'})
+    store, _ = Store.objects.get_or_create(store_id=f'{PREFIX}-STORE', defaults={
+        'company': company, 'name': 'Benchmark Store', 'city': 'Berlin', 'country': 'Germany', 'address': '-'})
+    skus = [f'{PREFIX}-{i:04d}' for i in range(hot_skus)]
+    for sku in skus:
+        product, _ = Product.objects.get_or_create(sku=sku, defaults={'name': sku, 'price': Decimal('9.99')})
+        Inventory.objects.update_or_create(product=product, store=store, defaults={'quantity': stock})
+    return store.store_id, skus
+
+
+def cleanup():
+    reservations = StockReservation.objects.filter(store_id=f'{PREFIX}-STORE')
+    StockMovement.objects.filter(store_id=f'{PREFIX}-STORE').delete()
+    reservations.delete()
+    Inventory.objects.filter(store_id=f'{PREFIX}-STORE').delete()
+    Product.objects.filter(sku__startswith=f'{PREFIX}-').delete()
+    Store.objects.filter(store_id=f'{PREFIX}-STORE').delete()
+    Company.objects.filter(company_id=f'{PREFIX}-CO').delete()
+
+
+def make_orders(skus, count, max_lines, retry_rate, seed):
+    rng = random.Random(seed)
+    orders = []
+    for _ in range(count):
+        lines = [{'sku': sku, 'quantity': rng.randint(1, 3)}
+                 for sku in rng.sample(skus, rng.randint(1, min(max_lines, len(skus))))]
+        order = (str(uuid.uuid4()), lines)
+        orders.append(order)
+        if rng.random() < retry_rate:
+            orders.append(order)  # Client retry with the same key
+    rng.shuffle(orders)
+    return orders
+
+
+def run(store_id, orders, workers):
+    results = []
+    lock = threading.Lock()
+
+    def checkout(order):
+        key, lines = order
+        started = time.perf_counter()
+        try:
+            _, created = reserve_stock(key, store_id, lines)
+            outcome = 'reserved' if created else 'replayed'
+        except InsufficientStock:
+            outcome = 'insufficient'
+        except OperationalError as e:
+            outcome = 'deadlock' if 'deadlock' in str(e).lower() else 'db_error'
+        finally:
+            connection.close()
+        with lock:
+            results.append((outcome, time.perf_counter() - started))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(checkout, orders))
+    return results, time.perf_counter() - started
+
+
+def verify(store_id, skus, stock):
+    reserved = {}
+    for reservation in StockReservation.objects.filter(store_id=store_id):
+        for line in reservation.lines:
+            reserved[line['sku']] = reserved.get(line['sku'], 0) + line['quantity']
+    quantities = dict(Inventory.objects.filter(store_id=store_id).values_list('product_id', 'quantity'))
+    ledger = dict(StockMovement.objects.filter(store_id=store_id).values('product_id')
+                  .annotate(total=Sum('quantity')).values_list('product_id', 'total'))
+    problems = []
+    for sku in skus:
+        if quantities[sku] < 0:
+            problems.append(f'{sku}: negative stock {quantities[sku]}')
+        if quantities[sku] != stock - reserved.get(sku, 0):
+            problems.append(f'{sku}: stock {quantities[sku]} != {stock} - {reserved.get(sku, 0)} reserved')
+        if ledger.get(sku, 0) != -reserved.get(sku, 0):
+            problems.append(f'{sku}: ledger {ledger.get(sku, 0)} != -{reserved.get(sku, 0)}')
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, default=200)
+    parser.add_argument('--orders', type=int, default=5000)
+    parser.add_argument('--hot-skus', type=int, default=5)
+    parser.add_argument('--stock', type=int, default=2000, help='Initial units per hot SKU')
+    parser.add_argument('--max-lines', type=int, default=3)
+    parser.add_argument('--retry-rate', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='Write results to this file')
+    parser.add_argument('--keep', action='store_true', help='Keep benchmark rows')
+    args = parser.parse_args()
+
+    cleanup()
+    store_id, skus = setup(args.hot_skus, args.stock)
+    orders = make_orders(skus, args.orders, args.max_lines, args.retry_rate, args.seed)
+    print(f'Running {len(orders):,} checkouts with {args.workers} workers on {connection.vendor}...')
+
+    results, elapsed = run(store_id, orders, args.workers)
+    problems = verify(store_id, skus, args.stock)
+
+    latencies = sorted(latency for _, latency in results)
+    outcomes = {}
+    for outcome, _ in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    report = {
+        'database': connection.vendor,
+        'workers': args.workers,
+        'requests': len(results),
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_rps': round(len(results) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+        'outcomes': outcomes,
+        'consistency_problems': problems,
+    }
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if not args.keep:
+        cleanup()
+    sys.exit(1 if problems or outcomes.get('deadlock') else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+"""
+Throughput of the development server against the production ASGI profile
+Execute: python benchmarks/throughput_benchmark.py [--scale 0.1] [--duration 10] [--concurrency 16] [--workers N]
+
+Seeds one database with the synthetic data generator, then starts each
+server in turn on a local port and drives it with --concurrency keep-alive
+client threads for --duration seconds per endpoint:
+- dev:        `manage.py runserver` with the development settings (DEBUG on)
+- production: gunicorn + uvicorn workers with settings_production
+              (DEBUG off, WhiteNoise static files, see gunicorn.conf.py)
+
+Records requests/second, p50/p95 latency and errors per endpoint and writes
+JSON (default benchmarks/results/throughput-<commit>.json).
+
+SQLite is used unless USE_POSTGRESQL=True; the production profile needs the
+Redis channel layer only for WebSocket traffic, which is not exercised here.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix='throughput-')
+
+# Setup Django (seeding only, the servers run in their own processes)
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'supply_unlimited.settings')
+os.environ.setdefault('SQLITE_NAME', os.path.join(WORKDIR, 'db.sqlite3'))
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.test import Client  # noqa: E402
+
+from users.synthetic_data import GeneratorConfig, generate  # noqa: E402
+
+# (name, path)
+ENDPOINTS = [
+    ('inventory_data', '/api/inventory/'),
+    ('notifications_unread_count', '/api/notifications/unread_count/'),
+    ('static_js', '/static/js/dashboard.js'),
+]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True, cwd=BASE_DIR,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def seed(scale, days):
+    """Migrated and generated database plus a logged-in session cookie shared by both servers"""
+    call_command('migrate', verbosity=0)
+    counts = generate(GeneratorConfig(scale=scale, days=days))
+    user, _ = User.objects.get_or_create(username='bench', defaults={'is_superuser': True, 'is_staff': True})
+    client = Client()
+    client.force_login(user)
+    return counts, client.cookies[settings.SESSION_COOKIE_NAME].value
+
+
+def start_server(mode, port, args):
+    env = {
+        **os.environ,
+        'SECRET_KEY': settings.SECRET_KEY,  # The session cookie is bound to it
+        'ALLOWED_HOSTS': '127.0.0.1,localhost',
+    }
+    if mode == 'dev':
+        env['DJANGO_SETTINGS_MODULE'] = args.dev_settings
+        command = [sys.executable, 'manage.py', 'runserver', '--noreload', f'127.0.0.1:{port}']
+    else:
+        env.update(DJANGO_SETTINGS_MODULE=args.prod_settings, STATIC_ROOT=os.path.join(WORKDIR, 'static'),
+                   ACCESS_LOG='', LOG_LEVEL='warning')
+        if args.workers:
+            env['WEB_CONCURRENCY'] = str(args.workers)
+        subprocess.run([sys.executable, 'manage.py', 'collectstatic', '--noinput', '-v0'],
+                       cwd=BASE_DIR, env=env, check=True)
+        command = ['gunicorn', 'supply_unlimited.asgi:application', '-c', 'gunicorn.conf.py',
+                   '--bind', f'127.0.0.1:{port}']
+
+    # runserver logs every request; a file, unlike a pipe nobody reads, never blocks the server
+    log_path = os.path.join(WORKDIR, f'{mode}.log')
+    with open(log_path, 'w') as log:
+        process = subprocess.Popen(command, cwd=BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            with open(log_path) as log:
+                raise RuntimeError(f'{mode} server exited:\n{log.read()}')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'{mode} server did not start listening on port {port}')
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def load(port, path, cookie, concurrency, duration):
+    """`concurrency` keep-alive clients hitting one path until the deadline"""
+    latencies, errors, retries = [], [], []
+    lock = threading.Lock()
+    headers = {'Cookie': f'{settings.SESSION_COOKIE_NAME}={cookie}', 'Accept-Encoding': 'gzip'}
+    deadline = time.perf_counter() + duration
+
+    def client():
+        local, failed, reconnects = [], 0, 0
+        conn, reused = http.client.HTTPConnection('127.0.0.1', port, timeout=30), False
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                conn.request('GET', path, headers=headers)
+                response = conn.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                # A kept-alive connection closed by the server (e.g. a recycled worker) is retried, not an error
+                if reused:
+                    reconnects += 1
+                else:
+                    failed += 1
+                conn.close()
+                conn, reused = http.client.HTTPConnection('127.0.0.1', port, timeout=30), False
+                continue
+            local.append(time.perf_counter() - started)
+            if response.status != 200:
+                failed += 1
+            if response.will_close:
+                conn.close()
+                conn, reused = http.client.HTTPConnection('127.0.0.1', port, timeout=30), False
+            else:
+                reused = True
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors.append(failed)
+            retries.append(reconnects)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors),
+        'reconnects': sum(retries),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2) if latencies else None,
+        'p95_ms': round(latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000, 2) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--scale', type=float, default=0.1, help='Generator scale factor')
+    parser.add_argument('--days', type=int, default=30, help='Days of generated sales history')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds of load per endpoint')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent keep-alive clients')
+    parser.add_argument('--workers', type=int, help='gunicorn workers in production mode (default 2 x CPU + 1)')
+    parser.add_argument('--modes', default='dev,production')
+    parser.add_argument('--only', help='Comma separated endpoint names')
+    parser.add_argument('--dev-settings', default='supply_unlimited.settings')
+    parser.add_argument('--prod-settings', default='supply_unlimited.settings_production')
+    parser.add_argument('--output', help='Result file (default benchmarks/results/throughput-<commit>.json)')
+    args = parser.parse_args()
+
+    endpoints = [e for e in ENDPOINTS if not args.only or e[0] in args.only.split(',')]
+    counts, cookie = seed(args.scale, args.days)
+    print(f'Seeded {counts["sales"]:,} sales, {counts["inventory"]:,} inventory rows')
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'database': 'postgresql' if os.getenv('USE_POSTGRESQL') == 'True' else 'sqlite',
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'scale': args.scale,
+        'rows': counts,
+        'duration_s': args.duration,
+        'concurrency': args.concurrency,
+        'workers': args.workers,
+        'modes': {},
+    }
+
+    for mode in args.modes.split(','):
+        port = free_port()
+        process = start_server(mode, port, args)
+        try:
+            print(f'{mode}:')
+            results = {}
+            for name, path in endpoints:
+                load(port, path, cookie, min(args.concurrency, 4), min(args.duration, 1))  # Warm up
+                results[name] = r = load(port, path, cookie, args.concurrency, args.duration)
+                print(f'  {name:<30} {r["rps"]:>9,.1f} req/s  p50 {r["p50_ms"]:>9}ms  p95 {r["p95_ms"]:>9}ms  '
+                      f'{r["errors"]} errors')
+            report['modes'][mode] = results
+        finally:
+            stop_server(process)
+
+    if {'dev', 'production'} <= report['modes'].keys():
+        for name, _ in endpoints:
+            dev, production = report['modes']['dev'][name]['rps'], report['modes']['production'][name]['rps']
+            if dev:
+                print(f'  {name:<30} production/dev throughput x{production / dev:.2f}')
+
+    output = args.output or os.path.join(BASE_DIR, 'benchmarks', 'results', f'throughput-{commit}.json')
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Wrote {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -24,9 +24,20 @@ else:
     print('Superuser already exists')
 END
 
+# Production profile: settings_production.py (DEBUG off, WhiteNoise, Redis channel layer)
+if [ "$SERVER_MODE" = "production" ]; then
+  export DJANGO_SETTINGS_MODULE=supply_unlimited.settings_production
+fi
+
 # Collect static files
 echo "Collecting static files..."
 python manage.py collectstatic --noinput || true
 
+# SERVER_MODE=production: multi-worker ASGI server (gunicorn + uvicorn workers, see gunicorn.conf.py)
+if [ "$SERVER_MODE" = "production" ]; then
+  echo "Starting gunicorn..."
+  exec gunicorn supply_unlimited.asgi:application
+fi
+
 echo "Starting Django server..."
 exec python manage.py runserver 0.0.0.0:8000
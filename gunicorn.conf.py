@@ -0,0 +1,44 @@
+"""
+Gunicorn configuration for the production ASGI server
+Execute: gunicorn supply_unlimited.asgi:application  (this file is picked up from the working directory)
+
+- uvicorn workers run the Channels ASGI application (HTTP and WebSockets)
+- WEB_CONCURRENCY workers (default 2 x CPU + 1)
+- workers are recycled after MAX_REQUESTS requests (+ jitter, so they do not restart together)
+- `kill -HUP <master pid>` reloads code and configuration gracefully: new workers start
+  before old ones stop, and old workers get GRACEFUL_TIMEOUT seconds to finish their requests
+- with PROMETHEUS_MULTIPROC_DIR set, the directory is emptied on start and the samples of
+  dead workers are merged, see users/metrics.py
+"""
+
+import multiprocessing
+import os
+import shutil
+
+bind = os.getenv('BIND', '0.0.0.0:8000')
+worker_class = 'uvicorn_worker.UvicornWorker'
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+max_requests = int(os.getenv('MAX_REQUESTS', '2000'))
+max_requests_jitter = int(os.getenv('MAX_REQUESTS_JITTER', '200'))
+timeout = int(os.getenv('WORKER_TIMEOUT', '120'))  # AI reports call the LLM synchronously
+graceful_timeout = int(os.getenv('GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('KEEPALIVE', '5'))
+
+accesslog = os.getenv('ACCESS_LOG', '-') or None
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info')
+forwarded_allow_ips = os.getenv('FORWARDED_ALLOW_IPS', '127.0.0.1')
+
+
+def on_starting(server):
+    multiproc_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if multiproc_dir:
+        shutil.rmtree(multiproc_dir, ignore_errors=True)
+        os.makedirs(multiproc_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
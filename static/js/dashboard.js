@@ -1,6 +1,7 @@
 // Dashboard JavaScript
 let allInventoryData = [];
 let allCompaniesData = [];
+let bootstrapLoaded = false;  // Inventory and companies already loaded by loadBootstrap()
 let chartInstances = {};
 
 // Clear localStorage on logout to prevent cached data from showing
@@ -50,8 +51,59 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Update time every minute
     setInterval(updateHeroDate, 60000);
+    
+    loadBootstrap();
 });
 
+// Load KPIs, filter options, inventory and companies in one request.
+// filterInventory() filters in the browser, so ask for the same 500 rows /api/inventory/ returns
+async function loadBootstrap() {
+    try {
+        const response = await fetch('/api/dashboard/bootstrap/?page_size=500', {
+            headers: {
+                'X-Requested-With': 'XMLHttpRequest'
+            },
+            redirect: 'error'  // Don't follow redirects, treat as error
+        });
+        
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+        }
+        
+        const result = await response.json();
+        allInventoryData = result.inventory.rows.map(mapInventoryItem);
+        allCompaniesData = result.companies;
+        bootstrapLoaded = true;
+        
+        renderInventoryTable(allInventoryData);
+        renderCompaniesTable(allCompaniesData);
+        setTimeout(() => {
+            attachCompanyViewListeners();
+        }, 100);
+        // Facet counts cover all inventory: only show them when every row was loaded
+        const complete = result.inventory.rows.length >= result.inventory.total;
+        populateFilters(complete ? result.facets.category : undefined);
+        renderInventoryKpis(result.kpis);
+    } catch (error) {
+        // Fall back to the per-section endpoints
+        console.error('Error loading dashboard bootstrap:', error);
+        loadInventory();
+        loadCompanies();
+    }
+}
+
+// Fill the inventory KPI cards from the KPI engine summary
+function renderInventoryKpis(kpis) {
+    const totalUnits = document.getElementById('inv-kpi-1');
+    const workingCapital = document.getElementById('inv-kpi-3');
+    if (totalUnits) {
+        totalUnits.textContent = (kpis.total_units / 1000000).toFixed(2);
+    }
+    if (workingCapital) {
+        workingCapital.textContent = (kpis.total_value / 1000000).toFixed(3) + 'M €';
+    }
+}
+
 // Navigation
 function showSection(sectionName) {
     // Hide all sections
@@ -87,13 +139,13 @@ function showSection(sectionName) {
         }
     }
     
-    // Load data for specific sections
+    // Load data for specific sections (the refresh buttons reload explicitly)
     if (sectionName === 'companies') {
-        loadCompanies();
+        if (!bootstrapLoaded) loadCompanies();
     } else if (sectionName === 'dashboard') {
-        loadInventory();
+        if (!bootstrapLoaded) loadInventory();
     } else if (sectionName === 'inventory') {
-        loadInventory();
+        if (!bootstrapLoaded) loadInventory();
     } else if (sectionName === 'reports') {
         showSubsection('reports', 'analytics');
     } else if (sectionName === 'settings') {
@@ -280,16 +332,7 @@ async function loadInventory() {
         const result = await response.json();
         // Map API response format to frontend format
         const rawData = result.results || result.data || [];
-        allInventoryData = rawData.map(item => ({
-            id: item.id || null,
-            sku: item.product_sku || 'N/A',
-            name: item.product_name || 'N/A',
-            category: item.category || 'General',
-            store: item.store_name || 'N/A',
-            stock: item.quantity || 0,
-            price: item.price || 0,
-            status: item.stock_status || 'in-stock'
-        }));
+        allInventoryData = rawData.map(mapInventoryItem);
         renderInventoryTable(allInventoryData);
         populateFilters();
     } catch (error) {
@@ -298,6 +341,20 @@ async function loadInventory() {
     }
 }
 
+// Accepts both the /api/inventory/ row format and the legacy field names
+function mapInventoryItem(item) {
+    return {
+        id: item.id || null,
+        sku: item.sku || item.product_sku || 'N/A',
+        name: item.name || item.product_name || 'N/A',
+        category: item.category || 'General',
+        store: item.store || item.store_name || 'N/A',
+        stock: item.stock ?? item.quantity ?? 0,
+        price: item.price || 0,
+        status: item.status || item.stock_status || 'in-stock'
+    };
+}
+
 // Refresh inventory
 function refreshInventory() {
     loadInventory();
@@ -394,17 +451,17 @@ function attachInventoryViewListeners() {
     });
 }
 
-// Populate filter options
-function populateFilters() {
-    const categories = [...new Set(allInventoryData.map(item => item.category))];
+// Populate filter options (category facets with row counts from the API, else the categories on the loaded page)
+function populateFilters(categoryFacets) {
+    const categories = categoryFacets || [...new Set(allInventoryData.map(item => item.category))].map(value => ({ value }));
     const categorySelect = document.getElementById('categoryFilter');
     
     if (categorySelect) {
-        categories.forEach(cat => {
-            if (!categorySelect.querySelector(`option[value="${cat}"]`)) {
+        categories.forEach(facet => {
+            if (!categorySelect.querySelector(`option[value="${facet.value}"]`)) {
                 const option = document.createElement('option');
-                option.value = cat;
-                option.textContent = cat;
+                option.value = facet.value;
+                option.textContent = facet.count === undefined ? facet.value : `${facet.value} (${facet.count})`;
                 categorySelect.appendChild(option);
             }
         });
@@ -48,13 +48,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'users.metrics.RequestMetricsMiddleware',  # First, so it times everything below
+    'users.instrumentation.RequestInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'users.db_router.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'users.profiling.ProfilingMiddleware',  # Last, it calls the view itself
 ]
 
 ROOT_URLCONF = 'supply_unlimited.urls'
@@ -82,7 +86,15 @@ WSGI_APPLICATION = 'supply_unlimited.wsgi.application'
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
 # Use PostgreSQL in Docker, SQLite for local development
+# Connections are kept open for DB_CONN_MAX_AGE seconds and checked before reuse;
+# DB_POOL=True uses a psycopg 3 connection pool per worker instead (DB_POOL_MIN_SIZE/DB_POOL_MAX_SIZE)
+DB_POOL_OPTIONS = {
+    'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+    'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+    'timeout': int(os.getenv('DB_POOL_TIMEOUT', '10')),
+}
 if os.getenv('USE_POSTGRESQL', 'False') == 'True':
+    DB_POOL = os.getenv('DB_POOL', 'False') == 'True'
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.postgresql',
@@ -91,15 +103,45 @@ if os.getenv('USE_POSTGRESQL', 'False') == 'True':
             'PASSWORD': os.getenv('DB_PASSWORD', 'postgres'),
             'HOST': os.getenv('DB_HOST', 'db'),
             'PORT': os.getenv('DB_PORT', '5432'),
+            'CONN_MAX_AGE': 0 if DB_POOL else int(os.getenv('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {'pool': DB_POOL_OPTIONS} if DB_POOL else {},
         }
     }
+    # Streaming replica for read-only analytics (see DATABASE_ROUTING); tests read through the primary
+    if os.getenv('DB_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.getenv('DB_REPLICA_HOST'),
+            'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+            'TEST': {'MIRROR': 'default'},
+        }
 else:
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'db.sqlite3',
+            'NAME': os.getenv('SQLITE_NAME', BASE_DIR / 'db.sqlite3'),
         }
     }
+    # Second local database acting as the replica, to exercise the router without PostgreSQL
+    if os.getenv('SQLITE_REPLICA_NAME'):
+        DATABASES['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('SQLITE_REPLICA_NAME'),
+        }
+
+DATABASE_ROUTERS = ['users.db_router.PrimaryReplicaRouter']
+
+# Read-only analytics views (URL names) read from the REPLICA alias when it is configured;
+# after a write the client reads from the primary for STICKY_SECONDS (read-your-writes)
+DATABASE_ROUTING = {
+    'REPLICA': 'replica',
+    'APPS': ['users'],
+    'READ_ROUTES': [
+        'inventory_data', 'sales_data', 'export_inventory', 'api_inventory', 'api_sales', 'api_inventory_export',
+    ],
+    'STICKY_SECONDS': int(os.getenv('DB_REPLICA_STICKY_SECONDS', '10')),
+}
 
 
 # Password validation
@@ -168,3 +210,120 @@ CHANNEL_LAYERS = {
     }
 }
 
+
+# ============================================
+# AI Reports - LLM gateway
+# ============================================
+
+# CLIENT: 'auto' (OpenAI for gpt-* when OPENAI_API_KEY is set; otherwise reports have no LLM narrative)
+#         or 'fake' (local deterministic model, for tests and benchmarks)
+# CACHE_BACKEND: 'sqlite' (shared on-disk cache), 'memory' (per process) or 'none'
+AI_REPORTS_LLM = {
+    'CLIENT': os.getenv('AI_REPORTS_LLM_CLIENT', 'auto'),
+    'CACHE_BACKEND': os.getenv('AI_REPORTS_LLM_CACHE', 'sqlite'),
+    'CACHE_PATH': os.getenv('AI_REPORTS_LLM_CACHE_PATH', str(BASE_DIR / 'llm_cache.sqlite3')),
+    'CACHE_MAX_ENTRIES': int(os.getenv('AI_REPORTS_LLM_CACHE_MAX_ENTRIES', '10000')),
+    'CACHE_TTL_SECONDS': int(os.getenv('AI_REPORTS_LLM_CACHE_TTL', '86400')),
+}
+
+
+# ============================================
+# Replenishment planner
+# ============================================
+
+# Defaults for reorder points and order quantities (users/replenishment.py)
+REPLENISHMENT = {
+    'LEAD_TIME_DAYS': float(os.getenv('REPLENISHMENT_LEAD_TIME_DAYS', '7')),
+    'REVIEW_PERIOD_DAYS': float(os.getenv('REPLENISHMENT_REVIEW_PERIOD_DAYS', '7')),
+    'SERVICE_LEVEL': float(os.getenv('REPLENISHMENT_SERVICE_LEVEL', '0.95')),
+    'PERIOD_DAYS': int(os.getenv('REPLENISHMENT_PERIOD_DAYS', '90')),
+}
+
+
+# ============================================
+# Warehouse slotting
+# ============================================
+
+# Days of sales counted as picks when ranking SKUs by velocity (users/slotting.py)
+SLOTTING = {
+    'PERIOD_DAYS': int(os.getenv('SLOTTING_PERIOD_DAYS', '90')),
+}
+
+
+# ============================================
+# Request instrumentation
+# ============================================
+
+# Query count and DB/render/total time per request (users/instrumentation.py)
+# SAMPLE_RATE: share of requests measured; SLOW_QUERY_MS: log slower queries with their origin (0 = off)
+# One JSON line per measured request is logged when REQUEST_LOG_LEVEL=INFO
+REQUEST_INSTRUMENTATION = {
+    'ENABLED': os.getenv('REQUEST_INSTRUMENTATION', 'True') == 'True',
+    'SAMPLE_RATE': float(os.getenv('REQUEST_INSTRUMENTATION_SAMPLE_RATE', '1.0')),
+    'SERVER_TIMING': os.getenv('REQUEST_INSTRUMENTATION_SERVER_TIMING', str(DEBUG)) == 'True',
+    'SLOW_QUERY_MS': float(os.getenv('SLOW_QUERY_MS', '0')),
+}
+
+
+# ============================================
+# Response cache
+# ============================================
+
+# Dashboard JSON APIs cached per filters/permission scope and invalidated by table versions (users/response_cache.py)
+# LRU_SIZE/LRU_TIMEOUT: entries kept in each process in front of the Django cache; TIMEOUT: seconds in the Django cache
+RESPONSE_CACHE = {
+    'ENABLED': os.getenv('RESPONSE_CACHE', 'True') == 'True',
+    'LRU_SIZE': int(os.getenv('RESPONSE_CACHE_LRU_SIZE', '256')),
+    'LRU_TIMEOUT': int(os.getenv('RESPONSE_CACHE_LRU_TIMEOUT', '30')),
+    'TIMEOUT': int(os.getenv('RESPONSE_CACHE_TIMEOUT', '300')),
+}
+
+
+# ============================================
+# Metrics
+# ============================================
+
+# Prometheus metrics on /metrics (users/metrics.py) for staff users and scrapers sending "Authorization: Bearer <TOKEN>"
+# PUBLIC: without a TOKEN, anyone may scrape (off in the production profile)
+# Multi-process servers: set PROMETHEUS_MULTIPROC_DIR to a directory shared by the workers
+METRICS = {
+    'TOKEN': os.getenv('METRICS_TOKEN', ''),
+    'PUBLIC': os.getenv('METRICS_PUBLIC', 'True') == 'True',
+}
+
+
+# ============================================
+# Profiling
+# ============================================
+
+# Opt-in profiling of staff requests (users/profiling.py): send "X-Profile: cprofile|sample" or list URL names in ROUTES
+# MODE: 'cprofile' (.prof pstats) or 'sample' (.folded stacks for flamegraphs); only the newest MAX_FILES are kept
+PROFILING = {
+    'ENABLED': os.getenv('PROFILING_ENABLED', 'False') == 'True',
+    'ROUTES': [route for route in os.getenv('PROFILING_ROUTES', '').split(',') if route],
+    'MODE': os.getenv('PROFILING_MODE', 'cprofile'),
+    'SAMPLE_INTERVAL_MS': float(os.getenv('PROFILING_SAMPLE_INTERVAL_MS', '5')),
+    'DIRECTORY': os.getenv('PROFILING_DIR', str(BASE_DIR / 'profiles')),
+    'MAX_FILES': int(os.getenv('PROFILING_MAX_FILES', '50')),
+}
+
+
+# ============================================
+# Logging
+# ============================================
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'supply_unlimited.requests': {
+            'handlers': ['console'],
+            'level': os.getenv('REQUEST_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+        'supply_unlimited.slow_queries': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
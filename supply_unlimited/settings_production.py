@@ -0,0 +1,113 @@
+"""
+Production settings profile for supply_unlimited.
+
+Select with DJANGO_SETTINGS_MODULE=supply_unlimited.settings_production
+(entrypoint.sh does this when SERVER_MODE=production) and serve with
+gunicorn + uvicorn workers, see gunicorn.conf.py.
+
+Differences from the development settings:
+- DEBUG off, so connections no longer keep every executed query in memory
+- secret key and allowed hosts from the environment
+- static files served by WhiteNoise from STATIC_ROOT with compressed,
+  content-hashed names (collectstatic) and far-future cache headers
+- pooled database connections (DB_POOL defaults to True, CONN_MAX_AGE 0)
+- Redis cache and channel layer, shared by every worker
+- request instrumentation sampled instead of measuring every request
+- /metrics only for staff users and scrapers sending METRICS_TOKEN
+"""
+
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES, DB_POOL_OPTIONS, METRICS, MIDDLEWARE, REQUEST_INSTRUMENTATION, STATIC_ROOT
+
+DEBUG = os.getenv('DEBUG', 'False') == 'True'
+
+SECRET_KEY = os.environ['SECRET_KEY']
+
+ALLOWED_HOSTS = [host.strip() for host in os.getenv('ALLOWED_HOSTS', 'localhost').split(',') if host.strip()]
+CSRF_TRUSTED_ORIGINS = [origin for origin in os.getenv('CSRF_TRUSTED_ORIGINS', '').split(',') if origin]
+
+
+# ============================================
+# Static files (WhiteNoise)
+# ============================================
+
+STATIC_ROOT = os.getenv('STATIC_ROOT', STATIC_ROOT)
+
+# Right after SecurityMiddleware, so static files skip sessions, auth and instrumentation
+MIDDLEWARE = list(MIDDLEWARE)
+MIDDLEWARE.insert(MIDDLEWARE.index('django.middleware.security.SecurityMiddleware') + 1,
+                  'whitenoise.middleware.WhiteNoiseMiddleware')
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
+
+# ============================================
+# Database
+# ============================================
+
+# Under ASGI sync code runs in executor threads and each thread keeps its own persistent
+# connection, so CONN_MAX_AGE connections pile up; the psycopg pool shares them per worker
+DB_POOL = os.getenv('DB_POOL', 'True') == 'True'
+for database in DATABASES.values():
+    if database['ENGINE'] == 'django.db.backends.postgresql':
+        database['CONN_MAX_AGE'] = 0
+        database['OPTIONS'] = {'pool': DB_POOL_OPTIONS} if DB_POOL else {}
+
+
+# ============================================
+# Cache
+# ============================================
+
+# Shared by all workers: response cache entries and table versions must be the same everywhere
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_REDIS_URL', os.getenv('REDIS_URL', 'redis://redis:6379') + '/1'),
+    },
+}
+
+
+# ============================================
+# Channels
+# ============================================
+
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'CONFIG': {
+            'hosts': [os.getenv('REDIS_URL', 'redis://redis:6379')],
+            'capacity': 1500,
+            'expiry': 10,
+        },
+    },
+}
+
+
+# ============================================
+# Request instrumentation
+# ============================================
+
+REQUEST_INSTRUMENTATION = {
+    **REQUEST_INSTRUMENTATION,
+    'SAMPLE_RATE': float(os.getenv('REQUEST_INSTRUMENTATION_SAMPLE_RATE', '0.1')),
+    'SERVER_TIMING': os.getenv('REQUEST_INSTRUMENTATION_SERVER_TIMING', 'False') == 'True',
+}
+
+
+# ============================================
+# Metrics
+# ============================================
+
+METRICS = {
+    **METRICS,
+    'PUBLIC': os.getenv('METRICS_PUBLIC', 'False') == 'True',
+}
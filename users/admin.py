@@ -1,7 +1,8 @@
 from django.contrib import admin
 from .models import (
     Company, Store, Category, Product, Warehouse, WarehouseLocation,
-    Inventory, Sale, DashboardMetrics, Permission, Role, UserRole, AuditLog, Notification
+    Inventory, Sale, DashboardMetrics, Permission, Role, UserRole, AuditLog, Notification,
+    StockMovement, StockSnapshot, StockReservation
 )
 
 # Register existing models
@@ -53,3 +54,32 @@ class NotificationAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'title', 'message')
     readonly_fields = ('created_at', 'updated_at')
     date_hierarchy = 'created_at'
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ('id', 'movement_type', 'product', 'store', 'quantity', 'reference', 'occurred_at', 'applied')
+    list_filter = ('movement_type', 'applied', 'occurred_at')
+    search_fields = ('product__sku', 'store__store_id', 'reference')
+    raw_id_fields = ('product', 'store', 'location', 'created_by')
+    date_hierarchy = 'occurred_at'
+
+    # The ledger is append-only: corrections are new adjustment movements
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('taken_at', 'product', 'store', 'quantity')
+    list_filter = ('taken_at',)
+    search_fields = ('product__sku', 'store__store_id')
+    raw_id_fields = ('product', 'store')
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('idempotency_key', 'store', 'status', 'user', 'created_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('idempotency_key', 'store__store_id')
+    readonly_fields = ('idempotency_key', 'request_hash', 'lines', 'created_at', 'updated_at')
@@ -9,3 +9,5 @@ class UsersConfig(AppConfig):
         Import signals when the app is ready to ensure they are registered.
         """
         import users.signals  # noqa: F401
+        from users import instrumentation, metrics
+        instrumentation.add_listener(metrics.observe_request)
@@ -0,0 +1,279 @@
+"""
+Bulk stock adjustments and transfers
+
+Applies thousands of stock lines in one transaction:
+
+- adjustment  {"sku", "store" | "location_id", "delta"}
+- set         {"sku", "store" | "location_id", "quantity"}   absolute count (ERP sync)
+- transfer    {"sku", "from_store" | "from_location_id", "to_store" | "to_location_id", "quantity"}
+
+Validation uses one query per table (products, stores, locations,
+inventory rows locked with SELECT ... FOR UPDATE). Changes are aggregated
+per row and written with bulk_update and F() expressions, new Inventory
+rows with bulk_create, and every change is recorded in the StockMovement
+ledger. A location line also moves the store Inventory it belongs to.
+
+Each line gets its own result. Lines that would drive stock negative are
+rejected; with atomic=True a single rejected line rejects the whole batch.
+A request that loses the race to create a new Inventory row is rolled back
+and validated again against that row (ConcurrentStockUpdate, 409, after
+CREATE_ATTEMPTS tries).
+"""
+
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Inventory, Product, StockMovement, Store, WarehouseLocation
+from .response_cache import bump_models
+
+MAX_LINES = 20000
+CREATE_ATTEMPTS = 3  # Tries when concurrent requests create the same new Inventory rows
+
+
+class BulkStockError(Exception):
+    """The request itself is invalid (not a single line)"""
+    status_code = 400
+
+
+class ConcurrentStockUpdate(BulkStockError):
+    """Concurrent requests kept creating the same new Inventory rows; nothing was applied"""
+    status_code = 409
+
+
+@dataclass
+class _Leg:
+    """One signed change of one Inventory row (and optionally one location)"""
+    sku: str
+    store_id: Optional[str]
+    location_id: Optional[int]
+    delta: int = 0
+    absolute: Optional[int] = None
+
+
+@dataclass
+class _Line:
+    index: int
+    kind: str
+    legs: List[_Leg] = field(default_factory=list)
+    error: Optional[str] = None
+    quantities: List[int] = field(default_factory=list)
+
+
+def _int(value, name: str) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an integer")
+
+
+def _parse(index: int, raw: Dict[str, Any]) -> _Line:
+    """Turn a request line into legs; parsing errors are kept on the line"""
+    line = _Line(index=index, kind='adjustment')
+    try:
+        if not isinstance(raw, dict) or not raw.get('sku'):
+            raise ValueError('sku is required')
+        sku = str(raw['sku'])
+
+        if any(key in raw for key in ('from_store', 'from_location_id', 'to_store', 'to_location_id')):
+            line.kind = 'transfer'
+            quantity = _int(raw.get('quantity'), 'quantity')
+            if quantity <= 0:
+                raise ValueError('quantity must be positive')
+            source = _Leg(sku, raw.get('from_store'), raw.get('from_location_id'), -quantity)
+            target = _Leg(sku, raw.get('to_store'), raw.get('to_location_id'), quantity)
+            line.legs = [source, target]
+        elif 'delta' in raw:
+            line.legs = [_Leg(sku, raw.get('store'), raw.get('location_id'), _int(raw['delta'], 'delta'))]
+        elif 'quantity' in raw:
+            line.kind = 'set'
+            absolute = _int(raw['quantity'], 'quantity')
+            if absolute < 0:
+                raise ValueError('quantity cannot be negative')
+            line.legs = [_Leg(sku, raw.get('store'), raw.get('location_id'), absolute=absolute)]
+        else:
+            raise ValueError('line needs delta, quantity or a transfer source/target')
+
+        for leg in line.legs:
+            if leg.location_id is not None:
+                leg.location_id = _int(leg.location_id, 'location_id')
+            elif not leg.store_id:
+                raise ValueError('store or location_id is required')
+            if leg.store_id is not None:
+                leg.store_id = str(leg.store_id)
+    except ValueError as e:
+        line.error = str(e)
+    return line
+
+
+def apply_stock_lines(raw_lines: List[Dict[str, Any]], user=None, reference: str = '',
+                      atomic: bool = False) -> Dict[str, Any]:
+    """
+    Validate and apply a batch of stock lines.
+
+    Returns:
+        {'reference', 'applied', 'rejected', 'results': [{'line', 'status', ...}]}
+    """
+    if not isinstance(raw_lines, list) or not raw_lines:
+        raise BulkStockError('lines must be a non-empty list')
+    if len(raw_lines) > MAX_LINES:
+        raise BulkStockError(f"At most {MAX_LINES} lines per request")
+
+    reference = reference or f"bulk-{uuid.uuid4().hex[:12]}"
+    for attempt in range(CREATE_ATTEMPTS):
+        # Parsed again on every attempt: validation resolves legs in place
+        lines = [_parse(index, raw) for index, raw in enumerate(raw_lines)]
+        try:
+            accepted, rejected = _apply(lines, user, reference, atomic)
+            break
+        except IntegrityError:
+            # Another request created one of our new (sku, store) rows first: rolled back,
+            # the next attempt locks that row and validates against its quantity
+            if attempt == CREATE_ATTEMPTS - 1:
+                raise ConcurrentStockUpdate('Stock rows changed concurrently, retry the request')
+
+    results = []
+    for line in lines:
+        if line.error:
+            results.append({'line': line.index, 'status': 'rejected', 'error': line.error})
+        elif atomic and rejected:
+            results.append({'line': line.index, 'status': 'skipped'})
+        else:
+            results.append({'line': line.index, 'status': 'applied', 'type': line.kind,
+                            'quantities': line.quantities})
+    return {
+        'reference': reference,
+        'applied': len(accepted),
+        'rejected': len(rejected),
+        'results': results,
+    }
+
+
+def _apply(lines: List[_Line], user, reference: str, atomic: bool) -> Tuple[List[_Line], List[_Line]]:
+    """Validate and write the parsed lines in one transaction; returns (accepted, rejected)"""
+    legs = [leg for line in lines if not line.error for leg in line.legs]
+    with transaction.atomic():
+        # One query per table
+        skus = set(Product.objects.filter(sku__in={leg.sku for leg in legs}).values_list('sku', flat=True))
+        stores = set(Store.objects.filter(store_id__in={leg.store_id for leg in legs if leg.store_id})
+                     .values_list('store_id', flat=True))
+        locations = {
+            pk: (product_id, store_id, quantity)
+            for pk, product_id, store_id, quantity in WarehouseLocation.objects.select_for_update().filter(
+                id__in={leg.location_id for leg in legs if leg.location_id is not None}
+            ).order_by('id').values_list('id', 'product_id', 'warehouse__store_id', 'quantity')
+        }
+        for leg in legs:
+            if leg.location_id is not None and leg.location_id in locations:
+                leg.store_id = leg.store_id or locations[leg.location_id][1]
+
+        stock_keys = {(leg.sku, leg.store_id) for leg in legs}
+        inventory = {
+            (product_id, store_id): (pk, quantity)
+            for pk, product_id, store_id, quantity in Inventory.objects.select_for_update().filter(
+                product_id__in={sku for sku, _ in stock_keys}, store_id__in={s for _, s in stock_keys if s},
+            ).order_by('product_id', 'store_id').values_list('id', 'product_id', 'store_id', 'quantity')
+            if (product_id, store_id) in stock_keys
+        }
+
+        # Running quantities in line order
+        store_qty = {key: value[1] for key, value in inventory.items()}
+        location_qty = {pk: value[2] for pk, value in locations.items()}
+        accepted: List[_Line] = []
+        for line in lines:
+            if line.error:
+                continue
+            line.error = _check_line(line, skus, stores, locations, store_qty, location_qty)
+            if line.error is None:
+                accepted.append(line)
+
+        rejected = [line for line in lines if line.error]
+        if atomic and rejected:
+            accepted = []
+        else:
+            _write(accepted, inventory, user, reference)
+    return accepted, rejected
+
+
+def _check_line(line: _Line, skus, stores, locations, store_qty: Dict[Tuple[str, str], int],
+                location_qty: Dict[int, int]) -> Optional[str]:
+    """Validate a line against the fetched rows and advance the running quantities"""
+    for leg in line.legs:
+        if leg.sku not in skus:
+            return f"Unknown sku {leg.sku}"
+        if leg.location_id is not None:
+            location = locations.get(leg.location_id)
+            if location is None:
+                return f"Unknown location {leg.location_id}"
+            if location[0] != leg.sku or location[1] != leg.store_id:
+                return f"Location {leg.location_id} does not hold {leg.sku} in store {leg.store_id}"
+        elif leg.store_id not in stores:
+            return f"Unknown store {leg.store_id}"
+
+    # Resolve absolute counts into deltas, then check every leg before moving anything
+    new_store, new_location = {}, {}
+    for leg in line.legs:
+        key = (leg.sku, leg.store_id)
+        current = new_store.get(key, store_qty.get(key, 0))
+        if leg.absolute is not None:
+            base = location_qty[leg.location_id] if leg.location_id is not None else current
+            leg.delta = leg.absolute - base
+        if leg.location_id is not None:
+            location_after = new_location.get(leg.location_id, location_qty[leg.location_id]) + leg.delta
+            if location_after < 0:
+                return f"Location {leg.location_id} would go negative ({location_after})"
+            new_location[leg.location_id] = location_after
+        if current + leg.delta < 0:
+            return f"Stock of {leg.sku} in {leg.store_id} would go negative ({current + leg.delta})"
+        new_store[key] = current + leg.delta
+
+    store_qty.update(new_store)
+    location_qty.update(new_location)
+    line.quantities = [new_store[(leg.sku, leg.store_id)] for leg in line.legs]
+    return None
+
+
+def _write(lines: List[_Line], inventory: Dict[Tuple[str, str], Tuple[int, int]], user, reference: str) -> None:
+    """Aggregate accepted legs per row and write them in bulk"""
+    now = timezone.now()
+    store_deltas: Dict[Tuple[str, str], int] = {}
+    location_deltas: Dict[int, int] = {}
+    movements = []
+    for line in lines:
+        movement_type = 'transfer' if line.kind == 'transfer' else 'adjustment'
+        for leg in line.legs:
+            if not leg.delta:
+                continue
+            key = (leg.sku, leg.store_id)
+            store_deltas[key] = store_deltas.get(key, 0) + leg.delta
+            if leg.location_id is not None:
+                location_deltas[leg.location_id] = location_deltas.get(leg.location_id, 0) + leg.delta
+            movements.append(StockMovement(
+                product_id=leg.sku, store_id=leg.store_id, location_id=leg.location_id,
+                movement_type=movement_type, quantity=leg.delta, reference=reference,
+                occurred_at=now, created_by=user, applied=True,
+            ))
+
+    Inventory.objects.bulk_update(
+        [Inventory(id=inventory[key][0], quantity=F('quantity') + delta, last_restocked=now)
+         for key, delta in store_deltas.items() if key in inventory and delta],
+        ['quantity', 'last_restocked'],
+        batch_size=1000,
+    )
+    Inventory.objects.bulk_create(
+        [Inventory(product_id=sku, store_id=store_id, quantity=delta)
+         for (sku, store_id), delta in store_deltas.items() if (sku, store_id) not in inventory],
+        batch_size=1000,
+    )
+    WarehouseLocation.objects.bulk_update(
+        [WarehouseLocation(id=pk, quantity=F('quantity') + delta, last_updated=now)
+         for pk, delta in location_deltas.items() if delta],
+        ['quantity', 'last_updated'],
+        batch_size=1000,
+    )
+    StockMovement.objects.bulk_create(movements, batch_size=5000)
+    bump_models(Inventory)
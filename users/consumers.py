@@ -12,6 +12,8 @@ from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from django.contrib.auth.models import User
 
+from .metrics import NOTIFICATIONS_SENT, WEBSOCKET_CONNECTIONS
+
 logger = logging.getLogger(__name__)
 
 
@@ -54,6 +56,8 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         )
         
         await self.accept()
+        self.counted = True
+        WEBSOCKET_CONNECTIONS.inc()
         logger.info(f"User {self.user.username} connected to notifications")
 
     async def disconnect(self, close_code):
@@ -63,6 +67,9 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         - Removes user from their notification group
         - Logs the disconnection
         """
+        if getattr(self, 'counted', False):
+            WEBSOCKET_CONNECTIONS.dec()
+            self.counted = False
         if hasattr(self, 'user_group_name'):
             await self.channel_layer.group_discard(
                 self.user_group_name,
@@ -131,6 +138,7 @@ async def send_notification_to_user(user_id, notification_data):
     """
     channel_layer = get_channel_layer()
     user_group_name = f"notifications_{user_id}"
+    NOTIFICATIONS_SENT.labels(notification_data['notification_type']).inc()
     
     await channel_layer.group_send(
         user_group_name,
@@ -0,0 +1,131 @@
+"""
+Daily dashboard metrics
+
+DashboardMetrics holds one row per day, so the dashboard reads a few
+indexed rows instead of aggregating Sale on every page load:
+- total_revenue / total_orders  sum and count of the day's sales
+- active_customers              stores with at least one sale that day
+- total_products                products in stock (Inventory quantity > 0)
+                                when the day's row was last refreshed; the
+                                dashboard reads the current count instead,
+                                cached until the inventory table version
+                                changes (inventory writes do not touch
+                                these rows)
+
+Rows are maintained
+- incrementally: record_sale() adds a new sale to its day with F()
+  expressions (post_save in signals.py)
+- in bulk: refresh_days() recomputes a date range with one grouped query
+  and one upsert (import pipeline, reservations, `refresh_metrics` command)
+
+Run `manage.py refresh_metrics` once to backfill history, and periodically
+(e.g. `--days 1`) to record the in-stock count and repair any drift from
+concurrent first sales of a day.
+"""
+
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any, Dict, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DashboardMetrics, Inventory, Sale
+from .response_cache import cached_value
+
+DEFAULT_WINDOW_DAYS = 30
+SALE_FIELDS = ['total_revenue', 'total_orders', 'active_customers']
+
+
+def _day_bounds(day: date):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def products_in_stock() -> int:
+    return Inventory.objects.filter(quantity__gt=0).values('product').distinct().count()
+
+
+def refresh_days(start: date, end: date, batch_size: int = 1000) -> int:
+    """Recompute every day in [start, end] from Sale (days without sales become zero); returns the day count"""
+    range_start, range_end = _day_bounds(start)[0], _day_bounds(end)[1]
+    totals = {
+        row['day']: row for row in
+        Sale.objects.filter(sale_date__gte=range_start, sale_date__lt=range_end)
+        .annotate(day=TruncDate('sale_date')).values('day')
+        .annotate(revenue=Sum('total_amount'), orders=Count('pk'), stores=Count('store', distinct=True))
+        .order_by()
+    }
+    rows = []
+    for offset in range((end - start).days + 1):
+        day = start + timedelta(days=offset)
+        found = totals.get(day, {})
+        rows.append(DashboardMetrics(
+            metric_date=day,
+            total_revenue=found.get('revenue') or Decimal('0'),
+            total_orders=found.get('orders', 0),
+            active_customers=found.get('stores', 0),
+        ))
+
+    today = timezone.localdate()
+    with transaction.atomic():
+        DashboardMetrics.objects.bulk_create(rows, batch_size=batch_size, update_conflicts=True,
+                                             unique_fields=['metric_date'], update_fields=SALE_FIELDS)
+        if start <= today <= end:
+            DashboardMetrics.objects.filter(metric_date=today).update(total_products=products_in_stock())
+    return len(rows)
+
+
+def refresh_all(days: Optional[int] = None, batch_size: int = 1000) -> int:
+    """Backfill from the first sale (or the last `days` days) through today"""
+    today = timezone.localdate()
+    if days is not None:
+        return refresh_days(today - timedelta(days=max(1, days) - 1), today, batch_size)
+    first = Sale.objects.aggregate(first=Min('sale_date'))['first']
+    start = min(timezone.localdate(first), today) if first else today
+    return refresh_days(start, today, batch_size)
+
+
+def sale_day_range(sales) -> Optional[Tuple[date, date]]:
+    """First and last day of a Sale queryset (take it before deleting the rows), None if empty"""
+    bounds = sales.aggregate(first=Min('sale_date'), last=Max('sale_date'))
+    if bounds['first'] is None:
+        return None
+    return timezone.localdate(bounds['first']), timezone.localdate(bounds['last'])
+
+
+def record_sale(sale: Sale) -> None:
+    """Add a newly created sale to its day (the first sale of a day computes the row from Sale)"""
+    day = timezone.localdate(sale.sale_date)
+    start, end = _day_bounds(day)
+    new_store = not (Sale.objects.filter(store_id=sale.store_id, sale_date__gte=start, sale_date__lt=end)
+                     .exclude(pk=sale.pk).exists())
+    updated = DashboardMetrics.objects.filter(metric_date=day).update(
+        total_revenue=F('total_revenue') + Decimal(str(sale.total_amount)),
+        total_orders=F('total_orders') + 1,
+        active_customers=F('active_customers') + int(new_store),
+    )
+    if not updated:
+        refresh_days(day, day)
+
+
+def dashboard_summary(days: int = DEFAULT_WINDOW_DAYS) -> Dict[str, Any]:
+    """Dashboard cards: revenue and orders of the last `days` days, products in stock now, today's active stores"""
+    today = timezone.localdate()
+    current = DashboardMetrics.objects.filter(metric_date=today).first()
+    if current is None:
+        refresh_days(today, today)
+        current = DashboardMetrics.objects.get(metric_date=today)
+    window = DashboardMetrics.objects.filter(
+        metric_date__gt=today - timedelta(days=days), metric_date__lte=today,
+    ).aggregate(revenue=Sum('total_revenue'), orders=Sum('total_orders'))
+    return {
+        'metric_date': today,
+        'period_days': days,
+        'total_revenue': window['revenue'] or Decimal('0'),
+        'total_orders': window['orders'] or 0,
+        'total_products': cached_value('dashboard:products_in_stock', ('inventory',), products_in_stock),
+        'active_customers': current.active_customers,
+    }
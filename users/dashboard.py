@@ -0,0 +1,203 @@
+"""
+Dashboard bootstrap
+
+One payload with everything the dashboard needs for its first paint:
+- kpis:      inventory KPI summary (kpi_engine)
+- facets:    inventory filter values with row counts (inventory_facets)
+- inventory: first page_size inventory rows (the dashboard asks for the
+             500 rows /api/inventory/ returns and filters them itself)
+- companies: company list (same rows as /api/companies/)
+
+Each section is cached on its own with cached_value() and the table
+versions it depends on, so a new sale only recomputes the KPIs. Sections
+that miss the cache are computed concurrently on a process-wide pool of
+worker threads. Each worker keeps its database connection like a request
+thread does: close_old_connections() after every task honours
+CONN_MAX_AGE, and with DB_POOL the connection goes back to the pool.
+Inside a transaction (tests, ATOMIC_REQUESTS) sections run one after the
+other instead, because other connections cannot see its uncommitted rows.
+"""
+
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from django.db import close_old_connections, connection
+from django.db.models import Count, Q
+
+from .kpi_engine import DEFAULT_PERIOD_DAYS, build_inventory_kpis, summarize_inventory_kpis
+from .models import Company, Inventory
+from .response_cache import IGNORED_FILTER_VALUES, cached_value
+from .search import product_search_q
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+BOOTSTRAP_WORKERS = 4  # Shared by all requests of the process, one database connection each
+
+# Inventory filter dimensions: /api/inventory/ query parameter -> field
+FACET_FIELDS = {
+    'store': 'store__country',
+    'city': 'store__city',
+    'category': 'product__category__name',
+    'company': 'store__company__company_id',
+}
+FACET_LABELS = {'company': 'store__company__name'}
+
+# Stock tiers of the inventory filters (/api/inventory/?stock=...)
+STOCK_LEVELS = {
+    'in-stock': Q(quantity__gt=20),
+    'low-stock': Q(quantity__lte=20, quantity__gt=0),
+    'out-of-stock': Q(quantity=0),
+}
+# Also accepted by the filter: the status shown on each row
+STOCK_FILTERS = {
+    **STOCK_LEVELS,
+    'Low': Q(quantity__lt=50),
+    'Medium': Q(quantity__gte=50, quantity__lt=200),
+    'High': Q(quantity__gte=200),
+}
+
+KPI_TABLES = ('inventory', 'sale', 'product', 'category', 'store', 'warehouselocation')
+FACET_TABLES = ('inventory', 'product', 'category', 'store', 'company')
+INVENTORY_TABLES = ('inventory', 'product', 'category', 'store', 'company')
+COMPANY_TABLES = ('company',)
+TABLES = tuple(sorted(set(KPI_TABLES + FACET_TABLES + INVENTORY_TABLES + COMPANY_TABLES)))
+
+
+def inventory_row(item: Inventory) -> Dict[str, Any]:
+    """One /api/inventory/ row; needs product, product__category and store loaded"""
+    if item.quantity >= 200:
+        status = 'High'
+    elif item.quantity >= 50:
+        status = 'Medium'
+    else:
+        status = 'Low'
+    return {
+        'id': item.id,
+        'sku': item.product.sku,
+        'name': item.product.name,
+        'category': item.product.category.name if item.product.category else 'N/A',
+        'store': item.store.country,
+        'stock': item.quantity,
+        'price': float(item.product.price),
+        'status': status,
+    }
+
+
+def company_row(company: Company) -> Dict[str, Any]:
+    """One /api/companies/ row; needs parent loaded"""
+    return {
+        'id': str(company.company_id),
+        'name': company.name,
+        'parent_name': company.parent.name if company.parent else None,
+        'city': company.city,
+        'country': company.country,
+        'ownership': 100 if not company.parent else 50,  # Mock ownership %
+        'status': company.status,
+    }
+
+
+# ============================================
+# Filters and facets
+# ============================================
+
+def inventory_filters(params, exclude: Optional[str] = None) -> Q:
+    """Q for the /api/inventory/ filters in `params` (QueryDict or dict), leaving out the `exclude` dimension"""
+    filters = Q()
+    search = params.get('search', '')
+    if search:
+        filters &= product_search_q(search)
+    for name, field in FACET_FIELDS.items():
+        value = params.get(name, 'all')
+        if name != exclude and value not in IGNORED_FILTER_VALUES:
+            filters &= Q(**{field: value})
+    stock = params.get('stock', 'all')
+    if exclude != 'stock' and stock in STOCK_FILTERS:
+        filters &= STOCK_FILTERS[stock]
+    return filters
+
+
+def inventory_facets(params) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Values of every filter dimension with their inventory row counts.
+
+    Each dimension is counted under the other active filters, so picking a
+    value never hides the alternatives of the same dimension. One GROUP BY
+    per dimension plus one conditional aggregate for the stock tiers.
+    """
+    facets = {}
+    for name, field in FACET_FIELDS.items():
+        columns = [field, FACET_LABELS[name]] if name in FACET_LABELS else [field]
+        rows = (Inventory.objects.filter(inventory_filters(params, exclude=name))
+                .values_list(*columns).annotate(count=Count('id')).order_by(*columns))
+        facets[name] = []
+        for row in rows:
+            if row[0] is None:
+                continue
+            facet = {'value': row[0], 'count': row[-1]}
+            if name in FACET_LABELS:
+                facet['label'] = row[1]
+            facets[name].append(facet)
+    counts = Inventory.objects.filter(inventory_filters(params, exclude='stock')).aggregate(
+        **{level: Count('id', filter=q) for level, q in STOCK_LEVELS.items()}
+    )
+    facets['stock'] = [{'value': level, 'count': counts[level]} for level in STOCK_LEVELS]
+    return facets
+
+
+# ============================================
+# Sections
+# ============================================
+
+def kpi_section() -> Dict[str, Any]:
+    return summarize_inventory_kpis(build_inventory_kpis(), DEFAULT_PERIOD_DAYS)
+
+
+def facet_section() -> Dict[str, Any]:
+    return inventory_facets({})
+
+
+def inventory_section(page_size: int) -> Dict[str, Any]:
+    items = Inventory.objects.select_related('product__category', 'store').order_by('id')
+    return {
+        'rows': [inventory_row(item) for item in items[:page_size]],
+        'total': Inventory.objects.count(),
+        'page_size': page_size,
+    }
+
+
+def company_section():
+    return [company_row(company) for company in Company.objects.select_related('parent')]
+
+
+# ============================================
+# Bootstrap
+# ============================================
+
+_executor = ThreadPoolExecutor(max_workers=BOOTSTRAP_WORKERS, thread_name_prefix='dashboard')
+
+
+def _in_worker(compute: Callable[[], Any]) -> Callable[[], Any]:
+    def run():
+        try:
+            return compute()
+        finally:
+            close_old_connections()  # This thread's connections, as at the end of a request
+    return run
+
+
+def build_bootstrap(page_size: int = DEFAULT_PAGE_SIZE) -> Dict[str, Any]:
+    sections = {
+        'kpis': lambda: cached_value('dashboard:kpis', KPI_TABLES, kpi_section),
+        'facets': lambda: cached_value('dashboard:facets', FACET_TABLES, facet_section),
+        'inventory': lambda: cached_value(f'dashboard:inventory:{page_size}', INVENTORY_TABLES,
+                                          lambda: inventory_section(page_size)),
+        'companies': lambda: cached_value('dashboard:companies', COMPANY_TABLES, company_section),
+    }
+    if connection.in_atomic_block:
+        return {name: compute() for name, compute in sections.items()}
+
+    # Each task runs in a copy of the request context (replica routing, instrumentation)
+    futures = {name: _executor.submit(contextvars.copy_context().run, _in_worker(compute))
+               for name, compute in sections.items()}
+    return {name: future.result() for name, future in futures.items()}
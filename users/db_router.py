@@ -0,0 +1,151 @@
+"""
+Primary/replica database routing with read-your-writes
+
+Writes always go to the primary ('default'). Reads of the apps listed in
+DATABASE_ROUTING['APPS'] go to the replica alias only inside a read scope:
+- ReplicaRoutingMiddleware opens one for GET/HEAD requests to the views in
+  DATABASE_ROUTING['READ_ROUTES'] (sales_data, inventory_data, exports)
+- `read_replica()` opens one around other read-only work, e.g. the AI
+  agent's data collection
+
+Read-your-writes: the routing state of a request is shared with the
+threads it starts (sync_to_async and the dashboard workers copy the
+context), and the first write to a routed app pins it to the primary for
+the rest of the request. read_replica() blocks are counted under a lock,
+so threads opening and closing them concurrently do not undo each other. After
+a request that wrote, the middleware sets a short-lived cookie so the same
+client also reads from the primary for STICKY_SECONDS, until the replica
+has caught up. Auth, sessions and other apps never leave the primary.
+
+Responses computed from replica reads may lag the primary, so the
+response cache does not store them (`reading_replica()`): a body cached
+under the current table versions must come from the primary.
+
+Without a replica alias in DATABASES everything reads from the primary.
+"""
+
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'db_primary_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+@dataclass
+class RoutingState:
+    replica: bool = False  # The request is a read route (middleware)
+    pinned: bool = False
+    scopes: int = 0  # Open read_replica() blocks, in any thread sharing this state
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    @property
+    def on_replica(self) -> bool:
+        return (self.replica or self.scopes > 0) and not self.pinned
+
+    def open_scope(self) -> None:
+        with self._lock:
+            self.scopes += 1
+
+    def close_scope(self) -> None:
+        with self._lock:
+            self.scopes -= 1
+
+
+_state: ContextVar[Optional[RoutingState]] = ContextVar('db_routing', default=None)
+
+
+def _options():
+    return getattr(settings, 'DATABASE_ROUTING', {})
+
+
+def replica_alias() -> Optional[str]:
+    """The configured replica alias, or None when DATABASES has none"""
+    alias = _options().get('REPLICA', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+def reading_replica() -> bool:
+    """Whether reads of routed apps in the current context go to the replica"""
+    state = _state.get()
+    return state is not None and state.on_replica and replica_alias() is not None
+
+
+@contextmanager
+def read_replica():
+    """Read routed apps from the replica inside this block (no-op once the current request wrote)"""
+    state = _state.get()
+    if state is None:
+        token = _state.set(RoutingState(replica=True))
+        try:
+            yield
+        finally:
+            _state.reset(token)
+        return
+
+    state.open_scope()
+    try:
+        yield
+    finally:
+        state.close_scope()
+
+
+class PrimaryReplicaRouter:
+    """Add to DATABASE_ROUTERS; see the module docstring for the rules"""
+
+    def _routed(self, model) -> bool:
+        return model._meta.app_label in _options().get('APPS', ())
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.on_replica or not self._routed(model):
+            return None
+        return replica_alias()
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None and self._routed(model):
+            state.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Opens the routing state of each request and the replica read scope for READ_ROUTES.
+    Add to MIDDLEWARE in settings.py after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        options = _options()
+        self.read_routes = set(options.get('READ_ROUTES', ()))
+        self.sticky_seconds = options.get('STICKY_SECONDS', 10)
+
+    def __call__(self, request):
+        state = RoutingState()
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+
+        if state.pinned or (request.method not in SAFE_METHODS and response.status_code < 400):
+            response.set_cookie(PIN_COOKIE, '1', max_age=self.sticky_seconds, httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _state.get()
+        if (state is not None and request.method in SAFE_METHODS
+                and request.resolver_match.url_name in self.read_routes
+                and PIN_COOKIE not in request.COOKIES):
+            state.replica = True
+        return None
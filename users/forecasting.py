@@ -0,0 +1,359 @@
+"""
+Demand forecasting over sales history
+
+Builds a (series × periods) demand matrix from Sale in one grouped query
+and fits lightweight models to every series at once with NumPy:
+
+- ses             simple exponential smoothing (flat forecast)
+- seasonal_naive  repeats the last season (weekly cycle for daily data)
+
+The model is chosen per series by one-step-ahead MAE over the most recent
+periods. Each series also reports demand variability (coefficient of
+variation) and seasonality strength.
+
+Series levels:
+- sku_store  one series per (product, store)
+- sku        one series per product
+- store      one series per store
+
+Forecasts are cached per series under a hash of (level, freq, horizon,
+series) and labelled "product|store" in results. A refresh does nothing
+while the 'sale' table version (users/response_cache.py) is unchanged;
+otherwise it rebuilds the demand matrix and refits only the series whose
+demand row changed (any insert, update or delete of their sales), or
+every series when a new period starts.
+"""
+
+import hashlib
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from django.core.cache import cache
+from django.db.models import Sum
+from django.db.models.functions import TruncDay, TruncWeek
+from django.utils import timezone
+
+from .models import Sale
+from .response_cache import table_versions
+
+LEVEL_FIELDS = {
+    'sku_store': ('product_id', 'store_id'),
+    'sku': ('product_id',),
+    'store': ('store_id',),
+}
+# Name of each key component in forecast entries and API filters
+SERIES_PARAMS = {'product_id': 'sku', 'store_id': 'store'}
+FREQUENCIES = {
+    # freq: (DB truncation, period length, season length)
+    'D': (TruncDay, timedelta(days=1), 7),
+    'W': (TruncWeek, timedelta(weeks=1), 52),
+}
+
+DEFAULT_LEVEL = 'sku_store'
+DEFAULT_FREQ = 'D'
+DEFAULT_HISTORY = 182
+DEFAULT_HORIZON = 28
+SES_ALPHA = 0.3
+CACHE_TIMEOUT = 60 * 60 * 24
+CACHE_PREFIX = 'forecast:v2'  # v2: entries carry their key components
+
+
+# ============================================
+# Vectorized models
+# ============================================
+
+def ses_fit(demand: np.ndarray, alpha: float = SES_ALPHA):
+    """
+    Simple exponential smoothing over every row of `demand`.
+
+    Returns:
+        (level, one_step) - final level per series and the one-step-ahead
+        in-sample forecasts (same shape as demand)
+    """
+    n_series, n_periods = demand.shape
+    one_step = np.empty_like(demand, dtype=np.float64)
+    level = demand[:, :min(n_periods, 7)].mean(axis=1) if n_periods else np.zeros(n_series)
+    for t in range(n_periods):
+        one_step[:, t] = level
+        level = alpha * demand[:, t] + (1 - alpha) * level
+    return level, one_step
+
+
+def seasonal_naive_forecast(demand: np.ndarray, season: int, horizon: int) -> np.ndarray:
+    """Repeat the last full season of every row"""
+    n_series, n_periods = demand.shape
+    if n_periods < season:
+        return np.repeat(demand[:, -1:] if n_periods else np.zeros((n_series, 1)), horizon, axis=1)
+    last_season = demand[:, -season:]
+    return np.tile(last_season, (1, -(-horizon // season)))[:, :horizon]
+
+
+def seasonality_strength(demand: np.ndarray, season: int) -> np.ndarray:
+    """
+    Share of variance explained by the seasonal profile (0 = none, 1 = pure cycle).
+
+    Uses the last whole number of seasons of each row.
+    """
+    n_series, n_periods = demand.shape
+    cycles = n_periods // season
+    if cycles < 2:
+        return np.zeros(n_series)
+    window = demand[:, -cycles * season:].reshape(n_series, cycles, season)
+    profile = window.mean(axis=1, keepdims=True)
+    residual = window - profile
+    total_var = window.reshape(n_series, -1).var(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        strength = 1 - residual.reshape(n_series, -1).var(axis=1) / total_var
+    return np.clip(np.nan_to_num(strength), 0, 1)
+
+
+def fit_forecasts(demand: np.ndarray, season: int, horizon: int,
+                  alpha: float = SES_ALPHA) -> Dict[str, np.ndarray]:
+    """
+    Fit both models to every series and keep the better one per series.
+
+    Args:
+        demand: (n_series, n_periods) units per period
+        season: season length in periods
+        horizon: periods to forecast
+
+    Returns:
+        dict of arrays: forecast (n_series, horizon), model (0 = ses,
+        1 = seasonal naive), mean, std, cv, seasonality
+    """
+    demand = np.asarray(demand, dtype=np.float64)
+    n_series, n_periods = demand.shape
+
+    level, ses_one_step = ses_fit(demand, alpha)
+    ses = np.repeat(level[:, None], horizon, axis=1)
+    naive = seasonal_naive_forecast(demand, season, horizon)
+
+    # One-step-ahead MAE over the most recent seasons
+    window = min(n_periods - season, season * 4) if n_periods > season else 0
+    if window > 0:
+        recent = demand[:, -window:]
+        ses_mae = np.abs(recent - ses_one_step[:, -window:]).mean(axis=1)
+        naive_mae = np.abs(recent - demand[:, -window - season:-season]).mean(axis=1)
+        use_naive = naive_mae < ses_mae
+    else:
+        use_naive = np.zeros(n_series, dtype=bool)
+
+    mean = demand.mean(axis=1) if n_periods else np.zeros(n_series)
+    std = demand.std(axis=1) if n_periods else np.zeros(n_series)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cv = np.where(mean > 0, std / mean, np.nan)
+
+    return {
+        'forecast': np.maximum(np.where(use_naive[:, None], naive, ses), 0),
+        'model': use_naive.astype(np.int8),
+        'mean': mean,
+        'std': std,
+        'cv': cv,
+        'seasonality': seasonality_strength(demand, season),
+    }
+
+
+# ============================================
+# Data access
+# ============================================
+
+def current_period_start(freq: str = DEFAULT_FREQ, now=None):
+    """Start of the (incomplete) current period; history ends right before it"""
+    now = now or timezone.now()
+    start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if freq == 'W':
+        start -= timedelta(days=start.weekday())
+    return start
+
+
+def build_demand_matrix(level: str = DEFAULT_LEVEL, freq: str = DEFAULT_FREQ,
+                        history: int = DEFAULT_HISTORY, series_filter: Optional[Dict[str, Any]] = None,
+                        now=None):
+    """
+    Demand matrix of completed periods, one grouped query.
+
+    Returns:
+        (keys, demand) - list of series key tuples and a (len(keys), history) array
+    """
+    fields = LEVEL_FIELDS[level]
+    trunc, period, _ = FREQUENCIES[freq]
+    end = current_period_start(freq, now)
+    start = end - period * history
+
+    rows = (
+        Sale.objects.filter(sale_date__gte=start, sale_date__lt=end, **(series_filter or {}))
+        .annotate(bucket=trunc('sale_date'))
+        .values(*fields, 'bucket')
+        .annotate(units=Sum('quantity'))
+        .values_list(*fields, 'bucket', 'units')
+    )
+    frame = pd.DataFrame.from_records(list(rows), columns=[*fields, 'bucket', 'units'])
+    if frame.empty:
+        return [], np.zeros((0, history))
+
+    row_codes, keys = pd.MultiIndex.from_frame(frame[list(fields)].astype(str)).factorize()
+    buckets = pd.to_datetime(frame['bucket'], utc=True)
+    columns = ((buckets - pd.Timestamp(start)).dt.total_seconds() // period.total_seconds()).astype(np.int64).to_numpy()
+
+    flat = row_codes * history + np.clip(columns, 0, history - 1)
+    demand = np.bincount(flat, weights=frame['units'].to_numpy(dtype=np.float64),
+                         minlength=len(keys) * history).reshape(len(keys), history)
+    return [tuple(key) for key in keys], demand
+
+
+def series_label(key: Tuple[str, ...]) -> str:
+    """Display label of a series key ("SKU-0001|COM-001-HQ")"""
+    return '|'.join(key)
+
+
+def _fit_series(keys: List[Tuple[str, ...]], demand: np.ndarray, level: str, freq: str,
+                horizon: int) -> Dict[Tuple[str, ...], Dict[str, Any]]:
+    """Forecast entries of the given demand rows, keyed by series key tuple"""
+    if not keys:
+        return {}
+    params = [SERIES_PARAMS[field] for field in LEVEL_FIELDS[level]]
+    fitted = fit_forecasts(demand, FREQUENCIES[freq][2], horizon)
+    models = np.array(['ses', 'seasonal_naive'])[fitted['model']]
+    forecasts = np.round(fitted['forecast'], 2)
+    return {
+        key: {
+            'series': series_label(key),
+            **dict(zip(params, key)),
+            'model': str(models[i]),
+            'forecast': forecasts[i].tolist(),
+            'forecast_total': round(float(forecasts[i].sum()), 2),
+            'mean_demand': round(float(fitted['mean'][i]), 3),
+            'std_demand': round(float(fitted['std'][i]), 3),
+            'cv': None if np.isnan(fitted['cv'][i]) else round(float(fitted['cv'][i]), 3),
+            'seasonality': round(float(fitted['seasonality'][i]), 3),
+        }
+        for i, key in enumerate(keys)
+    }
+
+
+def compute_forecasts(level: str = DEFAULT_LEVEL, freq: str = DEFAULT_FREQ, history: int = DEFAULT_HISTORY,
+                      horizon: int = DEFAULT_HORIZON, series_filter: Optional[Dict[str, Any]] = None,
+                      now=None) -> Dict[str, Dict[str, Any]]:
+    """Forecast every series (optionally restricted by `series_filter`), keyed by series label"""
+    keys, demand = build_demand_matrix(level, freq, history, series_filter, now)
+    return {entry['series']: entry for entry in _fit_series(keys, demand, level, freq, horizon).values()}
+
+
+# ============================================
+# Cache with incremental refresh
+# ============================================
+
+def _cache_key(level: str, freq: str, horizon: int, *parts) -> str:
+    digest = hashlib.sha1(repr((level, freq, horizon, *parts)).encode()).hexdigest()
+    return f"{CACHE_PREFIX}:{digest}"
+
+
+def _row_digest(row: np.ndarray) -> str:
+    return hashlib.blake2b(row.tobytes(), digest_size=12).hexdigest()
+
+
+def _forecast_series(series: List[Tuple[str, ...]], level: str, freq: str, history: int, horizon: int,
+                     now=None) -> Dict[Tuple[str, ...], Dict[str, Any]]:
+    """Recompute only the given series keys"""
+    fields = LEVEL_FIELDS[level]
+    series_filter = {f'{field}__in': {key[i] for key in series} for i, field in enumerate(fields)}
+    wanted = set(series)
+    keys, demand = build_demand_matrix(level, freq, history, series_filter, now)
+    rows = [i for i, key in enumerate(keys) if key in wanted]
+    return _fit_series([keys[i] for i in rows], demand[rows], level, freq, horizon)
+
+
+def refresh_forecasts(level: str = DEFAULT_LEVEL, freq: str = DEFAULT_FREQ, history: int = DEFAULT_HISTORY,
+                      horizon: int = DEFAULT_HORIZON, now=None) -> Dict[str, Any]:
+    """
+    Bring cached forecasts up to date.
+
+    - Sale table version unchanged since the last run: no work
+    - Sales changed in the same period: refit the series whose demand changed
+    - A new period started: refit everything
+
+    Returns:
+        Refresh metadata (period, sale version, series keys and digests, refit count)
+    """
+    # Read the version first: a write during the rebuild bumps it again for the next run
+    version = table_versions(['sale'])['sale']
+    period_start = current_period_start(freq, now).isoformat()
+    meta_key = _cache_key(level, freq, horizon, 'meta')
+    meta = cache.get(meta_key)
+    same_period = bool(meta) and meta['period_start'] == period_start and meta['history'] == history
+
+    if same_period and meta['sale_version'] == version:
+        return {**meta, 'recomputed': 0}
+
+    keys, demand = build_demand_matrix(level, freq, history, now=now)
+    digests = {key: _row_digest(row) for key, row in zip(keys, demand)}
+    previous = meta['digests'] if same_period else {}
+    changed = [i for i, key in enumerate(keys) if previous.get(key) != digests[key]]
+    forecasts = _fit_series([keys[i] for i in changed], demand[changed], level, freq, horizon)
+
+    cache.set_many(
+        {_cache_key(level, freq, horizon, 'series', key): value for key, value in forecasts.items()},
+        CACHE_TIMEOUT,
+    )
+    meta = {
+        'level': level,
+        'freq': freq,
+        'horizon': horizon,
+        'history': history,
+        'period_start': period_start,
+        'sale_version': version,
+        'digests': digests,
+        'series_keys': sorted(series_label(key) for key in keys),
+    }
+    cache.set(meta_key, meta, CACHE_TIMEOUT)
+    return {**meta, 'recomputed': len(forecasts)}
+
+
+def get_forecasts(series: Optional[Iterable[str]] = None, level: str = DEFAULT_LEVEL,
+                  freq: str = DEFAULT_FREQ, horizon: int = DEFAULT_HORIZON,
+                  filters: Optional[Dict[str, str]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Cached forecasts for the requested series labels (all series when None), keyed by label.
+
+    filters restricts them by key component ({'sku': ..., 'store': ...},
+    see SERIES_PARAMS). Refreshes first, then reads the per-series cache
+    entries of the selected series only; entries evicted from the cache
+    are recomputed on the spot.
+    """
+    meta = refresh_forecasts(level, freq, horizon=horizon)
+    known = {series_label(key): key for key in meta['digests']}
+    wanted = [known[label] for label in (series if series is not None else known) if label in known]
+    if filters:
+        positions = {SERIES_PARAMS[field]: i for i, field in enumerate(LEVEL_FIELDS[level])}
+        wanted = [key for key in wanted
+                  if all(param in positions and key[positions[param]] == value for param, value in filters.items())]
+    cache_keys = {_cache_key(level, freq, horizon, 'series', key): key for key in wanted}
+    found = cache.get_many(list(cache_keys))
+    result = {cache_keys[k]: v for k, v in found.items()}
+
+    missing = [key for key in wanted if key not in result]
+    if missing:
+        recomputed = _forecast_series(missing, level, freq, DEFAULT_HISTORY, horizon)
+        cache.set_many({_cache_key(level, freq, horizon, 'series', k): v for k, v in recomputed.items()},
+                       CACHE_TIMEOUT)
+        result.update(recomputed)
+    return {value['series']: value for value in result.values()}
+
+
+def summarize_forecasts(forecasts: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Demand KPIs over a set of series forecasts (used by the AI agent)"""
+    if not forecasts:
+        return {'series': 0, 'forecast_total': 0.0, 'avg_cv': None, 'seasonal_series': 0, 'top_series': []}
+
+    values = list(forecasts.values())
+    cvs = [v['cv'] for v in values if v['cv'] is not None]
+    top = sorted(values, key=lambda v: v['forecast_total'], reverse=True)[:5]
+    return {
+        'series': len(values),
+        'forecast_total': round(sum(v['forecast_total'] for v in values), 2),
+        'avg_cv': round(float(np.mean(cvs)), 3) if cvs else None,
+        'seasonal_series': sum(1 for v in values if v['seasonality'] >= 0.3),
+        'top_series': [{'series': v['series'], 'forecast_total': v['forecast_total']} for v in top],
+    }
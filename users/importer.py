@@ -0,0 +1,485 @@
+"""
+Bulk import of products, inventory, sales and warehouse locations
+
+Streams CSV or Parquet files in chunks:
+
+1. parse a chunk into a DataFrame (pandas for CSV, pyarrow for Parquet)
+2. validate types and foreign keys with vectorized lookups against id maps
+   preloaded once per import (no per-row queries)
+3. write valid rows: COPY into a temporary table + INSERT ... ON CONFLICT on
+   PostgreSQL, bulk_create(update_conflicts=True) in batches elsewhere
+
+Upserts follow the unique constraints of each model:
+- product             sku
+- inventory           (product, store)
+- location            (warehouse, product, aisle, shelf, box)
+- sale                sale_id when the file has it, plain inserts otherwise
+
+Rejected rows are counted and the first MAX_REPORTED_ERRORS are reported
+with their line number and reason.
+"""
+
+import calendar
+import io
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+from django.db import connection, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .daily_metrics import refresh_days
+from .models import Category, Inventory, Product, Sale, Store, Warehouse, WarehouseLocation
+from .response_cache import bump_models
+
+DEFAULT_CHUNK_SIZE = 50000
+DEFAULT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+MONTH_ABBR = np.array(calendar.month_abbr)
+
+
+def month_start(dates: pd.Series) -> pd.Series:
+    """Sale.period of each sale_date: the first day of its month"""
+    return (dates.dt.normalize() - pd.to_timedelta(dates.dt.day - 1, unit='D')).dt.date
+
+
+class InvalidImportFile(Exception):
+    """The file cannot be imported at all (format, header, missing dependency)"""
+
+
+@dataclass
+class ImportReport:
+    entity: str
+    rows_read: int = 0
+    rows_written: int = 0
+    rows_rejected: int = 0
+    seconds: float = 0.0
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def rows_per_second(self) -> float:
+        return round(self.rows_read / self.seconds, 1) if self.seconds else 0.0
+
+    def reject(self, mask: np.ndarray, lines: np.ndarray, reason: str) -> None:
+        count = int(mask.sum())
+        self.rows_rejected += count
+        room = MAX_REPORTED_ERRORS - len(self.errors)
+        if count and room > 0:
+            self.errors.extend({'line': int(line), 'error': reason} for line in lines[mask][:room])
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'entity': self.entity,
+            'rows_read': self.rows_read,
+            'rows_written': self.rows_written,
+            'rows_rejected': self.rows_rejected,
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': self.rows_per_second,
+            'errors': self.errors,
+        }
+
+
+@dataclass(frozen=True)
+class EntitySpec:
+    model: Any
+    required: tuple
+    optional: tuple
+    unique_fields: tuple            # model fields for ON CONFLICT
+    update_fields: tuple            # model fields updated on conflict
+    prepare: Callable               # (chunk, id maps, report, lines) -> DataFrame of model columns
+    column_fields: Dict[str, tuple] = field(default_factory=dict)  # optional file column -> fields it sets
+
+    def fields_for(self, columns) -> tuple:
+        """
+        update_fields of a file with these columns: fields filled from an
+        optional column the file lacks are defaults for new rows only and
+        must not overwrite existing ones
+        """
+        absent = {f for column, fields in self.column_fields.items() if column not in columns for f in fields}
+        return tuple(f for f in self.update_fields if f not in absent)
+
+
+# ============================================
+# Reading
+# ============================================
+
+def iter_chunks(source, file_format: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Yield DataFrames of at most chunk_size rows, all values as strings"""
+    if file_format == 'csv':
+        yield from pd.read_csv(source, dtype=str, chunksize=chunk_size, keep_default_na=False,
+                               skipinitialspace=True)
+    elif file_format == 'parquet':
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise InvalidImportFile('Parquet import requires pyarrow (pip install pyarrow)')
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas().astype(str).replace({'None': '', 'nan': '', 'NaT': ''})
+    else:
+        raise InvalidImportFile(f"Unsupported format {file_format!r} (use csv or parquet)")
+
+
+def detect_format(filename: str, default: str = 'csv') -> str:
+    lowered = (filename or '').lower()
+    if lowered.endswith(('.parquet', '.pq')):
+        return 'parquet'
+    if lowered.endswith(('.csv', '.txt', '.csv.gz')):
+        return 'csv'
+    return default
+
+
+# ============================================
+# Validation helpers (vectorized)
+# ============================================
+
+def _present(values: pd.Series) -> np.ndarray:
+    return (values.str.strip() != '').to_numpy()
+
+
+def _integers(chunk: pd.DataFrame, column: str, report: ImportReport, lines: np.ndarray,
+              valid: np.ndarray, minimum: Optional[int] = None) -> pd.Series:
+    values = pd.to_numeric(chunk[column], errors='coerce')
+    bad = valid & (values.isna().to_numpy() | (values.to_numpy() % 1 != 0))
+    if minimum is not None:
+        bad |= valid & (values.to_numpy() < minimum)
+    report.reject(bad, lines, f"invalid {column}")
+    valid &= ~bad
+    return values
+
+
+def _known(chunk: pd.DataFrame, column: str, ids: pd.Index, report: ImportReport, lines: np.ndarray,
+           valid: np.ndarray, label: str) -> None:
+    """Reject rows whose foreign key is not in the preloaded id index"""
+    bad = valid & (ids.get_indexer(chunk[column]) < 0)
+    report.reject(bad, lines, f"unknown {label}")
+    valid &= ~bad
+
+
+def _dates(chunk: pd.DataFrame, column: str, report: ImportReport, lines: np.ndarray,
+           valid: np.ndarray) -> pd.Series:
+    given = _present(chunk[column])
+    values = pd.to_datetime(chunk[column].where(given), errors='coerce', utc=True, format='ISO8601')
+    retry = given & values.isna().to_numpy()
+    if retry.any():  # Slow path for non-ISO dates
+        values[retry] = pd.to_datetime(chunk[column][retry], errors='coerce', utc=True, format='mixed')
+    bad = valid & given & values.isna().to_numpy()
+    report.reject(bad, lines, f"invalid {column}")
+    valid &= ~bad
+    return values.fillna(pd.Timestamp(timezone.now()))
+
+
+def _as_int(rows: pd.DataFrame, *columns: str) -> pd.DataFrame:
+    """Validated numeric columns back to integers (floats after to_numeric)"""
+    for column in columns:
+        if column in rows:
+            rows[column] = rows[column].astype(np.int64)
+    return rows
+
+
+# ============================================
+# Per-entity preparation
+# ============================================
+
+def _prepare_products(chunk, maps, report, lines):
+    valid = _present(chunk['sku']) & _present(chunk['name'])
+    report.reject(~valid, lines, 'sku and name are required')
+    price = pd.to_numeric(chunk['price'], errors='coerce')
+    bad = valid & (price.isna() | (price < 0)).to_numpy()
+    report.reject(bad, lines, 'invalid price')
+    valid &= ~bad
+
+    status = chunk['status'].where(_present(chunk['status']), 'in-stock') if 'status' in chunk else 'in-stock'
+    out = pd.DataFrame({
+        'sku': chunk['sku'].str.strip(),
+        'name': chunk['name'].str.strip(),
+        'price': price.round(2),
+        'description': chunk['description'] if 'description' in chunk else '',
+        'status': status,
+        'category_id': _category_ids(chunk['category'], maps) if 'category' in chunk else None,
+        'created_at': timezone.now(),
+        'updated_at': timezone.now(),
+    })
+    out['category_id'] = out['category_id'].astype('Int64')
+    return out[valid]
+
+
+def _category_ids(names: pd.Series, maps) -> pd.Series:
+    """Category name -> id, creating missing categories in one bulk insert"""
+    names = names.str.strip()
+    missing = set(names[names != '']) - set(maps['categories'])
+    if missing:
+        Category.objects.bulk_create([Category(name=name) for name in missing], ignore_conflicts=True)
+        maps['categories'].update(Category.objects.filter(name__in=missing).values_list('name', 'id'))
+    return names.map(maps['categories'])
+
+
+def _prepare_inventory(chunk, maps, report, lines):
+    valid = np.ones(len(chunk), dtype=bool)
+    _known(chunk, 'sku', maps['products'], report, lines, valid, 'sku')
+    _known(chunk, 'store', maps['stores'], report, lines, valid, 'store')
+    quantity = _integers(chunk, 'quantity', report, lines, valid)
+    out = pd.DataFrame({
+        'product_id': chunk['sku'],
+        'store_id': chunk['store'],
+        'quantity': quantity,
+        'last_restocked': timezone.now(),
+    })
+    return _as_int(out[valid], 'quantity')
+
+
+def _prepare_locations(chunk, maps, report, lines):
+    valid = np.ones(len(chunk), dtype=bool)
+    _known(chunk, 'sku', maps['products'], report, lines, valid, 'sku')
+    _known(chunk, 'warehouse', maps['warehouses'], report, lines, valid, 'warehouse')
+    for column in ('aisle', 'shelf', 'box'):
+        bad = valid & ~_present(chunk[column])
+        report.reject(bad, lines, f"{column} is required")
+        valid &= ~bad
+    quantity = _integers(chunk, 'quantity', report, lines, valid, minimum=0)
+    out = pd.DataFrame({
+        'warehouse_id': chunk['warehouse'],
+        'product_id': chunk['sku'],
+        'aisle': chunk['aisle'].str.strip(),
+        'shelf': chunk['shelf'].str.strip(),
+        'box': chunk['box'].str.strip(),
+        'quantity': quantity,
+        'last_updated': timezone.now(),
+    })
+    return _as_int(out[valid], 'quantity')
+
+
+def _prepare_sales(chunk, maps, report, lines):
+    valid = np.ones(len(chunk), dtype=bool)
+    _known(chunk, 'sku', maps['products'], report, lines, valid, 'sku')
+    _known(chunk, 'store', maps['stores'], report, lines, valid, 'store')
+    quantity = _integers(chunk, 'quantity', report, lines, valid)
+    sale_date = _dates(chunk, 'sale_date', report, lines, valid) if 'sale_date' in chunk else \
+        pd.Series(pd.Timestamp(timezone.now()), index=chunk.index)
+
+    if 'total_amount' in chunk:
+        given = _present(chunk['total_amount'])
+        amount = pd.to_numeric(chunk['total_amount'].where(given), errors='coerce')
+        bad = valid & given & amount.isna().to_numpy()
+        report.reject(bad, lines, 'invalid total_amount')
+        valid &= ~bad
+    else:
+        amount = pd.Series(np.nan, index=chunk.index)
+    missing_amount = amount.isna()
+    if missing_amount.any():
+        prices = maps['prices'].reindex(chunk['sku']).to_numpy()
+        amount = amount.where(~missing_amount, prices * quantity.to_numpy())
+
+    out = pd.DataFrame({
+        'product_id': chunk['sku'],
+        'store_id': chunk['store'],
+        'quantity': quantity,
+        'total_amount': amount.round(2),
+        'sale_date': sale_date,
+        'month': MONTH_ABBR[sale_date.dt.month.to_numpy()],
+        'year': sale_date.dt.year,
+        'period': month_start(sale_date),
+    })
+    if 'sale_id' in chunk:
+        out.insert(0, 'sale_id', _integers(chunk, 'sale_id', report, lines, valid, minimum=1))
+    return _as_int(out[valid], 'quantity', 'sale_id')
+
+
+ENTITIES: Dict[str, EntitySpec] = {
+    'product': EntitySpec(Product, ('sku', 'name', 'price'), ('category', 'description', 'status'),
+                          ('sku',), ('name', 'price', 'description', 'status', 'category_id', 'updated_at'),
+                          _prepare_products,
+                          {'category': ('category_id',), 'description': ('description',), 'status': ('status',)}),
+    'inventory': EntitySpec(Inventory, ('sku', 'store', 'quantity'), (),
+                            ('product_id', 'store_id'), ('quantity', 'last_restocked'), _prepare_inventory),
+    'location': EntitySpec(WarehouseLocation, ('warehouse', 'sku', 'aisle', 'shelf', 'box', 'quantity'), (),
+                           ('warehouse_id', 'product_id', 'aisle', 'shelf', 'box'), ('quantity', 'last_updated'),
+                           _prepare_locations),
+    'sale': EntitySpec(Sale, ('sku', 'store', 'quantity'), ('sale_id', 'total_amount', 'sale_date'),
+                       ('sale_id',), ('product_id', 'store_id', 'quantity', 'total_amount', 'sale_date', 'month',
+                                      'year', 'period'), _prepare_sales,
+                       {'total_amount': ('total_amount',), 'sale_date': ('sale_date', 'month', 'year', 'period')}),
+}
+
+
+def _load_maps(entity: str) -> Dict[str, Any]:
+    """Preload the ids every chunk is validated against"""
+    maps: Dict[str, Any] = {}
+    if entity == 'product':
+        maps['categories'] = dict(Category.objects.values_list('name', 'id'))
+    if entity in ('inventory', 'location', 'sale'):
+        maps['products'] = pd.Index(Product.objects.values_list('sku', flat=True).iterator(chunk_size=50000))
+    if entity in ('inventory', 'sale'):
+        maps['stores'] = pd.Index(Store.objects.values_list('store_id', flat=True))
+    if entity == 'location':
+        maps['warehouses'] = pd.Index(Warehouse.objects.values_list('warehouse_id', flat=True))
+    if entity == 'sale':
+        prices = Product.objects.values_list('sku', 'price').iterator(chunk_size=50000)
+        maps['prices'] = pd.Series({sku: float(price) for sku, price in prices}, dtype=np.float64)
+    return maps
+
+
+# ============================================
+# Writing
+# ============================================
+
+def _dedupe(rows: pd.DataFrame, spec: EntitySpec) -> pd.DataFrame:
+    """Last row wins for duplicate keys inside a chunk (one statement cannot touch a row twice)"""
+    keys = [f for f in spec.unique_fields if f in rows]
+    if spec.model is Sale and 'sale_id' not in rows:
+        return rows
+    return rows.drop_duplicates(subset=keys, keep='last')
+
+
+def _write_bulk_create(rows: pd.DataFrame, spec: EntitySpec, batch_size: int, update_fields: tuple) -> int:
+    """
+    Other backends: bulk_create(update_conflicts=True) in batches.
+
+    auto_now_add replaces Sale.sale_date on insert, so imported dates are
+    written back with bulk_update.
+    """
+    model = spec.model
+    upsert = {}
+    if model is not Sale or 'sale_id' in rows:
+        upsert = {'update_conflicts': True, 'unique_fields': list(spec.unique_fields),
+                  'update_fields': list(update_fields)}
+    restore_dates = model is Sale and 'sale_date' in update_fields
+    records = rows.astype(object).where(rows.notna(), None).to_dict(orient='records')
+    for start in range(0, len(records), batch_size):
+        batch = records[start:start + batch_size]
+        objs = model.objects.bulk_create([model(**record) for record in batch], **upsert)
+        if restore_dates:
+            for obj, record in zip(objs, batch):
+                obj.sale_date = record['sale_date']
+            model.objects.bulk_update(objs, ['sale_date'])
+    return len(records)
+
+
+def _write_copy(rows: pd.DataFrame, spec: EntitySpec, update_fields: tuple) -> int:
+    """PostgreSQL: COPY into a temporary table, then one INSERT ... ON CONFLICT"""
+    meta = spec.model._meta
+    table = meta.db_table
+    columns = [meta.get_field(column).column for column in rows.columns]
+    quoted = ', '.join(connection.ops.quote_name(c) for c in columns)
+    staging = f"import_{table}"
+
+    buffer = io.StringIO()
+    rows.to_csv(buffer, index=False, header=False, na_rep='\\N', date_format='%Y-%m-%d %H:%M:%S%z')
+    buffer.seek(0)
+
+    upsert = spec.model is not Sale or 'sale_id' in rows
+    conflict = ''
+    if upsert:
+        unique = ', '.join(connection.ops.quote_name(meta.get_field(f).column) for f in spec.unique_fields)
+        updates = ', '.join(
+            f"{connection.ops.quote_name(meta.get_field(f).column)} = EXCLUDED.{connection.ops.quote_name(meta.get_field(f).column)}"
+            for f in update_fields
+        )
+        conflict = f" ON CONFLICT ({unique}) DO UPDATE SET {updates}"
+
+    with connection.cursor() as cursor:
+        # Only the imported columns: identity columns left to the target table's defaults stay out of staging
+        cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+        cursor.execute(f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS SELECT {quoted} FROM {table} WITH NO DATA")
+        copy_sql = f"COPY {staging} ({quoted}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):  # psycopg2
+            raw.copy_expert(copy_sql, buffer)
+        else:  # psycopg 3
+            with raw.copy(copy_sql) as copy:
+                copy.write(buffer.getvalue())
+        cursor.execute(f"INSERT INTO {table} ({quoted}) SELECT {quoted} FROM {staging}{conflict}")
+    if spec.model is Sale and 'sale_id' in rows:
+        _reset_sequence(Sale)
+    return len(rows)
+
+
+def write_rows(entity: str, rows: pd.DataFrame, batch_size: int = DEFAULT_BATCH_SIZE,
+               use_copy: bool = True, update_fields: Optional[tuple] = None) -> int:
+    """
+    Upsert a DataFrame of model columns (as returned by the prepare step)
+    in one transaction. Also used by the synthetic data generator.
+
+    update_fields defaults to every field of the entity; imports pass the
+    ones their file actually has (EntitySpec.fields_for).
+    """
+    spec = ENTITIES[entity]
+    if update_fields is None:
+        update_fields = spec.update_fields
+    with transaction.atomic():
+        # Days an upsert moves sales away from need their totals refreshed too
+        dates = _stored_sale_dates(rows['sale_id']) if entity == 'sale' and 'sale_id' in rows else []
+        if use_copy and connection.vendor == 'postgresql':
+            written = _write_copy(rows, spec, update_fields)
+        else:
+            written = _write_bulk_create(rows, spec, batch_size, update_fields)
+        bump_models(spec.model)  # bulk writes send no post_save
+        if entity == 'sale' and written:
+            dates += [rows['sale_date'].min(), rows['sale_date'].max()]
+            refresh_days(timezone.localdate(min(dates)), timezone.localdate(max(dates)))
+    return written
+
+
+def _stored_sale_dates(sale_ids: pd.Series) -> list:
+    """sale_date bounds of the existing sales among sale_ids"""
+    ids = sale_ids.tolist()
+    dates = []
+    for start in range(0, len(ids), 900):  # Below SQLite's bound parameter limit
+        bounds = Sale.objects.filter(sale_id__in=ids[start:start + 900]).aggregate(
+            first=Min('sale_date'), last=Max('sale_date'))
+        dates += [date for date in bounds.values() if date is not None]
+    return dates
+
+
+def _reset_sequence(model) -> None:
+    """Keep the id sequence ahead of explicitly imported ids"""
+    from django.core.management.color import no_style
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [model]):
+            cursor.execute(sql)
+
+
+# ============================================
+# Entry point
+# ============================================
+
+def import_file(entity: str, source, file_format: str = 'csv', chunk_size: int = DEFAULT_CHUNK_SIZE,
+                batch_size: int = DEFAULT_BATCH_SIZE, use_copy: bool = True) -> ImportReport:
+    """
+    Import one file of `entity` rows ('product', 'inventory', 'location', 'sale').
+
+    Each chunk is written in its own transaction, so a failure keeps the
+    chunks already imported.
+    """
+    if entity not in ENTITIES:
+        raise InvalidImportFile(f"Unknown entity {entity!r} (use {', '.join(ENTITIES)})")
+    spec = ENTITIES[entity]
+    report = ImportReport(entity)
+    started = time.perf_counter()
+    maps = _load_maps(entity)
+    copy = use_copy and connection.vendor == 'postgresql'
+    update_fields = spec.update_fields
+
+    first_line = 2  # Line 1 is the header
+    for chunk in iter_chunks(source, file_format, chunk_size):
+        if report.rows_read == 0:
+            missing = [c for c in spec.required if c not in chunk.columns]
+            if missing:
+                raise InvalidImportFile(f"Missing columns: {', '.join(missing)}")
+            update_fields = spec.fields_for(chunk.columns)
+        chunk = chunk.reset_index(drop=True)
+        lines = np.arange(first_line, first_line + len(chunk))
+        first_line += len(chunk)
+        report.rows_read += len(chunk)
+
+        rows = _dedupe(spec.prepare(chunk, maps, report, lines), spec)
+        if rows.empty:
+            continue
+        report.rows_written += write_rows(entity, rows, batch_size, use_copy, update_fields)
+
+    if entity == 'sale' and not copy and connection.vendor == 'postgresql':
+        _reset_sequence(Sale)
+    report.seconds = time.perf_counter() - started
+    return report
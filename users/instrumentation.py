@@ -0,0 +1,223 @@
+"""
+Per-request query and timing instrumentation
+
+RequestInstrumentationMiddleware records for every sampled request:
+- number of SQL queries and time spent in the database
+- render time (DRF responses and templates are rendered after the view)
+- total time, and the remainder as application time
+
+and reports them as a Server-Timing header and as one JSON log line on the
+'supply_unlimited.requests' logger. Queries slower than SLOW_QUERY_MS are
+logged on 'supply_unlimited.slow_queries' together with the project frame
+that issued them.
+
+Queries are counted by one execute wrapper installed on every connection;
+it looks the current request up in a ContextVar, so it also sees queries
+run in sync_to_async threads and costs a single lookup outside sampled
+requests. Threads of one request add to its counters under a lock. When ENABLED is False the middleware raises MiddlewareNotUsed
+and nothing is installed.
+
+Configure through `settings.REQUEST_INSTRUMENTATION` (see settings.py).
+"""
+
+import json
+import logging
+import os
+import random
+import sys
+import threading
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Callable, List, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger('supply_unlimited.requests')
+slow_query_logger = logging.getLogger('supply_unlimited.slow_queries')
+
+_current: ContextVar[Optional['RequestMetrics']] = ContextVar('request_metrics', default=None)
+_listeners: List[Callable[['RequestMetrics'], None]] = []
+
+
+@dataclass
+class RequestMetrics:
+    method: str
+    path: str
+    view: str = ''
+    status: int = 0
+    queries: int = 0
+    db_seconds: float = 0.0
+    render_seconds: float = 0.0
+    total_seconds: float = 0.0
+    slow_query_seconds: Optional[float] = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add_query(self, seconds: float) -> None:
+        with self._lock:
+            self.queries += 1
+            self.db_seconds += seconds
+
+    @property
+    def app_seconds(self) -> float:
+        return max(self.total_seconds - self.db_seconds - self.render_seconds, 0.0)
+
+    def server_timing(self) -> str:
+        return (f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries", '
+                f'render;dur={self.render_seconds * 1000:.1f}, app;dur={self.app_seconds * 1000:.1f}, '
+                f'total;dur={self.total_seconds * 1000:.1f}')
+
+    def as_dict(self):
+        return {
+            'view': self.view,
+            'method': self.method,
+            'path': self.path,
+            'status': self.status,
+            'queries': self.queries,
+            'db_ms': round(self.db_seconds * 1000, 2),
+            'render_ms': round(self.render_seconds * 1000, 2),
+            'total_ms': round(self.total_seconds * 1000, 2),
+        }
+
+
+def add_listener(listener: Callable[[RequestMetrics], None]) -> None:
+    """Call `listener(metrics)` after every instrumented request (e.g. to export metrics)"""
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+# ============================================
+# Query tracking
+# ============================================
+
+def _query_origin() -> str:
+    """First stack frame inside the project (outside Django and third-party packages)"""
+    base_dir = str(settings.BASE_DIR)
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(base_dir) and 'site-packages' not in filename and filename != __file__:
+            return f"{os.path.relpath(filename, base_dir)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return 'unknown'
+
+
+def _track_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = perf_counter() - started
+        metrics.add_query(duration)
+        if metrics.slow_query_seconds is not None and duration >= metrics.slow_query_seconds:
+            slow_query_logger.warning(json.dumps({
+                'view': metrics.view or metrics.path,
+                'duration_ms': round(duration * 1000, 2),
+                'sql': sql[:2000],
+                'many': many,
+                'origin': _query_origin(),
+            }))
+
+
+def _install(connection, **kwargs) -> None:
+    if _track_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_track_query)
+
+
+# ============================================
+# Middleware
+# ============================================
+
+class RequestInstrumentationMiddleware:
+    """
+    Query count, DB/render/total time per request.
+    Add to MIDDLEWARE in settings.py (near the top, so it times the others).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        options = getattr(settings, 'REQUEST_INSTRUMENTATION', {})
+        if not options.get('ENABLED', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.sample_rate = options.get('SAMPLE_RATE', 1.0)
+        self.server_timing = options.get('SERVER_TIMING', False)
+        slow_ms = options.get('SLOW_QUERY_MS')
+        self.slow_query_seconds = slow_ms / 1000 if slow_ms else None
+
+        for connection in connections.all(initialized_only=True):
+            _install(connection)
+        connection_created.connect(_install, dispatch_uid='request_instrumentation')
+
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        metrics, token, started = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return await self.get_response(request)
+
+        metrics, token, started = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics, started)
+
+    def _start(self, request):
+        metrics = RequestMetrics(method=request.method, path=request.path,
+                                 slow_query_seconds=self.slow_query_seconds)
+        request.instrumentation = metrics
+        return metrics, _current.set(metrics), perf_counter()
+
+    def _finish(self, request, response, metrics: RequestMetrics, started: float):
+        metrics.total_seconds = perf_counter() - started
+        metrics.status = response.status_code
+        match = getattr(request, 'resolver_match', None)
+        metrics.view = match.view_name if match else ''
+
+        if self.server_timing:
+            response['Server-Timing'] = metrics.server_timing()
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(metrics.as_dict()))
+        for listener in _listeners:
+            listener(metrics)
+        return response
+
+    def process_template_response(self, request, response):
+        """Time rendering of DRF and template responses, which happens after the view returns"""
+        metrics = getattr(request, 'instrumentation', None)
+        if metrics is None:
+            return response
+        render = response.render
+
+        def timed_render():
+            started = perf_counter()
+            try:
+                return render()
+            finally:
+                metrics.render_seconds += perf_counter() - started
+
+        response.render = timed_render
+        return response
@@ -0,0 +1,56 @@
+"""
+Synthetic data for load testing
+
+Generates companies, stores, products, inventory, warehouse locations and
+sales history at any scale without touching existing rows.
+
+Execute: python manage.py generate_data [--scale 15] [--seed 42] [--days 365] [--sales-per-day 30000]
+"""
+
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.synthetic_data import GeneratorConfig, clear_generated, generate
+
+
+class Command(BaseCommand):
+    help = 'Generate a deterministic synthetic dataset (scale 15 is about 11M sales over a year)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help='10 companies, 1000 products and 2000 sales/day per unit of scale')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--days', type=int, default=365, help='Days of sales history')
+        parser.add_argument('--end-date', type=date.fromisoformat, help='Last day of sales (default yesterday)')
+        parser.add_argument('--company-depth', type=int, default=2, help='Levels of subsidiaries below each holding')
+        parser.add_argument('--branching', type=int, default=3, help='Subsidiaries per company')
+        parser.add_argument('--stores-per-company', type=int, default=5)
+        parser.add_argument('--sales-per-day', type=int, help='Average sales per day (overrides --scale)')
+        parser.add_argument('--assortment', type=float, default=0.3, help='Share of products each store carries')
+        parser.add_argument('--prefix', default='GEN', help='Id prefix of generated rows')
+        parser.add_argument('--no-sales', action='store_true', help='Only generate master data and inventory')
+        parser.add_argument('--clear', action='store_true', help='First delete rows generated with this prefix')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1 or options['scale'] <= 0 or not 0 < options['assortment'] <= 1:
+            raise CommandError('--days and --scale must be positive and --assortment in (0, 1]')
+        config = GeneratorConfig(
+            scale=options['scale'], seed=options['seed'], days=options['days'], end_date=options['end_date'],
+            company_depth=options['company_depth'], branching=options['branching'],
+            stores_per_company=options['stores_per_company'], sales_per_day=options['sales_per_day'],
+            assortment=options['assortment'], prefix=options['prefix'],
+        )
+
+        started = time.perf_counter()
+        if options['clear']:
+            deleted = clear_generated(config.prefix)
+            self.stdout.write(f"Deleted {deleted['sales']:,} sales and {deleted['products']:,} products "
+                              f"with prefix {config.prefix}")
+
+        counts = generate(config, log=self.stdout.write, with_sales=not options['no_sales'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            ', '.join(f"{count:,} {name}" for name, count in counts.items()) + f" in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,39 @@
+"""
+Bulk import of CSV/Parquet files
+
+Execute: python manage.py import_data <product|inventory|location|sale> <file> [--format parquet]
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.importer import (
+    DEFAULT_BATCH_SIZE, DEFAULT_CHUNK_SIZE, ENTITIES, InvalidImportFile, detect_format, import_file
+)
+
+
+class Command(BaseCommand):
+    help = 'Stream a CSV or Parquet file of products, inventory, locations or sales into the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('entity', choices=list(ENTITIES))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'parquet'], help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--no-copy', action='store_true', help='Use batched bulk_create upserts instead of COPY on PostgreSQL')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or detect_format(options['path'])
+        try:
+            report = import_file(options['entity'], options['path'], file_format,
+                                 chunk_size=options['chunk_size'], batch_size=options['batch_size'],
+                                 use_copy=not options['no_copy'])
+        except (InvalidImportFile, FileNotFoundError) as e:
+            raise CommandError(str(e))
+
+        for error in report.errors[:20]:
+            self.stderr.write(f"  line {error['line']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{report.entity}: {report.rows_written:,} rows written, {report.rows_rejected:,} rejected "
+            f"in {report.seconds:.2f}s ({report.rows_per_second:,.0f} rows/s)"
+        ))
@@ -0,0 +1,77 @@
+"""
+Nightly replenishment run
+
+Computes the replenishment plan for the whole catalogue, refreshes
+Product.status from it and optionally exports the suggested orders.
+
+Execute: python manage.py plan_replenishment [--output orders.csv] [--dry-run]
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from users.models import Product
+from users.replenishment import (
+    ReplenishmentPolicy, build_replenishment_plan, product_statuses, summarize_replenishment
+)
+
+
+class Command(BaseCommand):
+    help = 'Compute reorder points and order quantities for every product/store pair'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lead-time', type=float, help='Lead time in days')
+        parser.add_argument('--review-period', type=float, help='Days between orders')
+        parser.add_argument('--service-level', type=float, help='Target cycle service level (e.g. 0.95)')
+        parser.add_argument('--period', type=int, help='Days of sales history used for demand')
+        parser.add_argument('--output', help='Write the suggested orders to this CSV file')
+        parser.add_argument('--dry-run', action='store_true', help='Do not update Product.status')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        policy = ReplenishmentPolicy.from_settings(
+            lead_time_days=options['lead_time'],
+            review_period_days=options['review_period'],
+            service_level=options['service_level'],
+            period_days=options['period'],
+        )
+        try:
+            policy.validate()
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        started = time.perf_counter()
+        plan = build_replenishment_plan(policy=policy)
+        planned = time.perf_counter()
+        summary = summarize_replenishment(plan, policy)
+        self.stdout.write(
+            f"Planned {summary['positions']:,} positions in {planned - started:.1f}s: "
+            f"{summary['positions_to_order']:,} to order, {summary['units_to_order']:,} units, "
+            f"€{summary['order_value']:,.2f}"
+        )
+
+        if options['output']:
+            orders = plan[plan['order_quantity'] > 0][[
+                'product_id', 'store_id', 'quantity', 'reorder_point', 'order_up_to', 'order_quantity', 'order_value',
+            ]]
+            orders.to_csv(options['output'], index=False)
+            self.stdout.write(f"Wrote {len(orders):,} orders to {options['output']}")
+
+        if options['dry_run']:
+            return
+
+        statuses = product_statuses(plan)
+        changed = []
+        for product in Product.objects.only('sku', 'status').iterator(chunk_size=options['batch_size']):
+            status = statuses.get(product.sku)
+            if status is not None and status != product.status:
+                product.status = status
+                changed.append(product)
+
+        with transaction.atomic():
+            Product.objects.bulk_update(changed, ['status'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated status of {len(changed):,} products in {time.perf_counter() - started:.1f}s total"
+        ))
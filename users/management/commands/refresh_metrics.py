@@ -0,0 +1,26 @@
+"""
+Recompute the daily DashboardMetrics rows from Sale and Inventory
+
+Execute:
+    python manage.py refresh_metrics            # every day from the first sale through today (backfill)
+    python manage.py refresh_metrics --days 1   # today only (e.g. every few minutes from cron)
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.daily_metrics import refresh_all
+
+
+class Command(BaseCommand):
+    help = 'Backfill or refresh the daily dashboard metrics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Only the last N days (default: all days with sales)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = refresh_all(options['days'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {count:,} days in {time.perf_counter() - started:.1f}s"))
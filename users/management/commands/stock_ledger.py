@@ -0,0 +1,37 @@
+"""
+Stock ledger maintenance
+
+Execute:
+    python manage.py stock_ledger seed       # opening balances from current Inventory (once)
+    python manage.py stock_ledger apply      # materialize pending movements into Inventory
+    python manage.py stock_ledger snapshot   # store quantities of every pair (nightly)
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.stock_ledger import apply_pending_movements, seed_from_inventory, take_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Seed, apply or snapshot the stock movement ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument('actions', nargs='+', choices=['seed', 'apply', 'snapshot'])
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for action in options['actions']:
+            started = time.perf_counter()
+            if action == 'seed':
+                count = seed_from_inventory(batch_size)
+                message = f"Created {count:,} opening-balance movements"
+            elif action == 'apply':
+                count = apply_pending_movements(batch_size)
+                message = f"Applied {count:,} movements"
+            else:
+                count = take_snapshot(batch_size=batch_size)
+                message = f"Snapshot of {count:,} product/store pairs"
+            self.stdout.write(self.style.SUCCESS(f"{message} in {time.perf_counter() - started:.1f}s"))
@@ -0,0 +1,140 @@
+"""
+Prometheus metrics for app internals
+
+Counters, gauges and histograms for:
+- requests and request latency by route, recorded for every request by
+  RequestMetricsMiddleware
+- DB time and query count by route (fed by users.instrumentation, so they
+  follow its SAMPLE_RATE and stop when it is disabled)
+- AI agent stage durations and stage errors
+- notification fan-out and WebSocket connections
+- audit log writes
+- LLM gateway cache lookups and tokens
+
+Exposed in the Prometheus text format on /metrics to staff users, to
+scrapers sending METRICS['TOKEN'] as a bearer token, and to anyone when
+METRICS['PUBLIC'] is set and there is no token (development default).
+
+MULTI-PROCESS:
+--------------
+With several worker processes (gunicorn/uvicorn workers) set
+PROMETHEUS_MULTIPROC_DIR to an empty directory shared by the workers
+before they start. Every process then writes its samples to mmap files
+there and /metrics aggregates all of them on each scrape, so no push
+gateway or other collector is needed. Clean the directory on deploy.
+"""
+
+import os
+from time import perf_counter
+from typing import Any, Dict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess
+)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+REQUEST_LATENCY = Histogram('supply_http_request_duration_seconds', 'Request latency by route',
+                            ['route', 'method'], buckets=LATENCY_BUCKETS)
+REQUEST_DB_TIME = Histogram('supply_http_request_db_seconds', 'Database time per request by route',
+                            ['route'], buckets=LATENCY_BUCKETS)
+REQUESTS = Counter('supply_http_requests', 'Requests by route and status', ['route', 'method', 'status'])
+REQUEST_QUERIES = Counter('supply_http_request_queries', 'SQL queries issued by route', ['route'])
+
+AGENT_STAGE_DURATION = Histogram('supply_ai_agent_stage_duration_seconds', 'AI report agent stage durations',
+                                 ['stage'], buckets=LATENCY_BUCKETS)
+AGENT_STAGE_ERRORS = Counter('supply_ai_agent_stage_errors', 'AI report agent stages that failed', ['stage'])
+
+NOTIFICATIONS_SENT = Counter('supply_notifications_sent', 'Real-time notifications pushed to user groups',
+                             ['notification_type'])
+NOTIFICATION_FANOUT = Histogram('supply_notification_fanout_recipients', 'Recipients per notification event',
+                                ['event'], buckets=(1, 2, 5, 10, 25, 50, 100, 250))
+WEBSOCKET_CONNECTIONS = Gauge('supply_websocket_connections', 'Open notification WebSocket connections',
+                              multiprocess_mode='livesum')
+
+AUDIT_WRITES = Counter('supply_audit_log_writes', 'Audit log entries written', ['action'])
+AUDIT_WRITE_DURATION = Histogram('supply_audit_log_write_seconds', 'Time to write one audit log entry',
+                                 buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+
+LLM_CACHE_REQUESTS = Counter('supply_llm_cache_requests', 'LLM gateway lookups by result (hit, coalesced, miss)',
+                             ['result'])
+LLM_TOKENS = Counter('supply_llm_tokens', 'Tokens used by LLM provider calls')
+
+
+def _route(request) -> str:
+    """URL name of the request; unresolved paths share one label to bound cardinality"""
+    match = getattr(request, 'resolver_match', None)
+    return (match.view_name if match else '') or 'unmatched'
+
+
+class RequestMetricsMiddleware:
+    """
+    Request count and latency by route for every request (not sampled).
+    Add to MIDDLEWARE in settings.py first, so it times everything below.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = perf_counter()
+        response = self.get_response(request)
+        self._observe(request, response, perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = perf_counter()
+        response = await self.get_response(request)
+        self._observe(request, response, perf_counter() - started)
+        return response
+
+    @staticmethod
+    def _observe(request, response, seconds: float) -> None:
+        route = _route(request)
+        REQUEST_LATENCY.labels(route, request.method).observe(seconds)
+        REQUESTS.labels(route, request.method, str(response.status_code)).inc()
+
+
+def observe_request(metrics) -> None:
+    """users.instrumentation listener for the query-level metrics of sampled requests"""
+    route = metrics.view or 'unmatched'
+    REQUEST_DB_TIME.labels(route).observe(metrics.db_seconds)
+    REQUEST_QUERIES.labels(route).inc(metrics.queries)
+
+
+def observe_agent_run(state: Dict[str, Any]) -> None:
+    """Stage durations (AIReportAgent processing_times) and errors of one finished agent run"""
+    for stage, seconds in state.get('processing_times', {}).items():
+        AGENT_STAGE_DURATION.labels(stage).observe(seconds)
+    for error in state.get('errors', []):
+        AGENT_STAGE_ERRORS.labels(error.split(':', 1)[0]).inc()
+
+
+def metrics_view(request):
+    """GET /metrics - Prometheus text format, for staff or METRICS['TOKEN'] bearers (see the module docstring)"""
+    options = getattr(settings, 'METRICS', {})
+    token = options.get('TOKEN')
+    allowed = (
+        request.user.is_staff
+        or (token and request.headers.get('Authorization') == f'Bearer {token}')
+        or (not token and options.get('PUBLIC', False))
+    )
+    if not allowed:
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,50 @@
+# Generated by Django 6.0.1 on 2026-10-19 09:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_notification'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movement_type', models.CharField(choices=[('receipt', 'Receipt'), ('sale', 'Sale'), ('transfer', 'Transfer'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('quantity', models.IntegerField()),
+                ('reference', models.CharField(blank=True, max_length=100)),
+                ('occurred_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('applied', models.BooleanField(default=False)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('location', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movements', to='users.warehouselocation')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='movements', to='users.product')),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='movements', to='users.store')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['product', 'store', 'occurred_at'], name='movement_pair_time_idx'), models.Index(fields=['occurred_at'], name='movement_time_idx'), models.Index(fields=['applied', 'id'], name='movement_pending_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField()),
+                ('quantity', models.IntegerField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='users.product')),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='users.store')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['taken_at'], name='snapshot_time_idx')],
+                'unique_together': {('taken_at', 'product', 'store')},
+            },
+        ),
+    ]
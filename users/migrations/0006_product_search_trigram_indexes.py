@@ -0,0 +1,43 @@
+"""
+pg_trgm GIN indexes for product search (see users/search.py)
+
+The indexes are on UPPER(column), the expression Django's icontains and
+istartswith lookups compare on PostgreSQL. Other databases skip this
+migration and search with the in-process n-gram index.
+"""
+
+from django.db import migrations
+
+INDEXES = [
+    ('product_sku_trgm_idx', 'users_product', 'sku'),
+    ('product_name_trgm_idx', 'users_product', 'name'),
+    ('category_name_trgm_idx', 'users_category', 'name'),
+]
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (UPPER({column}::text) gin_trgm_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_stockreservation'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
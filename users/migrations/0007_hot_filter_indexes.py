@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:41
+
+from django.db import migrations, models
+
+
+def analyze(apps, schema_editor):
+    # Without table statistics SQLite's planner may prefer a foreign key index over the new ones
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute('ANALYZE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_product_search_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(fields=['store', 'quantity'], name='inventory_store_qty_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['sale_date', 'product', 'store', 'quantity', 'total_amount'], name='sale_date_cover_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['store', 'sale_date'], name='sale_store_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['year', 'month'], name='sale_year_month_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='store',
+            index=models.Index(fields=['country', 'city'], name='store_country_city_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='store',
+            index=models.Index(fields=['city'], name='store_city_idx'),
+        ),
+        migrations.RunPython(analyze, migrations.RunPython.noop),
+    ]
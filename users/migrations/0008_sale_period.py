@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:12
+
+from django.db import migrations, models
+from django.db.models.functions import TruncMonth
+
+
+def fill_period(apps, schema_editor):
+    Sale = apps.get_model('users', 'Sale')
+    Sale.objects.update(period=TruncMonth('sale_date', output_field=models.DateField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='period',
+            field=models.DateField(null=True),
+        ),
+        migrations.RunPython(fill_period, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='sale',
+            name='period',
+            field=models.DateField(),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['period', 'store'], name='sale_period_store_idx'),
+        ),
+    ]
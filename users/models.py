@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 
 class Company(models.Model):
@@ -48,6 +49,13 @@ class Store(models.Model):
     address = models.TextField()
     is_active = models.BooleanField(default=True)
     
+    class Meta:
+        indexes = [
+            # Country / city filters of the inventory, sales and warehouse APIs
+            models.Index(fields=['country', 'city'], name='store_country_city_idx'),
+            models.Index(fields=['city'], name='store_city_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.name} - {self.city}"
 
@@ -123,6 +131,10 @@ class Inventory(models.Model):
     class Meta:
         unique_together = ['product', 'store']
         verbose_name_plural = "Inventories"
+        indexes = [
+            # Stock tier filters within the stores of a country / city / company
+            models.Index(fields=['store', 'quantity'], name='inventory_store_qty_idx'),
+        ]
     
     def __str__(self):
         return f"{self.product.name} at {self.store.name}: {self.quantity}"
@@ -138,16 +150,30 @@ class Sale(models.Model):
     sale_date = models.DateTimeField(auto_now_add=True)
     month = models.CharField(max_length=20)  # E.g.: "Jan", "Feb"
     year = models.IntegerField()
+    period = models.DateField()  # First day of the sale's month: chronological, range-scannable month bucket
+    
+    class Meta:
+        indexes = [
+            # Period scans of the KPI, replenishment, forecasting and daily metrics engines; covers
+            # their GROUP BY, so the table itself is never read (key columns: SQLite has no INCLUDE)
+            models.Index(fields=['sale_date', 'product', 'store', 'quantity', 'total_amount'],
+                         name='sale_date_cover_idx'),
+            models.Index(fields=['store', 'sale_date'], name='sale_store_date_idx'),
+            models.Index(fields=['year', 'month'], name='sale_year_month_idx'),
+            models.Index(fields=['period', 'store'], name='sale_period_store_idx'),
+        ]
     
     def __str__(self):
         return f"Sale #{self.sale_id} - {self.product.name}"
     
     def save(self, *args, **kwargs):
-        # Auto-update month and year
+        # Auto-update month, year and period (auto_now_add replaces sale_date on insert)
+        sale_date = timezone.localtime(timezone.now() if self._state.adding else self.sale_date)
         if not self.month:
-            self.month = self.sale_date.strftime('%b')
+            self.month = sale_date.strftime('%b')
         if not self.year:
-            self.year = self.sale_date.year
+            self.year = sale_date.year
+        self.period = sale_date.date().replace(day=1)
         super().save(*args, **kwargs)
 
 
@@ -166,6 +192,84 @@ class DashboardMetrics(models.Model):
         return f"Metrics for {self.metric_date}"
 
 
+# ============================================
+# Stock Ledger
+# ============================================
+
+class StockMovement(models.Model):
+    """Append-only record of a stock change; source of truth for Inventory quantities"""
+    MOVEMENT_TYPES = [
+        ('receipt', 'Receipt'),
+        ('sale', 'Sale'),
+        ('transfer', 'Transfer'),
+        ('adjustment', 'Adjustment'),
+    ]
+    
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name='movements')
+    store = models.ForeignKey(Store, on_delete=models.PROTECT, related_name='movements')
+    location = models.ForeignKey(WarehouseLocation, on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='movements')
+    movement_type = models.CharField(max_length=20, choices=MOVEMENT_TYPES)
+    quantity = models.IntegerField()  # Signed delta: positive in, negative out
+    reference = models.CharField(max_length=100, blank=True)  # E.g.: sale id, transfer id, ERP document
+    occurred_at = models.DateTimeField(default=timezone.now)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    applied = models.BooleanField(default=False)  # Materialized into Inventory/WarehouseLocation
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['product', 'store', 'occurred_at'], name='movement_pair_time_idx'),
+            models.Index(fields=['occurred_at'], name='movement_time_idx'),
+            models.Index(fields=['applied', 'id'], name='movement_pending_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_movement_type_display()} {self.quantity:+d} {self.product_id} @ {self.store_id}"
+
+
+class StockSnapshot(models.Model):
+    """Quantity of a product in a store at `taken_at` (all pairs share the same taken_at per run)"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    store = models.ForeignKey(Store, on_delete=models.CASCADE)
+    taken_at = models.DateTimeField()
+    quantity = models.IntegerField()
+    
+    class Meta:
+        unique_together = ['taken_at', 'product', 'store']
+        indexes = [models.Index(fields=['taken_at'], name='snapshot_time_idx')]
+    
+    def __str__(self):
+        return f"{self.product_id} @ {self.store_id} on {self.taken_at:%Y-%m-%d}: {self.quantity}"
+
+
+class StockReservation(models.Model):
+    """Stock held for an order; stock is decremented when the reservation is created"""
+    STATUS_CHOICES = [
+        ('reserved', 'Reserved'),
+        ('confirmed', 'Confirmed'),
+        ('released', 'Released'),
+    ]
+    
+    idempotency_key = models.CharField(max_length=100)  # Unique per user
+    request_hash = models.CharField(max_length=64)  # Same key with a different payload is rejected
+    store = models.ForeignKey(Store, on_delete=models.PROTECT, related_name='reservations')
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='reserved')
+    lines = models.JSONField(default=list)  # [{"sku": ..., "quantity": ..., "location_id": ...}]
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='reservation_user_key_unique'),
+        ]
+    
+    def __str__(self):
+        return f"Reservation {self.idempotency_key} ({self.status})"
+
+
 # ============================================
 # RBAC (Role-Based Access Control) Models
 # ============================================
@@ -0,0 +1,204 @@
+"""
+Opt-in request profiling for staff users
+
+ProfilingMiddleware profiles a view when a staff user asks for it with the
+`X-Profile` request header, or on every staff request to a URL name listed
+in PROFILING['ROUTES']. Two modes:
+- cprofile: deterministic cProfile, saved as a .prof pstats file
+  (open with `python -m pstats`, snakeviz, ...)
+- sample:   a background thread samples the request thread's stack every
+  SAMPLE_INTERVAL_MS, saved as a .folded collapsed-stack file
+  (open with speedscope or flamegraph.pl); much lower overhead
+
+`X-Profile: cprofile` / `X-Profile: sample` picks the mode (`1` uses MODE).
+The file name comes back in the X-Profile-Id response header; staff users
+list and download profiles on /api/profiles/. Only the newest MAX_FILES
+profiles are kept.
+
+Only the view itself is profiled (the middleware calls it from process_view),
+so keep the middleware last in MIDDLEWARE. Async views are not profiled.
+
+Configure through `settings.PROFILING` (see settings.py).
+"""
+
+import cProfile
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+from uuid import uuid4
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, JsonResponse
+
+MODES = {'cprofile': '.prof', 'sample': '.folded'}
+PROFILE_NAME = re.compile(r'^[\w.-]+\.(prof|folded)$')
+
+
+def profile_dir() -> str:
+    return str(getattr(settings, 'PROFILING', {}).get('DIRECTORY') or settings.BASE_DIR / 'profiles')
+
+
+def _prune(directory: str, max_files: int) -> None:
+    """Retention cap: delete the oldest profiles beyond max_files"""
+    profiles = sorted(
+        (entry for entry in os.scandir(directory) if PROFILE_NAME.match(entry.name)),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in profiles[:max(len(profiles) - max_files, 0)]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:  # Removed concurrently by another worker
+            pass
+
+
+# ============================================
+# Stack sampler
+# ============================================
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    if 'site-packages' in filename:
+        filename = filename.split('site-packages' + os.sep, 1)[1]
+    elif filename.startswith(str(settings.BASE_DIR)):
+        filename = os.path.relpath(filename, settings.BASE_DIR)
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+class StackSampler:
+    """Samples one thread's stack from a background thread; collapsed-stack output for flamegraphs"""
+
+    def __init__(self, interval: float, thread_id: int = None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path: str) -> None:
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+# ============================================
+# Middleware
+# ============================================
+
+class ProfilingMiddleware:
+    """
+    Profiles staff requests on demand (X-Profile header) or per route (PROFILING['ROUTES']).
+    Add last to MIDDLEWARE in settings.py.
+    """
+
+    def __init__(self, get_response):
+        options = getattr(settings, 'PROFILING', {})
+        if not options.get('ENABLED', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.routes = set(options.get('ROUTES', ()))
+        self.default_mode = options.get('MODE', 'cprofile')
+        self.interval = options.get('SAMPLE_INTERVAL_MS', 5) / 1000
+        self.max_files = options.get('MAX_FILES', 50)
+        self.directory = profile_dir()
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def _mode(self, request):
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_staff:
+            return None
+        requested = request.headers.get('X-Profile', '').lower()
+        if requested in MODES:
+            return requested
+        if requested in ('1', 'true') or request.resolver_match.url_name in self.routes:
+            return self.default_mode
+        return None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if iscoroutinefunction(view_func):
+            return None
+        mode = self._mode(request)
+        if mode is None:
+            return None
+
+        if mode == 'cprofile':
+            profiler = cProfile.Profile()
+            response = profiler.runcall(view_func, request, *view_args, **view_kwargs)
+        else:
+            with StackSampler(self.interval) as profiler:
+                response = view_func(request, *view_args, **view_kwargs)
+
+        os.makedirs(self.directory, exist_ok=True)
+        name = (f"{datetime.now():%Y%m%d-%H%M%S}-{request.resolver_match.url_name or 'view'}-"
+                f"{uuid4().hex[:8]}{MODES[mode]}")
+        if mode == 'cprofile':
+            profiler.dump_stats(os.path.join(self.directory, name))
+        else:
+            profiler.dump(os.path.join(self.directory, name))
+        _prune(self.directory, self.max_files)
+
+        response['X-Profile-Id'] = name
+        return response
+
+
+# ============================================
+# Views
+# ============================================
+
+@login_required
+def profile_list(request):
+    """GET /api/profiles/ - stored profiles, newest first (staff only)"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff only'}, status=403)
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        return JsonResponse({'profiles': []})
+
+    profiles = []
+    for entry in os.scandir(directory):
+        if PROFILE_NAME.match(entry.name):
+            stat = entry.stat()
+            profiles.append({
+                'name': entry.name,
+                'format': 'pstats' if entry.name.endswith('.prof') else 'collapsed',
+                'size': stat.st_size,
+                'created_at': datetime.fromtimestamp(stat.st_mtime).isoformat(timespec='seconds'),
+            })
+    profiles.sort(key=lambda p: p['created_at'], reverse=True)
+    return JsonResponse({'profiles': profiles})
+
+
+@login_required
+def profile_download(request, name):
+    """GET /api/profiles/<name>/ - download one profile (staff only)"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff only'}, status=403)
+    path = os.path.join(profile_dir(), name)
+    if not PROFILE_NAME.match(name) or not os.path.isfile(path):
+        return JsonResponse({'error': 'Profile not found'}, status=404)
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=name)
@@ -6,6 +6,7 @@ from functools import wraps
 from rest_framework.response import Response
 from rest_framework import status
 from django.http import HttpResponseForbidden
+from .metrics import AUDIT_WRITE_DURATION, AUDIT_WRITES
 from .models import UserRole, AuditLog
 
 
@@ -81,14 +82,16 @@ def log_audit(user, action, object_type, object_id='', description='', ip_addres
         description: Additional description
         ip_address: IP address of the request
     """
-    AuditLog.objects.create(
-        user=user,
-        action=action,
-        object_type=object_type,
-        object_id=object_id,
-        description=description,
-        ip_address=ip_address
-    )
+    with AUDIT_WRITE_DURATION.time():
+        AuditLog.objects.create(
+            user=user,
+            action=action,
+            object_type=object_type,
+            object_id=object_id,
+            description=description,
+            ip_address=ip_address
+        )
+    AUDIT_WRITES.labels(action).inc()
 
 
 # ============================================
@@ -0,0 +1,212 @@
+"""
+Replenishment planner
+
+Reorder points and order quantities for every (product, store) pair,
+computed in one vectorized pass:
+
+- daily demand       mean units per day over the period (days without sales count as 0)
+- demand std         standard deviation of daily units
+- safety stock       z(service level) × std × √lead time
+- reorder point      demand × lead time + safety stock
+- order-up-to level  demand × (lead time + review period) + safety stock
+- order quantity     order-up-to level - on hand, only when on hand ≤ reorder point
+
+Daily demand moments come from one query grouped by (product, store, day),
+so memory grows with the number of selling days, not with pairs × days.
+
+Used by the replenishment API, the AI agent (inventory reports) and the
+nightly `plan_replenishment` management command.
+"""
+
+import math
+from dataclasses import dataclass
+from datetime import timedelta
+from statistics import NormalDist
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncDay
+from django.utils import timezone
+
+from .kpi_engine import DEFAULT_PERIOD_DAYS, fetch_inventory_frame
+from .models import Inventory, Sale
+
+STATUS_LABELS = ['out-of-stock', 'low-stock', 'in-stock']
+
+
+@dataclass(frozen=True)
+class ReplenishmentPolicy:
+    """Planning assumptions, defaults from settings.REPLENISHMENT"""
+    lead_time_days: float = 7
+    review_period_days: float = 7
+    service_level: float = 0.95
+    period_days: int = DEFAULT_PERIOD_DAYS
+
+    @classmethod
+    def from_settings(cls, **overrides) -> 'ReplenishmentPolicy':
+        options = getattr(settings, 'REPLENISHMENT', {})
+        values = {
+            'lead_time_days': options.get('LEAD_TIME_DAYS', cls.lead_time_days),
+            'review_period_days': options.get('REVIEW_PERIOD_DAYS', cls.review_period_days),
+            'service_level': options.get('SERVICE_LEVEL', cls.service_level),
+            'period_days': options.get('PERIOD_DAYS', cls.period_days),
+        }
+        values.update({k: v for k, v in overrides.items() if v is not None})
+        return cls(**values)
+
+    def validate(self) -> None:
+        """Raise ValueError for values the safety stock formula cannot use (NaN fails every check)"""
+        if not (0 < self.service_level < 1):
+            raise ValueError('service_level must be between 0 and 1 (exclusive)')
+        if not all(value >= 0 and math.isfinite(value) for value in (self.lead_time_days, self.review_period_days)):
+            raise ValueError('lead_time and review_period must be finite and not negative')
+        if not self.period_days >= 1:
+            raise ValueError('period must be at least 1 day')
+
+    @property
+    def z(self) -> float:
+        """Safety factor for the target cycle service level"""
+        return NormalDist().inv_cdf(min(max(self.service_level, 0.5), 0.9999))
+
+
+def fetch_demand_moments(filters: Optional[Q] = None, period_days: int = DEFAULT_PERIOD_DAYS) -> pd.DataFrame:
+    """
+    Mean and standard deviation of daily units per (product, store).
+
+    Sums and sums of squares of the daily totals are accumulated per pair;
+    days without sales contribute zeros through the fixed period length.
+    """
+    filters = filters or Q()
+    since = timezone.now() - timedelta(days=period_days)
+    inventory_scope = Inventory.objects.filter(filters)
+
+    rows = list(
+        Sale.objects.filter(
+            sale_date__gte=since,
+            product_id__in=inventory_scope.values('product_id'),
+            store_id__in=inventory_scope.values('store_id'),
+        )
+        .annotate(day=TruncDay('sale_date'))
+        .values('product_id', 'store_id', 'day')
+        .annotate(units=Sum('quantity'))
+        .values_list('product_id', 'store_id', 'units')
+        .iterator(chunk_size=20000)
+    )
+    daily = pd.DataFrame.from_records(rows, columns=['product_id', 'store_id', 'units'])
+    if daily.empty:
+        return pd.DataFrame(columns=['product_id', 'store_id', 'daily_demand', 'demand_std'])
+
+    daily['units'] = daily['units'].astype(np.float64)
+    daily['units_sq'] = daily['units'] ** 2
+    totals = daily.groupby(['product_id', 'store_id'], sort=False)[['units', 'units_sq']].sum().reset_index()
+
+    mean = totals['units'].to_numpy() / period_days
+    variance = totals['units_sq'].to_numpy() / period_days - mean ** 2
+    totals['daily_demand'] = mean
+    totals['demand_std'] = np.sqrt(np.maximum(variance, 0))
+    return totals[['product_id', 'store_id', 'daily_demand', 'demand_std']]
+
+
+def compute_replenishment(frame: pd.DataFrame, moments: pd.DataFrame,
+                          policy: ReplenishmentPolicy) -> pd.DataFrame:
+    """
+    Add planning columns to an inventory frame (see fetch_inventory_frame).
+
+    Pure and vectorized over all pairs.
+    """
+    plan = frame.merge(moments, on=['product_id', 'store_id'], how='left')
+    on_hand = plan['quantity'].to_numpy(dtype=np.float64)
+    demand = plan['daily_demand'].fillna(0).to_numpy(dtype=np.float64)
+    std = plan['demand_std'].fillna(0).to_numpy(dtype=np.float64)
+    price = pd.to_numeric(plan['price'], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+
+    lead_time = policy.lead_time_days
+    safety_stock = policy.z * std * np.sqrt(lead_time)
+    reorder_point = demand * lead_time + safety_stock
+    order_up_to = demand * (lead_time + policy.review_period_days) + safety_stock
+
+    needs_order = (on_hand <= reorder_point) & (demand > 0)
+    order_quantity = np.where(needs_order, np.ceil(np.maximum(order_up_to - on_hand, 0)), 0)
+
+    status_codes = np.where(on_hand <= 0, 0, np.where(on_hand <= reorder_point, 1, 2))
+
+    plan['daily_demand'] = demand
+    plan['demand_std'] = std
+    plan['safety_stock'] = np.ceil(safety_stock)
+    plan['reorder_point'] = np.ceil(reorder_point)
+    plan['order_up_to'] = np.ceil(order_up_to)
+    plan['order_quantity'] = order_quantity.astype(np.int64)
+    plan['order_value'] = order_quantity * price
+    with np.errstate(divide='ignore', invalid='ignore'):
+        plan['days_of_cover'] = np.where(demand > 0, on_hand / demand, np.inf)
+    plan['stock_status'] = pd.Categorical.from_codes(status_codes, categories=STATUS_LABELS)
+    return plan
+
+
+def build_replenishment_plan(filters: Optional[Q] = None,
+                             policy: Optional[ReplenishmentPolicy] = None) -> pd.DataFrame:
+    """Fetch and compute in one call"""
+    policy = policy or ReplenishmentPolicy.from_settings()
+    frame = fetch_inventory_frame(filters, policy.period_days)
+    return compute_replenishment(frame, fetch_demand_moments(filters, policy.period_days), policy)
+
+
+def summarize_replenishment(plan: pd.DataFrame, policy: ReplenishmentPolicy) -> Dict[str, Any]:
+    """Headline numbers for reports and the API"""
+    summary = {
+        'lead_time_days': policy.lead_time_days,
+        'review_period_days': policy.review_period_days,
+        'service_level': policy.service_level,
+        'period_days': policy.period_days,
+        'positions': int(len(plan)),
+    }
+    if plan.empty:
+        return {**summary, 'positions_to_order': 0, 'units_to_order': 0, 'order_value': 0.0,
+                'status_counts': {label: 0 for label in STATUS_LABELS}}
+
+    ordering = plan['order_quantity'] > 0
+    return {
+        **summary,
+        'positions_to_order': int(ordering.sum()),
+        'units_to_order': int(plan['order_quantity'].sum()),
+        'order_value': round(float(plan['order_value'].sum()), 2),
+        'status_counts': {label: int(count) for label, count in
+                          plan['stock_status'].value_counts().reindex(STATUS_LABELS, fill_value=0).items()},
+    }
+
+
+def plan_rows(plan: pd.DataFrame, limit: int = 100, only_orders: bool = True) -> list:
+    """JSON-friendly rows, largest order value first"""
+    columns = [
+        'product_id', 'name', 'store_id', 'country', 'quantity', 'daily_demand', 'safety_stock',
+        'reorder_point', 'order_up_to', 'order_quantity', 'order_value', 'days_of_cover', 'stock_status',
+    ]
+    rows = plan[plan['order_quantity'] > 0] if only_orders else plan
+    top = rows.nlargest(limit, 'order_value')[columns]
+    top = top.replace([np.inf, -np.inf], np.nan).round(2)
+    return [
+        {k: (None if isinstance(v, float) and np.isnan(v) else v) for k, v in row.items()}
+        for row in top.to_dict(orient='records')
+    ]
+
+
+def product_statuses(plan: pd.DataFrame) -> pd.Series:
+    """
+    Product.status derived from the plan (worst store wins).
+
+    A product is out of stock only when no store has it on hand.
+    """
+    if plan.empty:
+        return pd.Series(dtype=object)
+    codes = plan['stock_status'].cat.codes.to_numpy()
+    grouped = pd.DataFrame({
+        'product_id': plan['product_id'].to_numpy(),
+        'worst': codes,
+        'on_hand': plan['quantity'].to_numpy(),
+    }).groupby('product_id', sort=False).agg(worst=('worst', 'min'), on_hand=('on_hand', 'sum'))
+    # Some stores empty but stock elsewhere: low stock rather than out of stock
+    status = np.where(grouped['on_hand'] <= 0, 0, np.where(grouped['worst'] == 2, 2, 1))
+    return pd.Series(np.array(STATUS_LABELS)[status], index=grouped.index)
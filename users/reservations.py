@@ -0,0 +1,246 @@
+"""
+Stock reservations
+
+Checkout decrements Inventory (and optionally WarehouseLocation) atomically:
+
+- every line is a conditional UPDATE ... SET quantity = quantity - n
+  WHERE quantity >= n; zero rows updated means not enough stock and the
+  whole order is rolled back, so concurrent checkouts can never oversell
+- rows are locked in a fixed order (inventory by SKU, then locations by
+  id) so multi-line orders cannot deadlock each other
+- an idempotency key makes retries safe: the same key returns the original
+  reservation, the same key with a different order is rejected; keys are
+  scoped to the user, so one user's key never returns another's reservation
+
+Reservations are then confirmed (Sale rows are created) or released (stock
+is put back). Every stock change is also written to the StockMovement ledger.
+"""
+
+import hashlib
+import json
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .daily_metrics import refresh_days
+from .models import Inventory, Product, Sale, StockMovement, StockReservation, Store, WarehouseLocation
+from .response_cache import bump_models
+
+
+class ReservationError(Exception):
+    """Base error for reservation requests"""
+    status_code = 400
+
+    def payload(self) -> Dict[str, Any]:
+        return {'error': str(self)}
+
+
+class InsufficientStock(ReservationError):
+    """One or more lines cannot be served; nothing was reserved"""
+    status_code = 409
+
+    def __init__(self, lines: List[Dict[str, Any]]):
+        self.lines = lines
+        super().__init__('Insufficient stock')
+
+    def payload(self) -> Dict[str, Any]:
+        return {'error': str(self), 'lines': self.lines}
+
+
+class IdempotencyConflict(ReservationError):
+    """The idempotency key was already used for a different order"""
+    status_code = 422
+
+
+def normalize_lines(lines: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Validate order lines, merge duplicates and sort them in lock order.
+
+    Each line: {"sku": str, "quantity": int > 0, "location_id": int (optional)}
+    """
+    if not isinstance(lines, (list, tuple)):
+        raise ReservationError('lines must be a list')
+    merged: Dict[Tuple[str, Any], int] = {}
+    for line in lines:
+        try:
+            sku = str(line['sku'])
+            quantity = int(line['quantity'])
+            location_id = int(line['location_id']) if line.get('location_id') is not None else None
+        except (KeyError, TypeError, ValueError):
+            raise ReservationError('Each line needs a sku and an integer quantity')
+        if quantity <= 0:
+            raise ReservationError(f"Quantity for {sku} must be positive")
+        merged[(sku, location_id)] = merged.get((sku, location_id), 0) + quantity
+
+    if not merged:
+        raise ReservationError('An order needs at least one line')
+    return [
+        {'sku': sku, 'quantity': quantity, 'location_id': location_id}
+        for (sku, location_id), quantity in sorted(merged.items(), key=lambda item: (item[0][0], item[0][1] or 0))
+    ]
+
+
+def request_hash(store_id: str, lines: List[Dict[str, Any]]) -> str:
+    return hashlib.sha256(json.dumps([store_id, lines], sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _shortages(store_id: str, lines: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Requested vs available for every line that cannot be served (one query)"""
+    available = dict(
+        Inventory.objects.filter(store_id=store_id, product_id__in=[line['sku'] for line in lines])
+        .values_list('product_id', 'quantity')
+    )
+    requested: Dict[str, int] = {}
+    for line in lines:
+        requested[line['sku']] = requested.get(line['sku'], 0) + line['quantity']
+    return [
+        {'sku': sku, 'requested': quantity, 'available': max(available.get(sku, 0), 0)}
+        for sku, quantity in requested.items() if available.get(sku, 0) < quantity
+    ]
+
+
+def _decrement(store_id: str, lines: List[Dict[str, Any]]) -> None:
+    """Conditional decrements in lock order; raises InsufficientStock (caller rolls back)"""
+    per_sku: Dict[str, int] = {}
+    for line in lines:
+        per_sku[line['sku']] = per_sku.get(line['sku'], 0) + line['quantity']
+
+    for sku in sorted(per_sku):
+        updated = Inventory.objects.filter(
+            product_id=sku, store_id=store_id, quantity__gte=per_sku[sku],
+        ).update(quantity=F('quantity') - per_sku[sku])
+        if not updated:
+            raise InsufficientStock(_shortages(store_id, lines))
+
+    located = [line for line in lines if line['location_id'] is not None]
+    if not located:
+        return
+    valid = set(WarehouseLocation.objects.filter(
+        id__in=[line['location_id'] for line in located], warehouse__store_id=store_id,
+    ).values_list('id', 'product_id'))
+    for line in sorted(located, key=lambda line: line['location_id']):
+        if (line['location_id'], line['sku']) not in valid:
+            raise ReservationError(f"Location {line['location_id']} does not hold {line['sku']} in store {store_id}")
+        updated = WarehouseLocation.objects.filter(
+            id=line['location_id'], quantity__gte=line['quantity'],
+        ).update(quantity=F('quantity') - line['quantity'], last_updated=timezone.now())
+        if not updated:
+            raise InsufficientStock([{'sku': line['sku'], 'location_id': line['location_id'],
+                                      'requested': line['quantity'],
+                                      'available': WarehouseLocation.objects.get(id=line['location_id']).quantity}])
+
+
+def _ledger(reservation: StockReservation, sign: int, user=None) -> None:
+    """Movements for a reservation; already applied since stock was updated directly"""
+    now = timezone.now()
+    StockMovement.objects.bulk_create([
+        StockMovement(product_id=line['sku'], store_id=reservation.store_id, location_id=line['location_id'],
+                      movement_type='sale', quantity=sign * line['quantity'],
+                      reference=f"reservation-{reservation.pk}", occurred_at=now, created_by=user, applied=True)
+        for line in reservation.lines
+    ])
+
+
+def _replay(reservation: StockReservation, digest: str) -> Tuple[StockReservation, bool]:
+    if reservation.request_hash != digest:
+        raise IdempotencyConflict('Idempotency key already used for a different order')
+    return reservation, False
+
+
+def reserve_stock(idempotency_key: str, store_id: str, lines: Iterable[Dict[str, Any]],
+                  user=None) -> Tuple[StockReservation, bool]:
+    """
+    Reserve all lines of an order or nothing.
+
+    Returns:
+        (reservation, created) - created is False when the key was seen before
+    """
+    if not idempotency_key:
+        raise ReservationError('An idempotency key is required')
+    if not Store.objects.filter(pk=store_id).exists():
+        raise ReservationError(f"Unknown store {store_id}")
+    lines = normalize_lines(lines)
+    digest = request_hash(store_id, lines)
+
+    existing = StockReservation.objects.filter(user=user, idempotency_key=idempotency_key).first()
+    if existing:
+        return _replay(existing, digest)
+
+    try:
+        with transaction.atomic():
+            reservation = StockReservation.objects.create(
+                idempotency_key=idempotency_key, request_hash=digest, store_id=store_id, user=user, lines=lines,
+            )
+            _decrement(store_id, lines)
+            _ledger(reservation, -1, user)
+            bump_models(Inventory)
+    except IntegrityError:
+        # A concurrent request with the same key committed first
+        existing = StockReservation.objects.filter(user=user, idempotency_key=idempotency_key).first()
+        if existing is None:
+            raise
+        return _replay(existing, digest)
+    return reservation, True
+
+
+def release_reservation(reservation_id: int, user=None) -> StockReservation:
+    """Put reserved stock back; releasing twice is a no-op"""
+    with transaction.atomic():
+        reservation = StockReservation.objects.select_for_update().get(pk=reservation_id)
+        if reservation.status == 'confirmed':
+            raise ReservationError('Confirmed reservations cannot be released')
+        if reservation.status == 'released':
+            return reservation
+
+        for line in reservation.lines:
+            Inventory.objects.filter(product_id=line['sku'], store_id=reservation.store_id).update(
+                quantity=F('quantity') + line['quantity']
+            )
+            if line['location_id'] is not None:
+                WarehouseLocation.objects.filter(id=line['location_id']).update(
+                    quantity=F('quantity') + line['quantity'], last_updated=timezone.now()
+                )
+        _ledger(reservation, 1, user)
+        bump_models(Inventory)
+        reservation.status = 'released'
+        reservation.save(update_fields=['status', 'updated_at'])
+    return reservation
+
+
+def confirm_reservation(reservation_id: int) -> Tuple[StockReservation, List[Sale]]:
+    """Turn a reservation into Sale rows; confirming twice is a no-op"""
+    with transaction.atomic():
+        reservation = StockReservation.objects.select_for_update().get(pk=reservation_id)
+        if reservation.status == 'released':
+            raise ReservationError('Released reservations cannot be confirmed')
+        if reservation.status == 'confirmed':
+            return reservation, []
+
+        prices = dict(Product.objects.filter(sku__in=[line['sku'] for line in reservation.lines])
+                      .values_list('sku', 'price'))
+        now = timezone.now()
+        sales = Sale.objects.bulk_create([
+            Sale(product_id=line['sku'], store_id=reservation.store_id, quantity=line['quantity'],
+                 total_amount=prices.get(line['sku'], Decimal('0')) * line['quantity'],
+                 month=now.strftime('%b'), year=now.year, period=timezone.localdate(now).replace(day=1))
+            for line in reservation.lines
+        ])
+        bump_models(Sale)
+        refresh_days(timezone.localdate(now), timezone.localdate(now))  # bulk_create sends no post_save
+        reservation.status = 'confirmed'
+        reservation.save(update_fields=['status', 'updated_at'])
+    return reservation, sales
+
+
+def reservation_payload(reservation: StockReservation) -> Dict[str, Any]:
+    return {
+        'id': reservation.pk,
+        'idempotency_key': reservation.idempotency_key,
+        'store': reservation.store_id,
+        'status': reservation.status,
+        'lines': reservation.lines,
+        'created_at': reservation.created_at.isoformat(),
+    }
@@ -0,0 +1,221 @@
+"""
+Tiered response cache for read-heavy dashboard APIs
+
+`@cached_response(*tables)` caches a JSON view's body under a key made of
+- the view name
+- the normalized query string (sorted, 'all' and empty filters dropped)
+- the user's permission scope (superuser, RBAC role or none)
+- the current version of every table the response is built from
+
+Lookups go to a per-process LRU first (entries live LRU_TIMEOUT seconds),
+then to the shared Django cache (TIMEOUT seconds), and only then to the
+view; `cached_value()` applies the same tiers to any computed value.
+Writes never touch cached entries: they bump the table version
+(`bump_tables`), which changes the key, so stale entries just age out.
+Versions are bumped
+- from post_save/post_delete signals on the cached models (signals.py)
+- explicitly by bulk operations that bypass signals (bulk_create/update,
+  QuerySet.update, the import pipeline)
+Inside a transaction the version is bumped again on commit, so a response
+computed from pre-commit data while the transaction was open is dropped too.
+
+Responses and values read from the database replica (db_router) are
+returned but not stored: the replica may not have caught up with the versions in the key.
+
+Every cached response carries an ETag; a matching If-None-Match costs a 304
+without a body.
+
+Configure through `settings.RESPONSE_CACHE` (see settings.py).
+"""
+
+import hashlib
+import threading
+from time import monotonic
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import quote_etag
+
+from .db_router import reading_replica
+from .rbac_utils import get_user_role
+
+VERSION_TIMEOUT = None  # Versions never expire; losing one would resurrect old entries
+IGNORED_FILTER_VALUES = ('', 'all')
+
+
+def _options():
+    return getattr(settings, 'RESPONSE_CACHE', {})
+
+
+# ============================================
+# Table versions
+# ============================================
+
+def _version_key(table: str) -> str:
+    return f'response_cache:version:{table}'
+
+
+def table_versions(tables: Iterable[str]) -> Dict[str, int]:
+    """Current version of each table (0 until its first change)"""
+    keys = {table: _version_key(table) for table in tables}
+    found = cache.get_many(list(keys.values()))
+    return {table: found.get(key, 0) for table, key in keys.items()}
+
+
+def _bump(tables: Tuple[str, ...]) -> None:
+    for table in tables:
+        key = _version_key(table)
+        try:
+            cache.incr(key)
+        except ValueError:  # Not set yet (or evicted): any new value invalidates
+            cache.set(key, 1, VERSION_TIMEOUT)
+
+
+def bump_tables(*tables: str) -> None:
+    """Invalidate every cached response built from these tables (e.g. 'inventory', 'sale')"""
+    _bump(tables)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(tables))
+
+
+def bump_models(*models) -> None:
+    bump_tables(*(model._meta.model_name for model in models))
+
+
+# ============================================
+# In-process LRU
+# ============================================
+
+class LRUCache:
+    """Small thread-safe LRU with per-entry expiry (same timeout as the Django cache entry)"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout: float) -> None:
+        with self._lock:
+            self._entries[key] = (monotonic() + timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+local_cache = LRUCache(_options().get('LRU_SIZE', 256))
+
+
+# ============================================
+# View decorator
+# ============================================
+
+def permission_scope(user) -> str:
+    if user.is_superuser:
+        return 'superuser'
+    role = get_user_role(user)
+    return f'role:{role.pk}' if role else 'none'
+
+
+def _tiered_get(key: str):
+    value = local_cache.get(key)
+    if value is None:
+        value = cache.get(key)
+        if value is not None:
+            local_cache.set(key, value, _options().get('LRU_TIMEOUT', 30))
+    return value
+
+
+def _tiered_set(key: str, value) -> None:
+    cache.set(key, value, _options().get('TIMEOUT', 300))
+    local_cache.set(key, value, _options().get('LRU_TIMEOUT', 30))
+
+
+def cached_value(name: str, tables: Tuple[str, ...], compute: Callable[[], Any]):
+    """compute() cached like a response: same tiers, invalidated by the same table versions"""
+    versions = table_versions(tables)
+    raw = name + '|' + ','.join(f'{table}={versions[table]}' for table in tables)
+    key = f'response_cache:value:{name}:{hashlib.sha1(raw.encode()).hexdigest()}'
+    value = _tiered_get(key)
+    if value is None:
+        value = compute()
+        if not reading_replica():
+            _tiered_set(key, value)
+    return value
+
+
+def _cache_key(request, view_name: str, tables: Tuple[str, ...]) -> str:
+    filters = sorted(
+        (key, value) for key, values in request.GET.lists() for value in values
+        if value not in IGNORED_FILTER_VALUES
+    )
+    versions = table_versions(tables)
+    raw = '|'.join([
+        view_name,
+        repr(filters),
+        permission_scope(request.user),
+        request.headers.get('X-Requested-With', ''),
+        ','.join(f'{table}={versions[table]}' for table in tables),
+    ])
+    return f'response_cache:{view_name}:{hashlib.sha1(raw.encode()).hexdigest()}'
+
+
+def _respond(request, etag: str, body: bytes) -> HttpResponse:
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)  # Browsers revalidate with If-None-Match
+    return response
+
+
+def cached_response(*tables: str):
+    """Cache 200 JSON responses of a GET view; see the module docstring. Put it below @login_required."""
+
+    def decorator(view_func):
+        view_name = view_func.__name__
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            options = _options()
+            if not options.get('ENABLED', True) or request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+
+            key = _cache_key(request, view_name, tables)
+            entry: Optional[tuple] = _tiered_get(key)
+            if entry is not None:
+                return _respond(request, *entry)
+
+            response = view_func(request, *args, **kwargs)
+            if response.status_code != 200 or response.get('Content-Type') != 'application/json':
+                return response
+            entry = (quote_etag(hashlib.blake2b(response.content, digest_size=16).hexdigest()), response.content)
+            if not reading_replica():
+                _tiered_set(key, entry)
+            return _respond(request, *entry)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,186 @@
+"""
+Product search
+
+- search_products(query, limit)  best matching products for the typeahead
+- product_search_q(query)        Q matching the products of a search box
+                                 (inventory API and export)
+
+Ranking: exact SKU, then SKU prefix, then name prefix, then the closest
+remaining match (trigram similarity on PostgreSQL, earliest match position
+in the n-gram index), ties by SKU.
+
+PostgreSQL: migration 0006 creates pg_trgm GIN indexes on UPPER(sku),
+UPPER(name) and UPPER(category name). Django's icontains/istartswith compile
+to UPPER(column) LIKE UPPER(...), which those indexes serve, so searches are
+index scans instead of sequential scans.
+
+Other databases (SQLite): an in-process trigram index over
+"sku, name, category" answers both functions. It is built on first use and
+rebuilt when the product or category table version changes (the versions
+kept by response_cache). SKU and name prefixes, which rank first, come from
+a binary search over sorted keys; queries shorter than three characters only
+match prefixes.
+"""
+
+import heapq
+import threading
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+
+from .models import Product
+from .response_cache import table_versions
+
+GRAM_SIZE = 3
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+# Above this many matching SKUs the SQLite filter falls back to icontains (SQLite caps bound parameters)
+MAX_SKU_TERMS = 500
+MAX_CANDIDATES = 2000
+INDEX_TABLES = ('product', 'category')
+
+
+def _grams(text: str) -> Iterable[str]:
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+def _rank(query: str, sku: str, name: str) -> int:
+    sku, name = sku.lower(), name.lower()
+    if sku == query:
+        return 0
+    if sku.startswith(query):
+        return 1
+    if name.startswith(query):
+        return 2
+    return 3
+
+
+def _icontains_q(query: str, prefix: str) -> Q:
+    return (Q(**{f'{prefix}name__icontains': query}) | Q(**{f'{prefix}sku__icontains': query}) |
+            Q(**{f'{prefix}category__name__icontains': query}))
+
+
+# ============================================
+# In-process n-gram index
+# ============================================
+
+class NGramIndex:
+    """Trigram postings over the lowercased "sku, name, category" text of every product"""
+
+    def __init__(self, rows: Iterable[Tuple[str, str, Optional[str]]]):
+        self.rows: List[Tuple[str, str, str]] = []
+        self.texts: List[str] = []
+        postings = defaultdict(lambda: array('I'))
+        for position, (sku, name, category) in enumerate(rows):
+            self.rows.append((sku, name, category or ''))
+            text = '\t'.join((sku, name, category or '')).lower()
+            self.texts.append(text)
+            for gram in _grams(text):
+                postings[gram].append(position)
+        self.postings = dict(postings)
+        # Sorted (lowercased key, position) pairs for prefix lookups
+        self.sku_keys = sorted((sku.lower(), i) for i, (sku, _, _) in enumerate(self.rows))
+        self.name_keys = sorted((name.lower(), i) for i, (_, name, _) in enumerate(self.rows))
+
+    def _prefixed(self, keys: List[Tuple[str, int]], query: str, limit: int) -> List[int]:
+        found = []
+        start = bisect_left(keys, (query,))
+        for key, position in (keys[i] for i in range(start, min(len(keys), start + limit))):
+            if not key.startswith(query):
+                break
+            found.append(position)
+        return found
+
+    def matches(self, query: str) -> Iterator[int]:
+        """Positions whose text contains the query, lazily (needs at least GRAM_SIZE characters)"""
+        # Walk the rarest gram's postings and check each text: a substring test costs about as
+        # much as a set lookup, and stopping early keeps very common queries cheap
+        rarest = min((self.postings.get(gram, ()) for gram in _grams(query)), key=len, default=())
+        return (i for i in rarest if query in self.texts[i])
+
+    def search(self, query: str, limit: int) -> List[Tuple[str, str, str]]:
+        query = query.lower()
+        # Prefix matches outrank every other match: when they fill the page, skip the substring search
+        positions = set(self._prefixed(self.sku_keys, query, limit) + self._prefixed(self.name_keys, query, limit))
+        if len(query) >= GRAM_SIZE and len(positions) < limit:
+            # Very common substrings (e.g. a category name) rank among the first MAX_CANDIDATES matches only
+            positions.update(islice(self.matches(query), MAX_CANDIDATES))
+        best = heapq.nsmallest(limit, positions, key=lambda i: (
+            _rank(query, self.rows[i][0], self.rows[i][1]), self.texts[i].find(query), self.rows[i][0]))
+        return [self.rows[i] for i in best]
+
+
+_index: Optional[NGramIndex] = None
+_index_versions: Optional[Dict[str, int]] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> NGramIndex:
+    global _index, _index_versions
+    versions = table_versions(INDEX_TABLES)
+    if _index is None or versions != _index_versions:
+        with _index_lock:
+            if _index is None or versions != _index_versions:
+                rows = (Product.objects.order_by().values_list('sku', 'name', 'category__name')
+                        .iterator(chunk_size=20000))
+                _index, _index_versions = NGramIndex(rows), versions
+    return _index
+
+
+def reset_index() -> None:
+    """Drop the in-process index (tests; it rebuilds on the next search)"""
+    global _index, _index_versions
+    with _index_lock:
+        _index, _index_versions = None, None
+
+
+# ============================================
+# Search
+# ============================================
+
+def _uses_trigram_indexes() -> bool:
+    return connection.vendor == 'postgresql'
+
+
+def product_search_q(query: str, prefix: str = 'product__') -> Q:
+    """Q for rows whose product SKU, name or category contains the query (case-insensitive)"""
+    if _uses_trigram_indexes() or len(query) < GRAM_SIZE:
+        return _icontains_q(query, prefix)
+    index = get_index()
+    skus = []
+    for position in index.matches(query.lower()):
+        skus.append(index.rows[position][0])
+        if len(skus) > MAX_SKU_TERMS:
+            return _icontains_q(query, prefix)
+    return Q(**{f'{prefix}sku__in': skus})
+
+
+def search_products(query: str, limit: int = DEFAULT_LIMIT) -> List[Dict[str, Any]]:
+    """Top `limit` products for a typeahead, best match first"""
+    query = query.strip()
+    if not query:
+        return []
+    if _uses_trigram_indexes():
+        from django.contrib.postgres.search import TrigramSimilarity  # Needs psycopg
+
+        rank = Case(
+            When(sku__iexact=query, then=Value(0)),
+            When(sku__istartswith=query, then=Value(1)),
+            When(name__istartswith=query, then=Value(2)),
+            default=Value(3),
+            output_field=IntegerField(),
+        )
+        similarity = Greatest(TrigramSimilarity('sku', query), TrigramSimilarity('name', query))
+        rows = (Product.objects.filter(_icontains_q(query, prefix=''))
+                .annotate(rank=rank, similarity=similarity)
+                .order_by('rank', '-similarity', 'sku')
+                .values_list('sku', 'name', 'category__name')[:limit])
+    else:
+        rows = get_index().search(query, limit)
+    return [{'sku': sku, 'name': name, 'category': category or ''} for sku, name, category in rows]
@@ -7,13 +7,18 @@ and assigns default roles to new users.
 """
 
 import logging
-from django.db.models.signals import post_save
+from contextlib import contextmanager
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.utils import timezone
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from django.contrib.auth.models import User
 
+from .daily_metrics import record_sale, refresh_days
+from .metrics import NOTIFICATION_FANOUT
+from .response_cache import bump_models
+
 logger = logging.getLogger(__name__)
 
 
@@ -153,6 +158,7 @@ def create_notification_on_ai_report(sender, instance, created, **kwargs):
         except Exception as e:
             logger.error(f"Failed to send real-time notification: {e}")
         
+        NOTIFICATION_FANOUT.labels('ai_report').observe(1)
         logger.info(f"Created notification for user {user.username}: {title}")
         
     except Exception as e:
@@ -213,6 +219,7 @@ def create_notification_on_role_change(sender, instance, created, **kwargs):
             except Exception as e:
                 logger.error(f"Failed to send role change notification: {e}")
             
+            NOTIFICATION_FANOUT.labels('role_changed').observe(1)
             logger.info(f"Created role change notification for user {instance.username}")
         except UserRole.DoesNotExist:
             pass  # User has no role yet
@@ -280,9 +287,70 @@ def create_notification_on_permission_violation(sender, instance, created, **kwa
                     )
                 except Exception as e:
                     logger.error(f"Failed to send permission violation notification: {e}")
+            
+            NOTIFICATION_FANOUT.labels('permission_denied').observe(len(admin_users))
         
         except Role.DoesNotExist:
             pass  # No admin role exists yet
             
     except Exception as e:
         logger.error(f"Error creating notification on permission violation: {e}")
+
+
+# Models behind the cached dashboard APIs (users/response_cache.py); bulk operations bump explicitly
+RESPONSE_CACHE_MODELS = ['users.Company', 'users.Store', 'users.Category', 'users.Product', 'users.Inventory',
+                         'users.Sale', 'users.WarehouseLocation']
+
+
+def invalidate_cached_responses(sender, **kwargs):
+    """Bump the table version of a saved or deleted row so cached responses built from it are not served"""
+    bump_models(sender)
+
+
+for model in RESPONSE_CACHE_MODELS:
+    post_save.connect(invalidate_cached_responses, sender=model, dispatch_uid=f'response_cache_save_{model}')
+    post_delete.connect(invalidate_cached_responses, sender=model, dispatch_uid=f'response_cache_delete_{model}')
+
+
+@receiver(post_save, sender='users.Sale')
+def update_daily_metrics_on_sale(sender, instance, created, **kwargs):
+    """Keep the sale's DashboardMetrics day current: increment for new sales, recompute on edits"""
+    if created:
+        record_sale(instance)
+    else:
+        day = timezone.localdate(instance.sale_date)
+        refresh_days(day, day)
+
+
+@receiver(post_delete, sender='users.Sale')
+def update_daily_metrics_on_sale_delete(sender, instance, **kwargs):
+    day = timezone.localdate(instance.sale_date)
+    refresh_days(day, day)
+
+
+# post_delete receivers per model, for muted_delete_receivers()
+DELETE_RECEIVERS = {
+    'users.Sale': [(invalidate_cached_responses, 'response_cache_delete_users.Sale'),
+                   (update_daily_metrics_on_sale_delete, None)],
+    'users.Inventory': [(invalidate_cached_responses, 'response_cache_delete_users.Inventory')],
+}
+
+
+@contextmanager
+def muted_delete_receivers(*models):
+    """
+    Disconnect this module's post_delete receivers of `models`, so QuerySet.delete() of rows
+    without dependents runs as one DELETE instead of loading every row to send the signal.
+
+    The caller bumps table versions and refreshes daily metrics itself. Disconnecting is
+    process-wide: use it in maintenance code (generators, commands), not in request handlers.
+    """
+    muted = [(receiver, model, uid) for model in models
+             for receiver, uid in DELETE_RECEIVERS.get(model._meta.label, [])]
+    for receiver, model, uid in muted:
+        post_delete.disconnect(receiver, sender=model, dispatch_uid=uid)
+    try:
+        yield
+    finally:
+        for receiver, model, uid in muted:
+            post_delete.connect(receiver, sender=model, dispatch_uid=uid)
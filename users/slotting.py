@@ -0,0 +1,300 @@
+"""
+Warehouse slotting
+
+Moves fast-moving SKUs to the most accessible slots of their warehouse,
+computed in one vectorized pass over every WarehouseLocation:
+
+- pick frequency   sale lines per (store, product) over the period: each
+                   line is one pick in the store's warehouses
+- slot score       walking distance from the depot to the slot's aisle and
+                   shelf, as in pick_path (lower is more accessible)
+- plan             per warehouse, locations from most to fewest picks take
+                   the slots from lowest to highest score
+
+Capacity: every slot (aisle, shelf, box) keeps the number of SKU locations
+it holds today, so a plan never overfills a box; it only changes which SKU
+sits where. Locations keep their ids and quantities (reservations pinned to
+a location stay valid). A pick group (SKUs with the same pick count) is
+owed a set of slot scores, not particular slots: locations already in a
+slot with one of those scores stay put, so ties never reshuffle stock.
+
+A product never gets two locations in one slot (the unique constraint);
+where the sorted assignment would do that, targets are swapped, cheapest
+first. Such swaps can leave the plan out of pick order, so planning passes
+repeat from the planned slots while they lower a warehouse's pick distance.
+The plan is where a pass gains nothing: it never adds walking distance and
+rerunning an applied plan moves nothing.
+
+The plan reports the pick-weighted walking distance before and after; it is
+applied with bulk updates by the `slot_warehouses` management command and
+previewed by the slotting API.
+"""
+
+from collections import Counter
+from datetime import timedelta
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Sale, Warehouse, WarehouseLocation
+from .pick_path import AISLE_SPACING, DEPOT, slot_number
+from .response_cache import bump_models
+
+DEFAULT_PERIOD_DAYS = 90
+MAX_PASSES = 10  # Planning passes per call; a pass that gains nothing ends it early
+LOCATION_COLUMNS = ['id', 'warehouse_id', 'store_id', 'product_id', 'aisle', 'shelf', 'box', 'quantity']
+
+
+def period_days_from_settings() -> int:
+    return getattr(settings, 'SLOTTING', {}).get('PERIOD_DAYS', DEFAULT_PERIOD_DAYS)
+
+
+def _label_numbers(labels: pd.Series) -> np.ndarray:
+    """Position encoded in aisle/shelf/box labels ("A3" -> 3, no digits -> 0), see pick_path.slot_number"""
+    # Few distinct labels: parse each once
+    codes, uniques = pd.factorize(labels)
+    return np.array([slot_number(label) for label in uniques], dtype=np.int64)[codes]
+
+
+def fetch_location_frame(warehouse_ids: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    locations = WarehouseLocation.objects.order_by()
+    if warehouse_ids:
+        locations = locations.filter(warehouse_id__in=list(warehouse_ids))
+    rows = locations.values_list(
+        'id', 'warehouse_id', 'warehouse__store_id', 'product_id', 'aisle', 'shelf', 'box', 'quantity',
+    ).iterator(chunk_size=20000)
+    return pd.DataFrame.from_records(rows, columns=LOCATION_COLUMNS)
+
+
+def fetch_pick_counts(period_days: int, warehouse_ids: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """Sale lines per (store, product) over the last `period_days` days, stores with a warehouse only"""
+    warehouses = Warehouse.objects.all()
+    if warehouse_ids:
+        warehouses = warehouses.filter(warehouse_id__in=list(warehouse_ids))
+    rows = (Sale.objects.filter(sale_date__gte=timezone.now() - timedelta(days=period_days),
+                                store_id__in=warehouses.values('store_id'))
+            .values('store_id', 'product_id').annotate(picks=Count('pk'))
+            .values_list('store_id', 'product_id', 'picks').order_by()
+            .iterator(chunk_size=20000))
+    return pd.DataFrame.from_records(rows, columns=['store_id', 'product_id', 'picks'])
+
+
+def slot_scores(frame: pd.DataFrame) -> np.ndarray:
+    """Walking distance from the depot to each row's slot (box position does not add distance)"""
+    aisle, shelf = _label_numbers(frame['aisle']), _label_numbers(frame['shelf'])
+    return np.abs(aisle - DEPOT[0]) * AISLE_SPACING + shelf
+
+
+def _repair_duplicates(new_slot: np.ndarray, warehouse: np.ndarray, product: np.ndarray, key: np.ndarray,
+                       picks: np.ndarray, score: np.ndarray) -> None:
+    """
+    Swap targets so no product gets two locations in one slot (the unique constraint).
+
+    Partners are tried from the cheapest swap up: one from the same pick
+    group or holding a target of the same score leaves the plan's pick
+    distance unchanged. Rare, so a plain loop.
+    """
+    duplicated = pd.DataFrame({'w': warehouse, 'p': product, 'k': key[new_slot]}).duplicated().to_numpy()
+    if not duplicated.any():
+        return
+    held = Counter(zip(warehouse, product, key[new_slot]))
+    for row in np.flatnonzero(duplicated):
+        w, p = warehouse[row], product[row]
+        if held[(w, p, key[new_slot[row]])] < 2:
+            continue
+        same_warehouse = np.flatnonzero(warehouse == w)
+        added = (picks[row] - picks[same_warehouse]) * (score[new_slot[same_warehouse]] - score[new_slot[row]])
+        for other in same_warehouse[np.lexsort((same_warehouse, added))]:
+            q = product[other]
+            if q != p and not held[(w, p, key[new_slot[other]])] and not held[(w, q, key[new_slot[row]])]:
+                held[(w, p, key[new_slot[row]])] -= 1
+                held[(w, q, key[new_slot[other]])] -= 1
+                new_slot[row], new_slot[other] = new_slot[other], new_slot[row]
+                held[(w, p, key[new_slot[row]])] += 1
+                held[(w, q, key[new_slot[other]])] += 1
+                break
+
+
+def _plan_pass(ids: np.ndarray, picks: np.ndarray, warehouse: np.ndarray, group: np.ndarray,
+               product: np.ndarray, score: np.ndarray, box: np.ndarray, key: np.ndarray) -> np.ndarray:
+    """
+    One sorted assignment over the slots the locations hold now: location i
+    takes the slot of location new_slot[i]
+    """
+    rows = np.arange(len(ids))
+
+    # Per warehouse, the k-th fastest location gets a slot with the k-th lowest score
+    slot_order = np.lexsort((ids, box, score, warehouse))
+    item_order = np.lexsort((ids, score, -picks, warehouse))
+    item_rank = np.empty(len(ids), dtype=np.int64)
+    item_rank[item_order] = rows
+    demands = pd.DataFrame({'warehouse': warehouse[item_order], 'group': group[item_order],
+                            'score': score[slot_order], 'rank': rows})
+
+    # Only the scores a pick group gets are fixed, not which slots: locations already in a slot with one of
+    # their group's target scores stay, so ties never reshuffle stock
+    current = pd.DataFrame({'warehouse': warehouse, 'group': group, 'score': score, 'row': rows,
+                            'rank': item_rank}).sort_values('rank')
+    current['occurrence'] = current.groupby(['group', 'score']).cumcount()
+    demands['occurrence'] = demands.groupby(['group', 'score']).cumcount()
+    kept = current.merge(demands[['group', 'score', 'occurrence', 'rank']], on=['group', 'score', 'occurrence'],
+                         suffixes=('', '_demand'))
+    moving = current[~current['row'].isin(kept['row'])]
+    open_demands = demands[~demands['rank'].isin(kept['rank_demand'])]
+
+    # Slots left by moving locations fill the open demands of the same warehouse and score
+    freed = pd.DataFrame({'warehouse': moving['warehouse'].to_numpy(), 'score': moving['score'].to_numpy(),
+                          'box': box[moving['row'].to_numpy()], 'slot': moving['row'].to_numpy()})
+    freed = freed.sort_values(['warehouse', 'score', 'box', 'slot'])
+    open_demands = open_demands.sort_values(['warehouse', 'score', 'group', 'rank']).assign(
+        slot=freed['slot'].to_numpy())
+    open_demands = open_demands.sort_values(['group', 'rank'])
+    moving = moving.sort_values(['group', 'rank'])
+
+    new_slot = rows.copy()
+    new_slot[moving['row'].to_numpy()] = open_demands['slot'].to_numpy()
+    _repair_duplicates(new_slot, warehouse, product, key, picks, score)
+    return new_slot
+
+
+def compute_slotting(frame: pd.DataFrame, picks: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add the target slot of every location to a location frame (see fetch_location_frame).
+
+    Pure and vectorized over all warehouses. Planning passes run from the
+    slots of the previous pass while they lower a warehouse's pick distance;
+    a pass that does not (or that breaks the unique constraint) is dropped
+    for that warehouse. The result is where the next pass changes nothing,
+    so rerunning an applied plan moves nothing and a plan never adds
+    walking distance.
+    """
+    plan = frame.merge(picks, on=['store_id', 'product_id'], how='left')
+    plan = plan.sort_values('id', ignore_index=True)  # Same passes whatever order the rows were fetched in
+    plan['picks'] = plan['picks'].fillna(0).astype(np.int64)
+    if plan.empty:
+        for column in ('score', 'new_score'):
+            plan[column] = pd.Series(dtype=np.float64)
+        for column in ('to_aisle', 'to_shelf', 'to_box'):
+            plan[column] = pd.Series(dtype=object)
+        plan['moved'] = pd.Series(dtype=bool)
+        return plan
+
+    ids = plan['id'].to_numpy()
+    pick_counts = plan['picks'].to_numpy()
+    score = slot_scores(plan).astype(np.float64)
+    box = _label_numbers(plan['box'])
+    warehouse = pd.factorize(plan['warehouse_id'], sort=True)[0]
+    product = pd.factorize(plan['product_id'])[0]
+    key = plan.groupby(['warehouse_id', 'aisle', 'shelf', 'box'], sort=False).ngroup().to_numpy()
+    group = plan.groupby(['warehouse_id', 'picks']).ngroup().to_numpy()
+
+    slot = np.arange(len(plan))  # Location i ends in the slot location slot[i] holds today
+    distance = np.bincount(warehouse, pick_counts * score)
+    for _ in range(MAX_PASSES):
+        proposal = slot[_plan_pass(ids, pick_counts, warehouse, group, product, score[slot], box[slot], key[slot])]
+        proposed = np.bincount(warehouse, pick_counts * score[proposal], minlength=len(distance))
+        clashes = pd.DataFrame({'w': warehouse, 'p': product, 'k': key[proposal]}).duplicated().to_numpy()
+        better = (proposed < distance - 1e-9) & (np.bincount(warehouse[clashes], minlength=len(distance)) == 0)
+        if not better.any():
+            break
+        taken = better[warehouse]
+        slot[taken] = proposal[taken]
+        distance[better] = proposed[better]
+
+    plan['score'] = score
+    plan['new_score'] = score[slot]
+    for column in ('aisle', 'shelf', 'box'):
+        plan[f'to_{column}'] = plan[column].to_numpy()[slot]
+    plan['moved'] = key[slot] != key
+    return plan
+
+
+def build_slotting_plan(warehouse_ids: Optional[Iterable[str]] = None,
+                        period_days: Optional[int] = None) -> pd.DataFrame:
+    """Fetch and compute in one call"""
+    warehouse_ids = list(warehouse_ids) if warehouse_ids else None
+    period_days = period_days or period_days_from_settings()
+    return compute_slotting(fetch_location_frame(warehouse_ids), fetch_pick_counts(period_days, warehouse_ids))
+
+
+def summarize_slotting(plan: pd.DataFrame, period_days: int) -> Dict[str, Any]:
+    """Headline numbers for the command and the API"""
+    before = float((plan['picks'] * plan['score']).sum()) if not plan.empty else 0.0
+    after = float((plan['picks'] * plan['new_score']).sum()) if not plan.empty else 0.0
+    return {
+        'period_days': period_days,
+        'warehouses': int(plan['warehouse_id'].nunique()) if not plan.empty else 0,
+        'locations': int(len(plan)),
+        'moves': int(plan['moved'].sum()) if not plan.empty else 0,
+        'pick_distance_before': round(before, 2),
+        'pick_distance_after': round(after, 2),
+        'improvement_pct': round(100 * (before - after) / before, 1) if before else 0.0,
+    }
+
+
+def move_rows(plan: pd.DataFrame, limit: int = 100) -> list:
+    """JSON-friendly moves, most picked first"""
+    moves = plan[plan['moved']].sort_values(['picks', 'id'], ascending=[False, True]).head(limit)
+    return [
+        {
+            'location_id': int(row.id),
+            'warehouse': row.warehouse_id,
+            'sku': row.product_id,
+            'picks': int(row.picks),
+            'from': {'aisle': row.aisle, 'shelf': row.shelf, 'box': row.box},
+            'to': {'aisle': row.to_aisle, 'shelf': row.to_shelf, 'box': row.to_box},
+        }
+        for row in moves.itertuples(index=False)
+    ]
+
+
+def apply_slotting(plan: pd.DataFrame, batch_size: int = 1000) -> int:
+    """
+    Write the moves of a plan with bulk updates; returns the number of moved locations.
+
+    Every location of a moved product is re-read under a row lock. When any
+    of them changed slot, was deleted or was added since the plan was
+    computed, none of that product's moves are written: the others could
+    land on it (the unique constraint).
+    """
+    moves = plan[plan['moved']]
+    if moves.empty:
+        return 0
+    pairs = set(zip(moves['warehouse_id'], moves['product_id']))
+    involved = plan[[pair in pairs for pair in zip(plan['warehouse_id'], plan['product_id'])]]
+    planned = {pair: {} for pair in pairs}
+    for row in involved.itertuples(index=False):
+        planned[(row.warehouse_id, row.product_id)][row.id] = (row.aisle, row.shelf, row.box)
+    # Another location of the same product may still hold a target slot until the update reaches it
+    shared = {location_id for locations in planned.values() if len(locations) > 1 for location_id in locations}
+    now = timezone.now()
+    with transaction.atomic():
+        found = {pair: {} for pair in pairs}
+        products = sorted({product_id for _, product_id in pairs})
+        warehouses = sorted({warehouse_id for warehouse_id, _ in pairs})
+        for start in range(0, len(products), batch_size):
+            locked = (WarehouseLocation.objects.select_for_update()
+                      .filter(warehouse_id__in=warehouses, product_id__in=products[start:start + batch_size])
+                      .order_by('id').values_list('id', 'warehouse_id', 'product_id', 'aisle', 'shelf', 'box'))
+            for location_id, warehouse_id, product_id, *slot in locked:
+                if (warehouse_id, product_id) in found:
+                    found[(warehouse_id, product_id)][location_id] = tuple(slot)
+        unchanged = {pair for pair in pairs if found[pair] == planned[pair]}
+        moves = moves[[pair in unchanged for pair in zip(moves['warehouse_id'], moves['product_id'])]]
+        parked = [WarehouseLocation(id=location_id, box=f'~{location_id}')
+                  for location_id in moves['id'].tolist() if location_id in shared]
+        located = [
+            WarehouseLocation(id=location_id, aisle=aisle, shelf=shelf, box=box, last_updated=now)
+            for location_id, aisle, shelf, box in moves[['id', 'to_aisle', 'to_shelf', 'to_box']].itertuples(
+                index=False)
+        ]
+        WarehouseLocation.objects.bulk_update(parked, ['box'], batch_size=batch_size)
+        WarehouseLocation.objects.bulk_update(located, ['aisle', 'shelf', 'box', 'last_updated'],
+                                              batch_size=batch_size)
+        bump_models(WarehouseLocation)  # Bulk updates send no post_save
+    return len(located)
@@ -0,0 +1,293 @@
+"""
+Stock movement ledger
+
+StockMovement is append-only and is the source of truth for stock:
+
+- record_movement / record_transfer / record_movements  append to the ledger
+- apply_pending_movements  materializes pending movements into Inventory
+                           and WarehouseLocation in batches (one grouped
+                           query, one bulk_update with F() per table)
+- apply_movements          the same for given movements; each movement is
+                           claimed (locked, flipped to applied) before it
+                           is counted, so it is applied exactly once
+- take_snapshot            stores the quantity of every pair at a point in time
+- quantities_as_of         rebuilds any past date from the latest snapshot
+                           plus the movements after it
+- movement_kpis            inflow, outflow, rotation and aging per pair from
+                           grouped queries over the ledger
+
+Snapshots include every movement with occurred_at <= taken_at. A movement
+back-dated before an existing snapshot makes that snapshot stale; take a
+new one after back-filling history.
+"""
+
+import uuid
+from datetime import timedelta
+from typing import Iterable, List, Optional, Tuple
+
+import pandas as pd
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Exists, F, Max, OuterRef, Q, Sum
+from django.utils import timezone
+
+from .models import Inventory, StockMovement, StockSnapshot, WarehouseLocation
+from .response_cache import bump_models
+
+OPENING_BALANCE = 'opening-balance'
+PAIR_COLUMNS = ['product_id', 'store_id']
+
+
+def record_movement(product_id: str, store_id: str, movement_type: str, quantity: int, *,
+                    location_id: Optional[int] = None, reference: str = '', occurred_at=None,
+                    user=None) -> StockMovement:
+    """Append a single movement (signed quantity: positive in, negative out)"""
+    return StockMovement.objects.create(
+        product_id=product_id,
+        store_id=store_id,
+        location_id=location_id,
+        movement_type=movement_type,
+        quantity=quantity,
+        reference=reference,
+        occurred_at=occurred_at or timezone.now(),
+        created_by=user,
+    )
+
+
+def record_transfer(product_id: str, from_store: str, to_store: str, quantity: int, *,
+                    from_location: Optional[int] = None, to_location: Optional[int] = None,
+                    reference: str = '', occurred_at=None, user=None) -> Tuple[StockMovement, StockMovement]:
+    """Append the two legs of a transfer atomically"""
+    occurred_at = occurred_at or timezone.now()
+    reference = reference or f"transfer-{uuid.uuid4().hex[:12]}"
+    with transaction.atomic():
+        out_leg = record_movement(product_id, from_store, 'transfer', -quantity, location_id=from_location,
+                                  reference=reference, occurred_at=occurred_at, user=user)
+        in_leg = record_movement(product_id, to_store, 'transfer', quantity, location_id=to_location,
+                                 reference=reference, occurred_at=occurred_at, user=user)
+    return out_leg, in_leg
+
+
+def record_movements(movements: Iterable[StockMovement], batch_size: int = 5000) -> List[StockMovement]:
+    """Append many movements with bulk_create"""
+    return StockMovement.objects.bulk_create(list(movements), batch_size=batch_size)
+
+
+# ============================================
+# Materialization
+# ============================================
+
+class ConcurrentApply(Exception):
+    """Another worker applied some of the claimed movements; the batch is rolled back"""
+
+
+def apply_movements(ids: Iterable[int]) -> int:
+    """
+    Fold the given movements into Inventory and WarehouseLocation, skipping
+    those already applied. Runs in the caller's transaction (or its own).
+
+    Returns:
+        Number of movements applied
+    """
+    with transaction.atomic():
+        claimable = StockMovement.objects.filter(id__in=list(ids), applied=False)
+        if connection.features.has_select_for_update:
+            claimable = claimable.select_for_update()  # Waits for other workers, then re-checks applied
+        claimed = list(claimable.values_list('id', flat=True))
+        if not claimed:
+            return 0
+        flipped = StockMovement.objects.filter(id__in=claimed, applied=False).update(applied=True)
+        if flipped != len(claimed):
+            raise ConcurrentApply(f'{len(claimed) - flipped} movements were applied concurrently')
+        _fold(StockMovement.objects.filter(id__in=claimed))
+    return flipped
+
+
+def _fold(batch) -> None:
+    """Add the quantities of a batch of claimed movements to Inventory and WarehouseLocation"""
+    now = timezone.now()
+
+    deltas = {
+        (product_id, store_id): delta
+        for product_id, store_id, delta in
+        batch.values(*PAIR_COLUMNS).annotate(delta=Sum('quantity')).values_list(*PAIR_COLUMNS, 'delta')
+    }
+    # New pairs are inserted in a savepoint: when a concurrent worker created
+    # some of them first, the next pass adds to those rows instead
+    pending, conflict = deltas, None
+    while pending:
+        existing = {
+            (product_id, store_id): pk
+            for pk, product_id, store_id in Inventory.objects.filter(
+                product_id__in={p for p, _ in pending}, store_id__in={s for _, s in pending},
+            ).values_list('id', *PAIR_COLUMNS)
+            if (product_id, store_id) in pending
+        }
+        if conflict is not None and not existing:
+            raise conflict  # Not a duplicate pair
+        Inventory.objects.bulk_update(
+            [Inventory(id=pk, quantity=F('quantity') + pending[pair], last_restocked=now)
+             for pair, pk in existing.items() if pending[pair]],
+            ['quantity', 'last_restocked'],
+            batch_size=1000,
+        )
+        pending = {pair: delta for pair, delta in pending.items() if pair not in existing}
+        try:
+            with transaction.atomic():
+                Inventory.objects.bulk_create(
+                    [Inventory(product_id=p, store_id=s, quantity=delta) for (p, s), delta in pending.items()],
+                    batch_size=1000,
+                )
+            break
+        except IntegrityError as e:
+            conflict = e
+
+    location_deltas = batch.filter(location__isnull=False).values('location_id').annotate(delta=Sum('quantity'))
+    WarehouseLocation.objects.bulk_update(
+        [WarehouseLocation(id=row['location_id'], quantity=F('quantity') + row['delta'], last_updated=now)
+         for row in location_deltas if row['delta']],
+        ['quantity', 'last_updated'],
+        batch_size=1000,
+    )
+    bump_models(Inventory)
+
+
+def apply_pending_movements(batch_size: int = 5000, max_batches: Optional[int] = None) -> int:
+    """
+    Materialize pending movements, oldest first.
+
+    Each batch runs in its own transaction. On databases with SKIP LOCKED
+    several workers can apply in parallel without waiting on each other.
+
+    Returns:
+        Number of movements applied
+    """
+    applied = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        try:
+            with transaction.atomic():
+                pending = StockMovement.objects.filter(applied=False).order_by('id')
+                if connection.features.has_select_for_update_skip_locked:
+                    pending = pending.select_for_update(skip_locked=True)
+                ids = list(pending.values_list('id', flat=True)[:batch_size])
+                if not ids:
+                    break
+                applied += apply_movements(ids)
+        except ConcurrentApply:
+            pass  # Rolled back; the next batch re-reads what is still pending
+        batches += 1
+    return applied
+
+
+def seed_from_inventory(batch_size: int = 5000) -> int:
+    """
+    Opening-balance movements for Inventory rows that have no ledger history yet.
+
+    They are created already applied: Inventory holds those quantities.
+    """
+    now = timezone.now()
+    has_history = StockMovement.objects.filter(product_id=OuterRef('product_id'), store_id=OuterRef('store_id'))
+    untracked = Inventory.objects.exclude(quantity=0).exclude(Exists(has_history)).values_list(
+        *PAIR_COLUMNS, 'quantity'
+    )
+
+    created = 0
+    chunk = []
+    for product_id, store_id, quantity in untracked.iterator(chunk_size=batch_size):
+        chunk.append(StockMovement(product_id=product_id, store_id=store_id, movement_type='adjustment',
+                                   quantity=quantity, reference=OPENING_BALANCE, occurred_at=now, applied=True))
+        if len(chunk) >= batch_size:
+            created += len(record_movements(chunk, batch_size))
+            chunk = []
+    if chunk:
+        created += len(record_movements(chunk, batch_size))
+    return created
+
+
+# ============================================
+# Snapshots and point-in-time quantities
+# ============================================
+
+def _movement_totals(movements) -> pd.DataFrame:
+    rows = movements.values(*PAIR_COLUMNS).annotate(quantity=Sum('quantity')).values_list(*PAIR_COLUMNS, 'quantity')
+    return pd.DataFrame.from_records(list(rows.iterator(chunk_size=20000)), columns=[*PAIR_COLUMNS, 'quantity'])
+
+
+def quantities_as_of(as_of=None, filters: Optional[Q] = None) -> pd.DataFrame:
+    """
+    Quantity per (product, store) at `as_of` (now by default).
+
+    Reads the latest snapshot taken at or before `as_of` and adds the
+    movements after it, so the cost is O(pairs + movements since snapshot).
+    `filters` apply to product/store fields (e.g. Q(store__country='Germany')).
+    """
+    as_of = as_of or timezone.now()
+    filters = filters or Q()
+    snapshot_at = StockSnapshot.objects.filter(taken_at__lte=as_of).aggregate(latest=Max('taken_at'))['latest']
+
+    movements = StockMovement.objects.filter(filters, occurred_at__lte=as_of)
+    frames = []
+    if snapshot_at is not None:
+        movements = movements.filter(occurred_at__gt=snapshot_at)
+        rows = StockSnapshot.objects.filter(filters, taken_at=snapshot_at).values_list(*PAIR_COLUMNS, 'quantity')
+        frames.append(pd.DataFrame.from_records(list(rows.iterator(chunk_size=20000)),
+                                                columns=[*PAIR_COLUMNS, 'quantity']))
+    frames.append(_movement_totals(movements))
+
+    combined = pd.concat(frames, ignore_index=True)
+    if combined.empty:
+        return combined
+    return combined.groupby(PAIR_COLUMNS, as_index=False, sort=False)['quantity'].sum()
+
+
+def take_snapshot(taken_at=None, batch_size: int = 5000) -> int:
+    """Store the quantity of every pair with stock at `taken_at` (now by default)"""
+    taken_at = taken_at or timezone.now()
+    quantities = quantities_as_of(taken_at)
+    if quantities.empty:
+        return 0
+    quantities = quantities[quantities['quantity'] != 0]
+    StockSnapshot.objects.bulk_create(
+        [StockSnapshot(product_id=p, store_id=s, quantity=int(q), taken_at=taken_at)
+         for p, s, q in quantities.itertuples(index=False)],
+        batch_size=batch_size,
+    )
+    return len(quantities)
+
+
+# ============================================
+# KPIs from the ledger
+# ============================================
+
+def movement_kpis(period_days: int = 90, filters: Optional[Q] = None, now=None) -> pd.DataFrame:
+    """
+    Flow, rotation and aging per (product, store) over the last `period_days`.
+
+    Columns: units_in, units_sold, opening, closing, average_stock,
+    rotation (units sold / average stock), last_receipt, days_since_receipt
+    """
+    now = now or timezone.now()
+    since = now - timedelta(days=period_days)
+    filters = filters or Q()
+
+    flows = StockMovement.objects.filter(filters, occurred_at__gt=since, occurred_at__lte=now).values(
+        *PAIR_COLUMNS
+    ).annotate(
+        units_in=Sum('quantity', filter=Q(quantity__gt=0)),
+        units_sold=Sum('quantity', filter=Q(movement_type='sale')),
+        last_receipt=Max('occurred_at', filter=Q(movement_type='receipt')),
+    ).values_list(*PAIR_COLUMNS, 'units_in', 'units_sold', 'last_receipt')
+    frame = pd.DataFrame.from_records(list(flows), columns=[*PAIR_COLUMNS, 'units_in', 'units_sold', 'last_receipt'])
+
+    opening = quantities_as_of(since, filters).rename(columns={'quantity': 'opening'})
+    closing = quantities_as_of(now, filters).rename(columns={'quantity': 'closing'})
+    frame = closing.merge(opening, on=PAIR_COLUMNS, how='outer').merge(frame, on=PAIR_COLUMNS, how='outer')
+
+    for column in ('opening', 'closing', 'units_in', 'units_sold'):
+        frame[column] = pd.to_numeric(frame[column], errors='coerce').fillna(0)
+    frame['units_sold'] = -frame['units_sold']
+    frame['average_stock'] = (frame['opening'] + frame['closing']) / 2
+    frame['rotation'] = (frame['units_sold'] / frame['average_stock'].where(frame['average_stock'] > 0)).fillna(0)
+    last_receipt = pd.to_datetime(frame['last_receipt'], utc=True)
+    frame['days_since_receipt'] = (pd.Timestamp(now) - last_receipt).dt.total_seconds() / 86400
+    return frame
@@ -0,0 +1,317 @@
+"""
+Synthetic supply-chain data for load testing
+
+Generates a company tree, stores, warehouses, products, inventory,
+warehouse locations and sales history at any scale:
+
+- everything is drawn from one numpy Generator, so the same seed and
+  parameters always produce the same data
+- product popularity follows a Zipf-like curve and store size a lognormal,
+  so a few SKUs and stores dominate sales like in real data
+- daily sales volume has a trend, weekly and yearly seasonality and
+  Poisson noise; sales happen during opening hours
+- sales are generated in column form per block of days and written with
+  the import pipeline (COPY on PostgreSQL, bulk_create elsewhere), which
+  keeps 10M+ sales within minutes
+
+Existing data is never wiped. Generated rows use their own id prefix;
+clear_generated() removes only those.
+"""
+
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from django.utils import timezone
+
+from .daily_metrics import refresh_days, sale_day_range
+from .importer import MONTH_ABBR, month_start, write_rows
+from .models import (
+    Category, Company, Inventory, Product, Sale, StockMovement, StockReservation, StockSnapshot, Store,
+    Warehouse, WarehouseLocation
+)
+from .response_cache import bump_models
+from .signals import muted_delete_receivers
+
+LOCATIONS = [
+    ('United States', 'New York'), ('United Kingdom', 'London'), ('Canada', 'Toronto'), ('Germany', 'Berlin'),
+    ('France', 'Paris'), ('Sweden', 'Stockholm'), ('Australia', 'Sydney'), ('Spain', 'Madrid'),
+    ('Norway', 'Oslo'), ('Singapore', 'Singapore'), ('Japan', 'Tokyo'), ('Brazil', 'São Paulo'),
+]
+CATEGORIES = [
+    'Electronics', 'Software', 'Hardware', 'Services', 'Consulting', 'Support', 'Cloud Services', 'Security',
+    'Cables', 'Accessories', 'Audio', 'Storage',
+]
+PRODUCT_NOUNS = [
+    'Cable', 'Adapter', 'Hub', 'Charger', 'Mouse', 'Keyboard', 'Stand', 'Lamp', 'Webcam', 'Speaker', 'Dock',
+    'SSD', 'Monitor Arm', 'Power Bank', 'Headset', 'Switch', 'Router', 'Microphone', 'Card Reader', 'Case',
+]
+PRODUCT_ADJECTIVES = ['Pro', 'Mini', 'Ultra', 'Basic', 'Wireless', 'Compact', 'Premium', 'Travel', 'Smart', 'Max']
+STORE_NAMES = ['HQ', 'West', 'East', 'Mid', 'South', 'North', 'Harbor', 'Airport', 'Mall', 'Outlet']
+# Share of a day's sales per hour (UTC), opening hours 8-21
+HOURLY_WEIGHTS = np.array([0] * 8 + [3, 5, 7, 8, 10, 11, 9, 8, 8, 9, 10, 7, 5] + [0] * 3, dtype=np.float64)
+SALES_BLOCK = 500000  # Target rows generated and written per transaction
+
+
+@dataclass(frozen=True)
+class GeneratorConfig:
+    scale: float = 1.0
+    seed: int = 42
+    days: int = 365
+    end_date: Optional[date] = None
+    company_depth: int = 2
+    branching: int = 3
+    stores_per_company: int = 5
+    sales_per_day: Optional[int] = None
+    assortment: float = 0.3
+    prefix: str = 'GEN'
+
+    @property
+    def companies(self) -> int:
+        return max(1, round(10 * self.scale))
+
+    @property
+    def products(self) -> int:
+        return max(10, round(1000 * self.scale))
+
+    @property
+    def daily_sales(self) -> int:
+        return self.sales_per_day if self.sales_per_day is not None else max(1, round(2000 * self.scale))
+
+    @property
+    def last_day(self) -> date:
+        # Yesterday by default so no sale lies in the future
+        return self.end_date or timezone.now().date() - timedelta(days=1)
+
+
+def _zipf_weights(n: int, exponent: float = 1.1) -> np.ndarray:
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+# ============================================
+# Dimensions
+# ============================================
+
+def _companies(config: GeneratorConfig, rng: np.random.Generator):
+    """Heap-shaped trees: company i's parent is (i - 1) // branching within its tree"""
+    tree_size = sum(config.branching ** level for level in range(config.company_depth + 1))
+    status = rng.choice(['active', 'pending', 'inactive'], size=config.companies, p=[0.8, 0.12, 0.08])
+    ownership = rng.integers(50, 101, size=config.companies)
+    place = rng.integers(0, len(LOCATIONS), size=config.companies)
+    ids = [f"{config.prefix}-C{i + 1:04d}" for i in range(config.companies)]
+    companies = []
+    for i, company_id in enumerate(ids):
+        position = i % tree_size
+        root = i - position
+        country, city = LOCATIONS[place[root]]
+        companies.append(Company(
+            company_id=company_id,
+            name=f"{'Holding' if position == 0 else 'Branch'} {company_id}",
+            parent_id=None if position == 0 else ids[root + (position - 1) // config.branching],
+            country=country, city=city, status=status[i], ownership_percentage=int(ownership[i]) if position else 100,
+        ))
+    return companies
+
+
+def _stores(config: GeneratorConfig, companies):
+    stores = []
+    for company in companies:
+        for n in range(config.stores_per_company):
+            label = STORE_NAMES[n % len(STORE_NAMES)] + (str(n // len(STORE_NAMES)) if n >= len(STORE_NAMES) else '')
+            stores.append(Store(
+                store_id=f"{company.company_id}-{label}"[:20], company_id=company.company_id,
+                name=f"{company.name} - {label}", city=company.city, country=company.country,
+                address=f"{100 + n} {label} Street", is_active=company.status == 'active',
+            ))
+    return stores
+
+
+def _products(config: GeneratorConfig, rng: np.random.Generator, category_ids: np.ndarray) -> pd.DataFrame:
+    n = config.products
+    now = pd.Timestamp(timezone.now())
+    nouns = rng.integers(0, len(PRODUCT_NOUNS), size=n)
+    adjectives = rng.integers(0, len(PRODUCT_ADJECTIVES), size=n)
+    # Lognormal prices around 25, ending in .99
+    prices = np.maximum(np.floor(rng.lognormal(np.log(25), 0.8, size=n)), 1) - 0.01
+    return pd.DataFrame({
+        'sku': [f"{config.prefix}-P{i + 1:06d}" for i in range(n)],
+        'name': [f"{PRODUCT_ADJECTIVES[a]} {PRODUCT_NOUNS[b]} {i + 1}" for i, (a, b) in enumerate(zip(adjectives, nouns))],
+        'price': prices.round(2),
+        'description': '',
+        'status': 'in-stock',
+        'category_id': pd.array(category_ids[rng.integers(0, len(category_ids), size=n)], dtype='Int64'),
+        'created_at': now,
+        'updated_at': now,
+    })
+
+
+def _assortment(config: GeneratorConfig, rng: np.random.Generator, n_stores: int, n_products: int,
+                popularity: np.ndarray):
+    """(store index, product index) pairs each store carries; popular products are carried more often"""
+    per_store = max(1, min(n_products, round(n_products * config.assortment)))
+    stores, products = [], []
+    for store in range(n_stores):
+        carried = rng.choice(n_products, size=per_store, replace=False, p=popularity)
+        stores.append(np.full(per_store, store))
+        products.append(np.sort(carried))
+    return np.concatenate(stores), np.concatenate(products)
+
+
+# ============================================
+# Sales
+# ============================================
+
+def _daily_volume(config: GeneratorConfig, days: pd.DatetimeIndex) -> np.ndarray:
+    """Expected sales per day: 20% yearly growth, weekend peak, December peak"""
+    position = np.arange(len(days)) / 365.0
+    trend = 1 + 0.2 * (position - position[-1] / 2)
+    weekly = np.array([0.9, 0.9, 0.95, 1.0, 1.1, 1.25, 0.9])[days.dayofweek]
+    yearly = 1 + 0.15 * np.cos(2 * np.pi * (days.dayofyear - 350) / 365.25)
+    return config.daily_sales * trend * weekly * yearly
+
+
+def _sales_block(rng: np.random.Generator, day_starts: np.ndarray, counts: np.ndarray, pair_cdf: np.ndarray,
+                 pair_store: np.ndarray, pair_product: np.ndarray, store_ids: np.ndarray, skus: np.ndarray,
+                 prices: np.ndarray) -> pd.DataFrame:
+    total = int(counts.sum())
+    pairs = np.minimum(np.searchsorted(pair_cdf, rng.random(total)), len(pair_cdf) - 1)
+    product = pair_product[pairs]
+    quantity = rng.geometric(0.55, size=total)
+    discount = np.where(rng.random(total) < 0.1, rng.uniform(0.7, 0.95, size=total), 1.0)
+
+    hours = rng.choice(24, size=total, p=HOURLY_WEIGHTS / HOURLY_WEIGHTS.sum())
+    seconds = hours * 3600 + rng.integers(0, 3600, size=total)
+    sale_date = pd.Series(pd.to_datetime(np.repeat(day_starts, counts) + seconds * 1_000_000_000, utc=True))
+    return pd.DataFrame({
+        'product_id': skus[product],
+        'store_id': store_ids[pair_store[pairs]],
+        'quantity': quantity,
+        'total_amount': (prices[product] * quantity * discount).round(2),
+        'sale_date': sale_date,
+        'month': MONTH_ABBR[sale_date.dt.month.to_numpy()],
+        'year': sale_date.dt.year,
+        'period': month_start(sale_date),
+    })
+
+
+# ============================================
+# Entry points
+# ============================================
+
+def generate(config: GeneratorConfig, log: Callable[[str], None] = lambda message: None,
+             with_sales: bool = True) -> Dict[str, int]:
+    """
+    Generate the whole dataset and return row counts per table.
+
+    Dimension rows are upserted, so re-running with the same parameters
+    only regenerates sales (skipped when the generated stores already have
+    sales; call clear_generated() first to rebuild them).
+    """
+    rng = np.random.default_rng(config.seed)
+    started = time.perf_counter()
+    counts: Dict[str, int] = {}
+
+    with transaction.atomic():
+        companies = _companies(config, rng)
+        Company.objects.bulk_create(companies, ignore_conflicts=True, batch_size=1000)
+        stores = _stores(config, companies)
+        Store.objects.bulk_create(stores, ignore_conflicts=True, batch_size=1000)
+        Warehouse.objects.bulk_create([
+            Warehouse(warehouse_id=f"{store.store_id}-WH"[:20], store_id=store.store_id,
+                      name=f"Warehouse {store.name}") for store in stores
+        ], ignore_conflicts=True, batch_size=1000)
+        Category.objects.bulk_create([Category(name=name, description=f"{name} products and solutions")
+                                      for name in CATEGORIES], ignore_conflicts=True)
+        category_ids = np.array(sorted(Category.objects.filter(name__in=CATEGORIES).values_list('id', flat=True)))
+    bump_models(Company, Store, Category)
+    counts.update(companies=len(companies), stores=len(stores), warehouses=len(stores))
+
+    products = _products(config, rng, category_ids)
+    counts['products'] = write_rows('product', products)
+    log(f"{counts['companies']:,} companies, {counts['stores']:,} stores, {counts['products']:,} products")
+
+    store_ids = np.array([store.store_id for store in stores])
+    skus = products['sku'].to_numpy()
+    prices = products['price'].to_numpy()
+    popularity = _zipf_weights(len(skus))[rng.permutation(len(skus))]
+    store_weight = rng.lognormal(0, 0.5, size=len(stores))
+    pair_store, pair_product = _assortment(config, rng, len(stores), len(skus), popularity)
+    pair_weight = store_weight[pair_store] * popularity[pair_product]
+    pair_weight /= pair_weight.sum()
+
+    # Stock covers 0-45 days of expected demand, ~8% of positions are out of stock
+    daily_units = config.daily_sales * pair_weight / 0.55
+    quantity = np.round(daily_units * rng.uniform(0, 45, size=len(pair_weight))).astype(np.int64)
+    quantity[rng.random(len(quantity)) < 0.08] = 0
+    now = pd.Timestamp(timezone.now())
+    counts['inventory'] = write_rows('inventory', pd.DataFrame({
+        'product_id': skus[pair_product], 'store_id': store_ids[pair_store],
+        'quantity': quantity, 'last_restocked': now,
+    }))
+    stocked = quantity > 0
+    product_index = pair_product[stocked]
+    category_position = np.searchsorted(category_ids, products['category_id'].to_numpy(dtype=np.int64))
+    counts['locations'] = write_rows('location', pd.DataFrame({
+        'warehouse_id': np.char.add(store_ids[pair_store[stocked]].astype(str), '-WH'),
+        'product_id': skus[product_index],
+        'aisle': np.char.add('A', (category_position[product_index] + 1).astype(str)),
+        'shelf': np.char.add('S', (product_index // 20 % 10 + 1).astype(str)),
+        'box': np.char.add('B', (product_index % 20 + 1).astype(str)),
+        'quantity': quantity[stocked],
+        'last_updated': now,
+    }))
+    log(f"{counts['inventory']:,} inventory rows, {counts['locations']:,} warehouse locations")
+
+    counts['sales'] = 0
+    if not with_sales:
+        return counts
+    if Sale.objects.filter(store_id__in=store_ids.tolist()).exists():
+        log('Generated stores already have sales; skipping sales (use --clear to rebuild)')
+        return counts
+
+    days = pd.date_range(end=pd.Timestamp(config.last_day), periods=config.days, freq='D')
+    per_day = rng.poisson(_daily_volume(config, days))
+    day_starts = days.tz_localize('UTC').as_unit('ns').asi8
+    pair_cdf = np.cumsum(pair_weight)
+    start = 0
+    while start < len(days):
+        # Blocks of whole days of roughly SALES_BLOCK rows
+        stop = start + max(1, int(np.searchsorted(np.cumsum(per_day[start:]), SALES_BLOCK)))
+        block = _sales_block(rng, day_starts[start:stop], per_day[start:stop], pair_cdf, pair_store, pair_product,
+                             store_ids, skus, prices)
+        counts['sales'] += write_rows('sale', block)
+        log(f"  {days[stop - 1].date()}: {counts['sales']:,} sales "
+            f"({counts['sales'] / (time.perf_counter() - started):,.0f} rows/s)")
+        start = stop
+    return counts
+
+
+def clear_generated(prefix: str = 'GEN') -> Dict[str, int]:
+    """Delete the rows generated with this prefix (and nothing else)"""
+    stores = Store.objects.filter(store_id__startswith=f"{prefix}-")
+    products = Product.objects.filter(sku__startswith=f"{prefix}-")
+    deleted = {}
+    with transaction.atomic():
+        # Without their post_delete receivers, sales and inventory rows are deleted in one statement
+        # each instead of being loaded to send the signal (versions and metrics are updated once below)
+        sale_days = sale_day_range(Sale.objects.filter(store__in=stores))
+        with muted_delete_receivers(Sale, Inventory):
+            deleted['sales'] = Sale.objects.filter(store__in=stores).delete()[0]
+            StockMovement.objects.filter(store__in=stores).delete()
+            StockSnapshot.objects.filter(store__in=stores).delete()
+            StockReservation.objects.filter(store__in=stores).delete()
+            deleted['locations'] = WarehouseLocation.objects.filter(warehouse__store__in=stores).delete()[0]
+            deleted['inventory'] = Inventory.objects.filter(store__in=stores).delete()[0]
+        Warehouse.objects.filter(store__in=stores).delete()
+        deleted['products'] = products.delete()[0]
+        deleted['stores'] = stores.delete()[0]
+        deleted['companies'] = Company.objects.filter(company_id__startswith=f"{prefix}-").delete()[0]
+        bump_models(Sale, Inventory)
+        if sale_days:
+            refresh_days(*sale_days)
+    return deleted
@@ -1,3 +1,1144 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import skipUnless
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Count, Sum
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .forecasting import fit_forecasts, get_forecasts, refresh_forecasts
+from .kpi_engine import build_inventory_kpis, summarize_inventory_kpis
+from .replenishment import ReplenishmentPolicy, build_replenishment_plan, product_statuses
+from .bulk_stock import apply_stock_lines
+from .daily_metrics import refresh_days
+from .db_router import PIN_COOKIE, PrimaryReplicaRouter, RoutingState, read_replica
+from .instrumentation import RequestMetrics
+from .importer import import_file
+from .models import (
+    Category, Company, DashboardMetrics, Inventory, Permission, Product, Role, Sale, StockMovement, Store,
+    UserRole, Warehouse, WarehouseLocation
+)
+from .pick_path import distance_matrix, plan_route, route_length, s_shape_tour
+from .rbac_utils import log_audit
+from .reservations import InsufficientStock, reserve_stock
+from .search import NGramIndex, reset_index as reset_search_index
+from .slotting import LOCATION_COLUMNS, apply_slotting, build_slotting_plan, compute_slotting
+from .response_cache import bump_tables, local_cache as response_cache
+from .synthetic_data import GeneratorConfig, clear_generated, generate
+from .stock_ledger import (
+    apply_movements, apply_pending_movements, movement_kpis, quantities_as_of, record_movement, record_transfer,
+    seed_from_inventory, take_snapshot
+)
+
+
+class SupplyDataMixin:
+    """Small company/store/product fixture shared by the API and engine tests"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(company_id='COM-001', name='Acme', country='Germany', city='Berlin')
+        cls.store = Store.objects.create(store_id='COM-001-HQ', company=cls.company, name='Acme HQ',
+                                         city='Berlin', country='Germany', address='1 Main Street')
+        cls.other_store = Store.objects.create(store_id='COM-001-West', company=cls.company, name='Acme West',
+                                               city='Berlin', country='Germany', address='2 Main Street')
+        cls.category = Category.objects.create(name='Electronics')
+        cls.fast = Product.objects.create(sku='SKU-0001', name='USB-C Cable', category=cls.category,
+                                          price=Decimal('10.00'))
+        cls.slow = Product.objects.create(sku='SKU-0002', name='HDMI Cable', category=cls.category,
+                                          price=Decimal('20.00'))
+        cls.user = User.objects.create_user('analyst', password='secret-pass-123')
+
+    def setUp(self):
+        # Rolled back rows keep their table versions, so cached responses must not outlive a test
+        cache.clear()
+        response_cache.clear()
+        reset_search_index()
+
+    def grant(self, user, *codes, role_type='custom'):
+        role = Role.objects.create(name=f'{user.username}-role', role_type=role_type)
+        role.permissions.set([Permission.objects.get_or_create(code=code)[0] for code in codes])
+        UserRole.objects.update_or_create(user=user, defaults={'role': role, 'is_active': True})
+
+    def create_sale(self, product, store, quantity, days_ago=1):
+        sale_date = timezone.now() - timedelta(days=days_ago)
+        sale = Sale.objects.create(product=product, store=store, quantity=quantity,
+                                   total_amount=product.price * quantity, month=sale_date.strftime('%b'),
+                                   year=sale_date.year)
+        Sale.objects.filter(pk=sale.pk).update(sale_date=sale_date,
+                                               period=timezone.localdate(sale_date).replace(day=1))
+        return sale
+
+
+class InventoryKPIEngineTest(SupplyDataMixin, TestCase):
+    """KPIs computed from Inventory and Sale rows"""
+
+    def setUp(self):
+        super().setUp()
+        Inventory.objects.create(product=self.fast, store=self.store, quantity=90)
+        Inventory.objects.create(product=self.slow, store=self.store, quantity=10)
+        self.create_sale(self.fast, self.store, 90)
+
+    def test_turnover_days_of_supply_and_abc(self):
+        kpis = build_inventory_kpis(period_days=90).set_index('product_id')
+
+        self.assertAlmostEqual(kpis.loc['SKU-0001', 'turnover'], 365 / 90)
+        self.assertAlmostEqual(kpis.loc['SKU-0001', 'days_of_supply'], 90)
+        self.assertEqual(kpis.loc['SKU-0001', 'abc_class'], 'A')
+        self.assertEqual(kpis.loc['SKU-0002', 'abc_class'], 'C')
+        self.assertTrue(kpis.loc['SKU-0002', 'is_slow_moving'])
+
+    def test_summary(self):
+        summary = summarize_inventory_kpis(build_inventory_kpis(period_days=90), 90)
+
+        self.assertEqual(summary['total_units'], 100)
+        self.assertEqual(summary['units_sold'], 90)
+        self.assertEqual(summary['slow_moving_items'], 1)
+        self.assertEqual(summary['by_country'], {'Germany': 100})
+
+    def test_inventory_kpis_api(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/api/kpis/inventory/', {'rows': 5})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['summary']['records'], 2)
+        self.assertEqual(len(response.json()['rows']), 2)
+
+
+class DemandForecastTest(SupplyDataMixin, TestCase):
+    """Vectorized forecasting models and the per-series cache"""
+
+    def test_model_selection_per_series(self):
+        weekly_cycle = np.tile([0, 0, 0, 0, 0, 10, 20], 8)
+        flat = np.full(56, 5.0)
+        fitted = fit_forecasts(np.vstack([weekly_cycle, flat]), season=7, horizon=7)
+
+        self.assertEqual(fitted['model'].tolist(), [1, 0])
+        self.assertEqual(fitted['forecast'][0].tolist(), [0, 0, 0, 0, 0, 10, 20])
+        np.testing.assert_allclose(fitted['forecast'][1], 5.0)
+        self.assertAlmostEqual(fitted['seasonality'][0], 1.0)
+        self.assertEqual(fitted['cv'][1], 0)
+
+    def test_incremental_refresh_recomputes_touched_series_only(self):
+        self.create_sale(self.fast, self.store, 4, days_ago=3)
+        self.create_sale(self.slow, self.store, 2, days_ago=3)
+        self.assertEqual(refresh_forecasts()['recomputed'], 2)
+        self.assertEqual(refresh_forecasts()['recomputed'], 0)
+
+        self.create_sale(self.fast, self.other_store, 6, days_ago=2)
+        meta = refresh_forecasts()
+
+        self.assertEqual(meta['recomputed'], 1)
+        self.assertEqual(len(meta['series_keys']), 3)
+        self.assertIn('SKU-0001|COM-001-West', get_forecasts())
+
+        # Changes to existing sales are picked up through the table version, not only new sale ids
+        sale = Sale.objects.get(product=self.slow)
+        Sale.objects.filter(pk=sale.pk).update(quantity=9)
+        self.assertEqual(refresh_forecasts()['recomputed'], 0)
+        bump_tables('sale')
+        self.assertEqual(refresh_forecasts()['recomputed'], 1)
+        self.assertEqual(get_forecasts(['SKU-0002|COM-001-HQ'])['SKU-0002|COM-001-HQ']['mean_demand'],
+                         round(9 / 182, 3))
+
+    def test_forecast_api(self):
+        self.create_sale(self.fast, self.store, 4, days_ago=3)
+        self.create_sale(self.fast, self.other_store, 6, days_ago=2)
+        self.client.force_login(self.user)
+
+        response = self.client.get('/api/forecast/', {'store': 'COM-001-HQ', 'horizon': 7})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([s['series'] for s in response.json()['series']], ['SKU-0001|COM-001-HQ'])
+        self.assertEqual(len(response.json()['series'][0]['forecast']), 7)
+
+        response = self.client.get('/api/forecast/', {'level': 'sku'})
+        self.assertEqual(response.json()['summary']['series'], 1)
+
+        # Filters match key components, also when an id contains the label separator
+        piped = Store.objects.create(store_id='COM|9', company=self.company, name='Piped', city='Berlin',
+                                     country='Germany', address='9 Main Street')
+        self.create_sale(self.slow, piped, 1, days_ago=2)
+        series = self.client.get('/api/forecast/', {'store': 'COM|9'}).json()['series']
+        self.assertEqual([(s['sku'], s['store']) for s in series], [('SKU-0002', 'COM|9')])
+
+        self.assertEqual(self.client.get('/api/forecast/', {'level': 'region'}).status_code, 400)
+
+
+class ReplenishmentPlanTest(SupplyDataMixin, TestCase):
+    """Reorder points, order quantities and product statuses"""
+
+    def setUp(self):
+        super().setUp()
+        Inventory.objects.create(product=self.fast, store=self.store, quantity=10)
+        Inventory.objects.create(product=self.slow, store=self.store, quantity=0)
+        Inventory.objects.create(product=self.slow, store=self.other_store, quantity=50)
+        # 9 units a day, every day, for the last 10 days of a 10-day period
+        for days_ago in range(10):
+            self.create_sale(self.fast, self.store, 9, days_ago=days_ago + 0.5)
+
+    def test_reorder_point_and_order_quantity(self):
+        policy = ReplenishmentPolicy(lead_time_days=2, review_period_days=3, period_days=10)
+        plan = build_replenishment_plan(policy=policy).set_index(['product_id', 'store_id'])
+        fast = plan.loc[('SKU-0001', 'COM-001-HQ')]
+
+        self.assertAlmostEqual(fast['daily_demand'], 9)
+        self.assertEqual(fast['safety_stock'], 0)
+        self.assertEqual(fast['reorder_point'], 18)
+        self.assertEqual(fast['order_quantity'], 45 - 10)
+        self.assertEqual(plan.loc[('SKU-0002', 'COM-001-West'), 'order_quantity'], 0)
+
+    def test_product_status(self):
+        plan = build_replenishment_plan(policy=ReplenishmentPolicy(period_days=10))
+        self.assertEqual(product_statuses(plan).to_dict(), {'SKU-0001': 'low-stock', 'SKU-0002': 'low-stock'})
+
+    def test_replenishment_api_and_command(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/api/replenishment/', {'lead_time': 2, 'period': 10})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['summary']['positions_to_order'], 1)
+        self.assertEqual(response.json()['rows'][0]['product_id'], 'SKU-0001')
+        for params in ({'service_level': 0}, {'service_level': 1}, {'service_level': 'nan'},
+                       {'lead_time': -1}, {'lead_time': 'nan'}, {'review_period': 'inf'}):
+            self.assertEqual(self.client.get('/api/replenishment/', params).status_code, 400, params)
+
+        call_command('plan_replenishment', period=10, stdout=io.StringIO())
+        self.assertEqual(Product.objects.get(sku='SKU-0001').status, 'low-stock')
+        for args in (['--service-level', '1.5'], ['--lead-time', '-2'], ['--lead-time', 'nan']):
+            with self.assertRaises(CommandError):
+                call_command('plan_replenishment', *args, stdout=io.StringIO())
+
+
+class StockLedgerTest(SupplyDataMixin, TestCase):
+    """Movement ledger, batched materialization and snapshots"""
+
+    def days_ago(self, days):
+        return timezone.now() - timedelta(days=days)
+
+    def test_apply_pending_movements(self):
+        Inventory.objects.create(product=self.fast, store=self.store, quantity=10)
+        self.assertEqual(seed_from_inventory(), 1)
+        self.assertEqual(seed_from_inventory(), 0)
+
+        record_movement('SKU-0001', 'COM-001-HQ', 'receipt', 5)
+        record_movement('SKU-0001', 'COM-001-HQ', 'sale', -3)
+        record_transfer('SKU-0001', 'COM-001-HQ', 'COM-001-West', 2)
+
+        self.assertEqual(apply_pending_movements(batch_size=2), 4)
+        self.assertEqual(Inventory.objects.get(product=self.fast, store=self.store).quantity, 10)
+        self.assertEqual(Inventory.objects.get(product=self.fast, store=self.other_store).quantity, 2)
+        self.assertFalse(StockMovement.objects.filter(applied=False).exists())
+
+    def test_movements_are_applied_once(self):
+        receipt = record_movement('SKU-0001', 'COM-001-HQ', 'receipt', 5)
+        sale = record_movement('SKU-0001', 'COM-001-HQ', 'sale', -2)
+        self.assertEqual(apply_movements([receipt.pk]), 1)
+
+        # A worker holding a stale list of pending ids only applies what is still pending
+        self.assertEqual(apply_movements([receipt.pk, sale.pk]), 1)
+        self.assertEqual(apply_movements([receipt.pk, sale.pk]), 0)
+        self.assertEqual(Inventory.objects.get(product=self.fast, store=self.store).quantity, 3)
+
+    def test_rebuild_past_dates_from_snapshot(self):
+        first = record_movement('SKU-0001', 'COM-001-HQ', 'receipt', 10, occurred_at=self.days_ago(10))
+        take_snapshot(self.days_ago(5))
+        record_movement('SKU-0001', 'COM-001-HQ', 'sale', -4, occurred_at=self.days_ago(2))
+
+        # Only the snapshot knows about the first movement from now on
+        StockMovement.objects.filter(pk=first.pk).delete()
+
+        def quantity(as_of=None):
+            frame = quantities_as_of(as_of)
+            return frame['quantity'].sum() if not frame.empty else 0
+
+        self.assertEqual(quantity(self.days_ago(3)), 10)
+        self.assertEqual(quantity(), 6)
+        self.assertEqual(quantity(self.days_ago(6)), 0)
+
+    def test_rotation_and_aging(self):
+        record_movement('SKU-0001', 'COM-001-HQ', 'receipt', 20, occurred_at=self.days_ago(40))
+        record_movement('SKU-0001', 'COM-001-HQ', 'receipt', 10, occurred_at=self.days_ago(20))
+        record_movement('SKU-0001', 'COM-001-HQ', 'sale', -10, occurred_at=self.days_ago(10))
+
+        kpis = movement_kpis(period_days=30).set_index(['product_id', 'store_id']).loc[('SKU-0001', 'COM-001-HQ')]
+
+        self.assertEqual(kpis['opening'], 20)
+        self.assertEqual(kpis['closing'], 20)
+        self.assertEqual(kpis['units_sold'], 10)
+        self.assertAlmostEqual(kpis['rotation'], 0.5)
+        self.assertAlmostEqual(kpis['days_since_receipt'], 20, places=2)
+
+
+class StockReservationTest(SupplyDataMixin, TestCase):
+    """Atomic multi-line reservations with idempotency keys"""
+
+    def setUp(self):
+        super().setUp()
+        Inventory.objects.create(product=self.fast, store=self.store, quantity=5)
+        Inventory.objects.create(product=self.slow, store=self.store, quantity=1)
+        self.grant(self.user, 'edit_inventory', 'edit_sales')
+        self.client.force_login(self.user)
+
+    def quantity(self, product):
+        return Inventory.objects.get(product=product, store=self.store).quantity
+
+    def test_order_is_all_or_nothing(self):
+        with self.assertRaises(InsufficientStock) as ctx:
+            reserve_stock('order-1', 'COM-001-HQ', [{'sku': 'SKU-0001', 'quantity': 2},
+                                                   {'sku': 'SKU-0002', 'quantity': 2}])
+
+        self.assertEqual(ctx.exception.lines, [{'sku': 'SKU-0002', 'requested': 2, 'available': 1}])
+        self.assertEqual(self.quantity(self.fast), 5)
+        self.assertFalse(StockMovement.objects.exists())
+
+        reserve_stock('order-1', 'COM-001-HQ', [{'sku': 'SKU-0001', 'quantity': 2},
+                                               {'sku': 'SKU-0001', 'quantity': 3}])
+        self.assertEqual(self.quantity(self.fast), 0)
+
+    def test_retries_with_the_same_key_reserve_once(self):
+        order = {'store': 'COM-001-HQ', 'lines': [{'sku': 'SKU-0001', 'quantity': 2}]}
+        first = self.client.post('/api/stock/reservations/', order, content_type='application/json',
+                                 HTTP_IDEMPOTENCY_KEY='checkout-42')
+        retry = self.client.post('/api/stock/reservations/', order, content_type='application/json',
+                                 HTTP_IDEMPOTENCY_KEY='checkout-42')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 200)
+        self.assertTrue(retry.json()['replayed'])
+        self.assertEqual(self.quantity(self.fast), 3)
+
+        order['lines'][0]['quantity'] = 1
+        conflict = self.client.post('/api/stock/reservations/', order, content_type='application/json',
+                                    HTTP_IDEMPOTENCY_KEY='checkout-42')
+        self.assertEqual(conflict.status_code, 422)
+
+        shortage = self.client.post('/api/stock/reservations/', {**order, 'lines': [{'sku': 'SKU-0002', 'quantity': 9}]},
+                                    content_type='application/json', HTTP_IDEMPOTENCY_KEY='checkout-43')
+        self.assertEqual(shortage.status_code, 409)
+        self.assertEqual(self.client.post('/api/stock/reservations/', json.dumps(order['lines']),
+                                          content_type='application/json').status_code, 400)
+
+    def test_confirm_creates_sales_and_release_restocks(self):
+        confirmed, _ = reserve_stock('a', 'COM-001-HQ', [{'sku': 'SKU-0001', 'quantity': 2}], user=self.user)
+        released, _ = reserve_stock('b', 'COM-001-HQ', [{'sku': 'SKU-0001', 'quantity': 3}], user=self.user)
+
+        response = self.client.post(f'/api/stock/reservations/{confirmed.pk}/confirm/')
+        self.assertEqual(len(response.json()['sales']), 1)
+        self.assertEqual(Sale.objects.get().total_amount, Decimal('20.00'))
+
+        self.client.post(f'/api/stock/reservations/{released.pk}/release/')
+        self.client.post(f'/api/stock/reservations/{released.pk}/release/')
+        self.assertEqual(self.quantity(self.fast), 3)
+        self.assertEqual(self.client.post(f'/api/stock/reservations/{confirmed.pk}/release/').status_code, 400)
+
+    def test_permissions_ownership_and_key_scope(self):
+        order = {'store': 'COM-001-HQ', 'lines': [{'sku': 'SKU-0001', 'quantity': 1}]}
+        reservation, _ = reserve_stock('shared-key', 'COM-001-HQ', order['lines'], user=self.user)
+        other = User.objects.create_user('clerk', password='secret-pass-123')
+        self.client.force_login(other)
+        self.assertEqual(self.client.post('/api/stock/reservations/', order, content_type='application/json',
+                                          HTTP_IDEMPOTENCY_KEY='shared-key').status_code, 403)
+
+        self.grant(other, 'edit_inventory', 'edit_sales')
+        response = self.client.post('/api/stock/reservations/', order, content_type='application/json',
+                                    HTTP_IDEMPOTENCY_KEY='shared-key')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotEqual(response.json()['reservation']['id'], reservation.pk)
+        self.assertEqual(self.client.post(f'/api/stock/reservations/{reservation.pk}/confirm/').status_code, 404)
+
+        manager = User.objects.create_user('manager', password='secret-pass-123')
+        self.grant(manager, 'edit_inventory', 'edit_sales', role_type='manager')
+        self.client.force_login(manager)
+        self.assertEqual(self.client.post(f'/api/stock/reservations/{reservation.pk}/release/').status_code, 200)
+        self.assertEqual(self.quantity(self.fast), 4)
+
+
+class BulkStockUpdateTest(SupplyDataMixin, TestCase):
+    """Batch adjustments, counts and transfers with per-line results"""
+
+    def setUp(self):
+        super().setUp()
+        Inventory.objects.create(product=self.fast, store=self.store, quantity=10)
+        warehouse = Warehouse.objects.create(warehouse_id='WH-1', store=self.store, name='Main')
+        self.location = WarehouseLocation.objects.create(warehouse=warehouse, product=self.fast, aisle='A1',
+                                                         shelf='S1', box='B1', quantity=4)
+
+    def quantity(self, product, store):
+        return Inventory.objects.get(product=product, store=store).quantity
+
+    def test_mixed_batch_with_rejected_lines(self):
+        result = apply_stock_lines([
+            {'sku': 'SKU-0001', 'store': 'COM-001-HQ', 'delta': 5},
+            {'sku': 'SKU-0001', 'location_id': self.location.pk, 'quantity': 6},
+            {'sku': 'SKU-0001', 'from_store': 'COM-001-HQ', 'to_store': 'COM-001-West', 'quantity': 3},
+            {'sku': 'SKU-9999', 'store': 'COM-001-HQ', 'delta': 1},
+            {'sku': 'SKU-0001', 'store': 'COM-001-HQ', 'delta': -100},
+            {'sku': 'SKU-0002', 'store': 'COM-001-West', 'quantity': 7},
+        ])
+
+        self.assertEqual([r['status'] for r in result['results']],
+                         ['applied', 'applied', 'applied', 'rejected', 'rejected', 'applied'])
+        self.assertEqual(result['results'][2]['quantities'], [14, 3])
+        self.assertEqual(self.quantity(self.fast, self.store), 14)
+        self.assertEqual(self.quantity(self.fast, self.other_store), 3)
+        self.assertEqual(self.quantity(self.slow, self.other_store), 7)
+        self.location.refresh_from_db()
+        self.assertEqual(self.location.quantity, 6)
+        self.assertEqual(StockMovement.objects.filter(reference=result['reference']).count(), 5)
+
+    def test_atomic_batch_is_all_or_nothing(self):
+        result = apply_stock_lines([
+            {'sku': 'SKU-0001', 'store': 'COM-001-HQ', 'delta': 5},
+            {'sku': 'SKU-0001', 'store': 'COM-001-HQ', 'delta': -20},
+        ], atomic=True)
+
+        self.assertEqual(result['applied'], 0)
+        self.assertEqual(self.quantity(self.fast, self.store), 10)
+
+    def test_bulk_api_requires_edit_permission(self):
+        lines = {'lines': [{'sku': 'SKU-0001', 'store': 'COM-001-HQ', 'delta': -1}]}
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.post('/api/stock/bulk/', lines, content_type='application/json').status_code, 403)
+
+        admin = User.objects.create_superuser('admin', password='secret-pass-123')
+        self.client.force_login(admin)
+        response = self.client.post('/api/stock/bulk/', lines, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quantity(self.fast, self.store), 9)
+
+        for body in ([lines['lines'][0]], 'lines', None):
+            response = self.client.post('/api/stock/bulk/', json.dumps(body), content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+
+
+class DataImportTest(SupplyDataMixin, TestCase):
+    """Chunked CSV imports with upserts and per-line rejections"""
+
+    def test_inventory_upsert_and_rejected_lines(self):
+        Inventory.objects.create(product=self.fast, store=self.store, quantity=10)
+        csv = io.StringIO(
+            'sku,store,quantity\n'
+            'SKU-0001,COM-001-HQ,25\n'
+            'SKU-0002,COM-001-West,7\n'
+            'SKU-9999,COM-001-HQ,1\n'
+            'SKU-0002,COM-001-HQ,lots\n'
+        )
+        report = import_file('inventory', csv, chunk_size=2)
+
+        self.assertEqual((report.rows_read, report.rows_written, report.rows_rejected), (4, 2, 2))
+        self.assertEqual(report.errors, [{'line': 4, 'error': 'unknown sku'}, {'line': 5, 'error': 'invalid quantity'}])
+        self.assertEqual(Inventory.objects.get(product=self.fast, store=self.store).quantity, 25)
+        self.assertEqual(Inventory.objects.get(product=self.slow, store=self.other_store).quantity, 7)
+
+    def test_sales_keep_imported_dates_and_fill_amounts(self):
+        csv = io.StringIO(
+            'sku,store,quantity,sale_date,total_amount\n'
+            'SKU-0001,COM-001-HQ,3,2025-03-14T10:30:00Z,\n'
+            'SKU-0002,COM-001-West,1,2025-12-01 08:00:00,19.50\n'
+        )
+        report = import_file('sale', csv)
+
+        self.assertEqual(report.rows_written, 2)
+        first, second = Sale.objects.order_by('sale_date')
+        self.assertEqual((first.sale_date.year, first.sale_date.month, first.month, first.year), (2025, 3, 'Mar', 2025))
+        self.assertEqual(first.total_amount, Decimal('30.00'))
+        self.assertEqual(second.total_amount, Decimal('19.50'))
+
+    def test_unparseable_total_amount_is_rejected(self):
+        csv = io.StringIO(
+            'sku,store,quantity,total_amount\n'
+            'SKU-0001,COM-001-HQ,3,ten euros\n'
+            'SKU-0001,COM-001-HQ,1,\n'
+        )
+        report = import_file('sale', csv)
+
+        self.assertEqual((report.rows_written, report.rows_rejected), (1, 1))
+        self.assertEqual(report.errors, [{'line': 2, 'error': 'invalid total_amount'}])
+        self.assertEqual(Sale.objects.get().total_amount, Decimal('10.00'))
+
+    def test_partial_files_only_update_their_columns(self):
+        Product.objects.filter(sku='SKU-0001').update(description='Braided', status='low-stock')
+        sale = self.create_sale(self.fast, self.store, 2, days_ago=40)
+        sale.refresh_from_db()
+        import_file('product', io.StringIO('sku,name,price\nSKU-0001,New,6\n'))
+        import_file('sale', io.StringIO(f'sale_id,sku,store,quantity\n{sale.sale_id},SKU-0001,COM-001-HQ,5\n'))
+
+        product = Product.objects.get(sku='SKU-0001')
+        self.assertEqual((product.name, product.price, product.description, product.status, product.category_id),
+                         ('New', Decimal('6.00'), 'Braided', 'low-stock', self.category.pk))
+        updated = Sale.objects.get(sale_id=sale.sale_id)
+        self.assertEqual(updated.quantity, 5)
+        self.assertEqual((updated.sale_date, updated.month, updated.year, updated.period),
+                         (sale.sale_date, sale.month, sale.year, sale.period))
+
+    @skipUnless(connection.vendor == 'postgresql', 'COPY imports are PostgreSQL only')
+    def test_copy_imports_rows_without_ids(self):
+        warehouse = Warehouse.objects.create(warehouse_id='WH-001', store=self.store, name='Main')
+        import_file('inventory', io.StringIO('sku,store,quantity\nSKU-0001,COM-001-HQ,25\n'))
+        import_file('location', io.StringIO(
+            'warehouse,sku,aisle,shelf,box,quantity\nWH-001,SKU-0001,A1,S1,B1,4\n'))
+        report = import_file('sale', io.StringIO(
+            'sku,store,quantity,sale_date\nSKU-0001,COM-001-HQ,2,2025-03-14T10:30:00Z\n'))
+
+        self.assertEqual(report.rows_written, 1)
+        self.assertEqual(Inventory.objects.get(product=self.fast, store=self.store).quantity, 25)
+        self.assertEqual(WarehouseLocation.objects.get(warehouse=warehouse).quantity, 4)
+        self.assertEqual(Sale.objects.get().sale_date.year, 2025)
+
+    def test_import_api_upload(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        upload = SimpleUploadedFile('products.csv', b'sku,name,price,category\nSKU-0003,DP Cable,12.5,Cables\n')
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.post('/api/import/product/', {'file': upload}).status_code, 403)
+
+        admin = User.objects.create_superuser('admin', password='secret-pass-123')
+        self.client.force_login(admin)
+        upload.seek(0)
+        response = self.client.post('/api/import/product/', {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['rows_written'], 1)
+        product = Product.objects.get(sku='SKU-0003')
+        self.assertEqual((product.price, product.category.name), (Decimal('12.50'), 'Cables'))
+
+
+class SyntheticDataTest(SupplyDataMixin, TestCase):
+    """Deterministic generator that never touches existing rows"""
+
+    def test_generate_is_deterministic_and_keeps_existing_data(self):
+        self.create_sale(self.fast, self.store, 2)
+        config = GeneratorConfig(scale=0.1, days=14, company_depth=1, branching=2,
+                                 stores_per_company=2, sales_per_day=50)
+        counts = generate(config)
+
+        self.assertEqual((counts['companies'], counts['stores'], counts['products']), (1, 2, 100))
+        generated = Sale.objects.filter(store__store_id__startswith='GEN-')
+        self.assertEqual(generated.count(), counts['sales'])
+        self.assertTrue(Sale.objects.filter(store=self.store).exists())
+        self.assertTrue(Product.objects.filter(sku='SKU-0001').exists())
+        self.assertGreater(counts['sales'], 14 * 30)
+        self.assertFalse(generated.filter(sale_date__gt=timezone.now()).exists())
+        first_run = list(generated.order_by('sale_id').values_list('product_id', 'store_id', 'quantity', 'total_amount'))
+
+        # Same seed, same data; existing sales are not duplicated
+        self.assertEqual(generate(config)['sales'], 0)
+        generated.delete()
+        generate(config)
+        self.assertEqual(
+            list(generated.order_by('sale_id').values_list('product_id', 'store_id', 'quantity', 'total_amount')),
+            first_run,
+        )
+
+        deleted = clear_generated()
+        self.assertEqual(deleted['sales'], counts['sales'])
+        self.assertFalse(generated.exists())
+        self.assertTrue(Sale.objects.filter(store=self.store).exists())
+        # The delete receivers are connected again afterwards
+        with CaptureQueriesContext(connection) as captured:
+            Inventory.objects.filter(store=self.store).delete()
+        self.assertTrue(any(q['sql'].startswith('SELECT') for q in captured))
+
+
+class RequestInstrumentationTest(SupplyDataMixin, TestCase):
+    """Query counts and timings per request"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    @override_settings(REQUEST_INSTRUMENTATION={'ENABLED': True, 'SAMPLE_RATE': 1.0, 'SERVER_TIMING': True})
+    def test_server_timing_and_structured_log(self):
+        Inventory.objects.create(product=self.fast, store=self.store, quantity=10)
+        with self.assertLogs('supply_unlimited.requests', 'INFO') as logs:
+            response = self.client.get('/api/inventory/')
+
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", render;dur=[\d.]+, ')
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((record['view'], record['status']), ('inventory_data', 200))
+        self.assertGreater(record['queries'], 0)
+
+    @override_settings(REQUEST_INSTRUMENTATION={'ENABLED': True, 'SLOW_QUERY_MS': 1e-6})
+    def test_slow_query_log_names_the_origin(self):
+        with self.assertLogs('supply_unlimited.slow_queries', 'WARNING') as logs:
+            self.client.get('/api/inventory/')
+        origins = [json.loads(record.getMessage())['origin'] for record in logs.records]
+        self.assertTrue(any(origin.startswith('users/views.py:') for origin in origins), origins)
+
+    @override_settings(REQUEST_INSTRUMENTATION={'ENABLED': False, 'SERVER_TIMING': True})
+    def test_disabled_middleware_is_not_loaded(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/inventory/'))
+
+
+class MetricsEndpointTest(SupplyDataMixin, TestCase):
+    """Prometheus exposition of request and audit metrics"""
+
+    @override_settings(REQUEST_INSTRUMENTATION={'ENABLED': False}, METRICS={'PUBLIC': True})
+    def test_metrics_include_requests_by_route(self):
+        # Request counters do not depend on the (sampled) instrumentation
+        client = Client()
+        client.force_login(self.user)
+        client.get('/api/inventory/')
+        log_audit(self.user, 'export', 'Inventory')
+
+        response = client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('supply_http_requests_total{method="GET",route="inventory_data",status="200"}', body)
+        self.assertIn('supply_http_request_duration_seconds_count{method="GET",route="inventory_data"}', body)
+        self.assertIn('supply_audit_log_writes_total{action="export"}', body)
+        self.assertIn('supply_websocket_connections', body)
+
+    @override_settings(METRICS={'TOKEN': 'scrape-secret', 'PUBLIC': True})
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS={'TOKEN': '', 'PUBLIC': False})
+    def test_private_metrics_need_staff(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.client.force_login(User.objects.create_user('viewer', password='secret-pass-123'))
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.client.force_login(User.objects.create_user('ops', password='secret-pass-123', is_staff=True))
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+
+class ProfilingTest(SupplyDataMixin, TestCase):
+    """Opt-in profiles of staff requests"""
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.settings_override = override_settings(PROFILING={
+            'ENABLED': True, 'ROUTES': ['export_inventory'], 'DIRECTORY': self.directory, 'MAX_FILES': 2,
+        })
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.staff = User.objects.create_user('ops', password='secret-pass-123', is_staff=True)
+
+    def test_header_profiles_staff_requests_only(self):
+        self.client.force_login(self.user)
+        self.assertNotIn('X-Profile-Id', self.client.get('/api/inventory/', HTTP_X_PROFILE='cprofile'))
+
+        self.client.force_login(self.staff)
+        name = self.client.get('/api/inventory/', HTTP_X_PROFILE='sample')['X-Profile-Id']
+        self.assertTrue(name.endswith('.folded'))
+        name = self.client.get('/api/kpis/inventory/', HTTP_X_PROFILE='cprofile')['X-Profile-Id']
+        download = self.client.get(f'/api/profiles/{name}/')
+        self.assertEqual(download.status_code, 200)
+        self.assertIn(b'inventory_kpis', b''.join(download.streaming_content))
+        self.assertEqual(self.client.get('/api/profiles/..%2Fdb.sqlite3/').status_code, 404)
+
+    def test_route_setting_and_retention(self):
+        self.client.force_login(self.staff)
+        self.assertNotIn('X-Profile-Id', self.client.get('/api/inventory/'))
+        for _ in range(3):
+            self.assertIn('X-Profile-Id', self.client.get('/export/inventory/?format=json'))
+
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+        self.assertEqual(len(self.client.get('/api/profiles/').json()['profiles']), 2)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/api/profiles/').status_code, 403)
+
+
+@override_settings(DATABASE_ROUTING={'REPLICA': 'default', 'APPS': ['users']})
+class ReplicaRouterTest(SimpleTestCase):
+    """Routing decisions of the primary/replica router ('default' stands in for the replica alias)"""
+
+    def test_reads_use_replica_only_in_read_scope_until_a_write(self):
+        router = PrimaryReplicaRouter()
+        self.assertIsNone(router.db_for_read(Inventory))
+        with read_replica():
+            self.assertEqual(router.db_for_read(Inventory), 'default')
+            self.assertIsNone(router.db_for_read(User))
+            self.assertEqual(router.db_for_write(Inventory), 'default')
+            self.assertIsNone(router.db_for_read(Inventory))
+
+    def test_scopes_and_counters_shared_by_threads(self):
+        # Threads of one request open and close read scopes and count queries on the same state
+        state, metrics = RoutingState(), RequestMetrics(method='GET', path='/')
+        state.open_scope()
+
+        def work():
+            for _ in range(1000):
+                state.open_scope()
+                metrics.add_query(0.001)
+                state.close_scope()
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(state.on_replica)
+        self.assertEqual(state.scopes, 1)
+        self.assertEqual(metrics.queries, 4000)
+
+    def test_without_replica_alias_reads_stay_on_primary(self):
+        with override_settings(DATABASE_ROUTING={'REPLICA': 'replica', 'APPS': ['users']}), read_replica():
+            self.assertIsNone(PrimaryReplicaRouter().db_for_read(Inventory))
+
+
+# Two separate local databases: SQLITE_REPLICA_NAME=/tmp/replica.sqlite3 python manage.py test users.tests.ReplicaRoutingTest
+# (the replica never catches up there, so the rest of the suite runs without it)
+SEPARATE_REPLICA = 'replica' in settings.DATABASES and not settings.DATABASES['replica'].get('TEST', {}).get('MIRROR')
+
+
+@skipUnless(SEPARATE_REPLICA, 'needs two local databases (SQLITE_REPLICA_NAME)')
+class ReplicaRoutingTest(SupplyDataMixin, TestCase):
+    """Analytics views against two real databases: reads from the replica, read-your-writes after a mutation"""
+    databases = {'default', 'replica'} if SEPARATE_REPLICA else {'default'}
+
+    def test_read_routes_and_stickiness(self):
+        Inventory.objects.create(product=self.fast, store=self.store, quantity=10)
+        client = Client()
+        client.force_login(User.objects.create_superuser('admin', password='secret-pass-123'))
+
+        # The replica has not received the row yet
+        self.assertEqual(client.get('/api/inventory/').json()['data'], [])
+
+        lines = {'lines': [{'sku': 'SKU-0001', 'store': 'COM-001-HQ', 'delta': 5}]}
+        response = client.post('/api/stock/bulk/', lines, content_type='application/json')
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(len(client.get('/api/inventory/').json()['data']), 1)
+
+
+class ResponseCacheTest(SupplyDataMixin, TestCase):
+    """Tiered cache of the dashboard APIs, table-version invalidation and ETags"""
+
+    def setUp(self):
+        super().setUp()
+        self.inventory = Inventory.objects.create(product=self.fast, store=self.store, quantity=10)
+        self.client.force_login(self.user)
+
+    def stock(self, url='/api/inventory/'):
+        return [row['stock'] for row in self.client.get(url).json()['data']]
+
+    def test_cached_response_and_conditional_get(self):
+        first = self.client.get('/api/inventory/?store=all&search=')
+        with CaptureQueriesContext(connection) as captured:
+            second = self.client.get('/api/inventory/')
+        self.assertEqual(first.content, second.content)
+        self.assertFalse([q for q in captured if 'users_inventory' in q['sql']])
+
+        not_modified = self.client.get('/api/inventory/', HTTP_IF_NONE_MATCH=second['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], second['ETag'])
+
+    def test_writes_invalidate(self):
+        self.assertEqual(self.stock(), [10])
+        self.inventory.quantity = 12
+        self.inventory.save()
+        self.assertEqual(self.stock(), [12])
+
+        apply_stock_lines([{'sku': 'SKU-0001', 'store': 'COM-001-HQ', 'delta': 5}])
+        self.assertEqual(self.stock(), [17])
+
+        self.fast.name = 'USB-C Cable 2m'
+        self.fast.save()
+        self.assertEqual(self.client.get('/api/inventory/').json()['data'][0]['name'], 'USB-C Cable 2m')
+
+    def test_replica_reads_are_not_cached(self):
+        # 'default' stands in for the replica alias
+        routing = {'REPLICA': 'default', 'APPS': ['users'], 'READ_ROUTES': ['inventory_data']}
+        with override_settings(DATABASE_ROUTING=routing):
+            client = Client()
+            client.force_login(self.user)
+            self.assertIn('ETag', client.get('/api/inventory/'))
+            with CaptureQueriesContext(connection) as captured:
+                client.get('/api/inventory/')
+        self.assertTrue([q for q in captured if 'users_inventory' in q['sql']])
+
+
+class DashboardBootstrapTest(SupplyDataMixin, TestCase):
+    """Single dashboard payload with per-section caching"""
+
+    def setUp(self):
+        super().setUp()
+        Inventory.objects.create(product=self.fast, store=self.store, quantity=30)
+        Inventory.objects.create(product=self.slow, store=self.other_store, quantity=0)
+        self.client.force_login(self.user)
+
+    def test_bootstrap_matches_section_apis(self):
+        data = self.client.get('/api/dashboard/bootstrap/?page_size=1').json()
+
+        self.assertEqual(data['inventory']['rows'], self.client.get('/api/inventory/').json()['data'][:1])
+        self.assertEqual(data['inventory']['total'], 2)
+        self.assertEqual(data['companies'], self.client.get('/api/companies/').json())
+        self.assertEqual(data['facets'], self.client.get('/api/inventory/facets/').json()['facets'])
+        self.assertEqual(data['kpis']['total_units'], 30)
+        self.assertEqual(self.client.get('/api/dashboard/bootstrap/?page_size=x').status_code, 400)
+
+    def test_sections_are_invalidated_separately(self):
+        self.client.get('/api/dashboard/bootstrap/')
+        self.create_sale(self.fast, self.store, 3)
+
+        with CaptureQueriesContext(connection) as captured:
+            data = self.client.get('/api/dashboard/bootstrap/').json()
+        self.assertEqual(data['kpis']['units_sold'], 3)
+        self.assertTrue([q for q in captured if 'users_sale' in q['sql']])
+        self.assertFalse([q for q in captured if 'FROM "users_company"' in q['sql']])
+
+
+class InventoryFacetsTest(SupplyDataMixin, TestCase):
+    """Filter values with counts, each dimension under the other active filters"""
+
+    def setUp(self):
+        super().setUp()
+        paris = Store.objects.create(store_id='COM-001-FR', company=self.company, name='Acme Paris',
+                                     city='Paris', country='France', address='3 Rue Main')
+        tools = Category.objects.create(name='Tools')
+        drill = Product.objects.create(sku='SKU-0003', name='Drill', category=tools, price=Decimal('50.00'))
+        Inventory.objects.create(product=self.fast, store=self.store, quantity=30)
+        Inventory.objects.create(product=self.slow, store=self.store, quantity=0)
+        Inventory.objects.create(product=self.fast, store=paris, quantity=5)
+        Inventory.objects.create(product=drill, store=paris, quantity=80)
+        self.client.force_login(self.user)
+
+    def facets(self, query=''):
+        facets = self.client.get(f'/api/inventory/facets/{query}').json()['facets']
+        return {name: {f['value']: f['count'] for f in values} for name, values in facets.items()}
+
+    def test_counts_without_filters(self):
+        facets = self.facets()
+        self.assertEqual(facets['store'], {'France': 2, 'Germany': 2})
+        self.assertEqual(facets['category'], {'Electronics': 3, 'Tools': 1})
+        self.assertEqual(facets['company'], {'COM-001': 4})
+        self.assertEqual(facets['stock'], {'in-stock': 2, 'low-stock': 1, 'out-of-stock': 1})
+
+    def test_each_dimension_ignores_its_own_filter(self):
+        facets = self.facets('?store=France&category=Electronics&city=all')
+        self.assertEqual(facets['store'], {'France': 1, 'Germany': 2})
+        self.assertEqual(facets['category'], {'Electronics': 1, 'Tools': 1})
+        self.assertEqual(facets['stock'], {'in-stock': 0, 'low-stock': 1, 'out-of-stock': 0})
+        rows = self.client.get('/api/inventory/?store=France&category=Electronics').json()['data']
+        self.assertEqual(len(rows), sum(facets['stock'].values()))
+
+
+class DailyMetricsTest(SupplyDataMixin, TestCase):
+    """DashboardMetrics maintained from Sale: incremental updates and bulk refresh"""
+
+    def metrics(self, day):
+        row = DashboardMetrics.objects.get(metric_date=day)
+        return row.total_revenue, row.total_orders, row.active_customers
+
+    def test_incremental_updates_match_refresh(self):
+        today = timezone.localdate()
+        Inventory.objects.create(product=self.fast, store=self.store, quantity=5)
+        self.create_sale(self.fast, self.store, 2, days_ago=0)
+        self.create_sale(self.slow, self.store, 1, days_ago=0)
+        self.create_sale(self.fast, self.other_store, 3, days_ago=0)
+        self.assertEqual(self.metrics(today), (Decimal('70.00'), 3, 2))
+
+        refresh_days(today, today)
+        self.assertEqual(self.metrics(today), (Decimal('70.00'), 3, 2))
+        self.assertEqual(DashboardMetrics.objects.get(metric_date=today).total_products, 1)
+
+        self.client.force_login(self.user)
+        response = self.client.get('/dashboard/')
+        self.assertEqual(response.context['metrics']['total_revenue'], Decimal('70.00'))
+        self.assertEqual(response.context['metrics']['total_orders'], 3)
+
+        # Stock changes show up without refreshing the day's row
+        Inventory.objects.create(product=self.slow, store=self.store, quantity=8)
+        self.assertEqual(self.client.get('/dashboard/').context['metrics']['total_products'], 2)
+        # Counted once per inventory table version, not on every load
+        Inventory.objects.filter(product=self.slow).update(quantity=0)
+        self.assertEqual(self.client.get('/dashboard/').context['metrics']['total_products'], 2)
+        bump_tables('inventory')
+        self.assertEqual(self.client.get('/dashboard/').context['metrics']['total_products'], 1)
+
+    def test_backfill_command_and_bulk_import(self):
+        today = timezone.localdate()
+        # Back-dated with QuerySet.update, which the incremental path never sees
+        self.create_sale(self.fast, self.store, 4, days_ago=3)
+        self.create_sale(self.slow, self.store, 1, days_ago=3)
+        call_command('refresh_metrics', stdout=io.StringIO())
+        self.assertEqual(self.metrics(today - timedelta(days=3)), (Decimal('60.00'), 2, 1))
+        self.assertEqual(self.metrics(today - timedelta(days=1)), (Decimal('0.00'), 0, 0))
+
+        csv_file = io.BytesIO(f"sku,store,quantity,sale_date\nSKU-0002,COM-001-West,2,"
+                              f"{today - timedelta(days=1)}T10:00:00Z\n".encode())
+        import_file('sale', csv_file)
+        self.assertEqual(self.metrics(today - timedelta(days=1)), (Decimal('40.00'), 1, 1))
+
+
+class ProductSearchTest(SupplyDataMixin, TestCase):
+    """Typeahead ranking and the search filter of the inventory API"""
+
+    def setUp(self):
+        super().setUp()
+        Inventory.objects.create(product=self.fast, store=self.store, quantity=30)
+        Inventory.objects.create(product=self.slow, store=self.store, quantity=5)
+        self.client.force_login(self.user)
+
+    def typeahead(self, query):
+        return [row['sku'] for row in self.client.get('/api/search/products/', {'q': query}).json()['results']]
+
+    def test_typeahead_ranking_and_invalidation(self):
+        self.assertEqual(self.typeahead('sku-0002'), ['SKU-0002'])
+        self.assertCountEqual(self.typeahead('cable'), ['SKU-0001', 'SKU-0002'])
+        self.assertEqual(self.typeahead('hd'), ['SKU-0002'])  # Short queries match prefixes
+        self.assertEqual(self.typeahead('HDMI c'), ['SKU-0002'])
+        self.assertCountEqual(self.typeahead('electronics'), ['SKU-0001', 'SKU-0002'])
+
+        self.fast.name = 'Lightning Adapter'
+        self.fast.save()
+        self.assertEqual(self.typeahead('cable'), ['SKU-0002'])
+        rows = self.client.get('/api/inventory/', {'search': 'lightning'}).json()['data']
+        self.assertEqual([row['sku'] for row in rows], ['SKU-0001'])
+
+    def test_ngram_index_matches_substring_scan(self):
+        rng = np.random.default_rng(7)
+        words = ['cable', 'adapter', 'usb', 'hdmi', 'drill', 'bit', 'saw', 'mount']
+        rows = [(f'SKU-{i:05d}', ' '.join(rng.choice(words, 2)), rng.choice(['Tools', 'Audio', None]))
+                for i in range(2000)]
+        index = NGramIndex(rows)
+        for query in ['cab', 'usb ca', 'sku-001', 'tools', 'bit\tt', 'zzz']:
+            expected = {i for i, row in enumerate(rows) if query in '\t'.join([row[0], row[1], row[2] or '']).lower()}
+            self.assertEqual(set(index.matches(query)), expected, query)
+        self.assertEqual(index.search('sku-00042', 3)[0][0], 'SKU-00042')
+
+
+class HotQueryIndexTest(SupplyDataMixin, TestCase):
+    """EXPLAIN of every hot filter path names one of its indexes"""
+
+    def setUp(self):
+        super().setUp()
+        Inventory.objects.create(product=self.fast, store=self.store, quantity=30)
+        warehouse = Warehouse.objects.create(warehouse_id='WH-001', store=self.store, name='Main')
+        WarehouseLocation.objects.create(warehouse=warehouse, product=self.fast, aisle='A', shelf='1', box='1')
+        for days_ago in range(20):
+            self.create_sale(self.fast, self.store, 1, days_ago=days_ago)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')  # Tiny tables are otherwise always scanned
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan, f'{index} not used:\n{plan}')
+
+    def test_hot_filters_use_indexes(self):
+        since = timezone.now() - timedelta(days=7)
+        inventory = Inventory.objects.filter(store__country='Germany')
+        self.assertUsesIndex(inventory, 'store_country_city_idx')
+        self.assertUsesIndex(Inventory.objects.filter(store__city='Berlin'), 'store_city_idx')
+        self.assertUsesIndex(inventory.filter(quantity=0), 'inventory_store_qty_idx')
+        # Category.name is unique, so its index has a backend-specific name
+        self.assertRegex(Inventory.objects.filter(product__category__name='Electronics').explain(),
+                         r'(?i)(index.*users_category|users_category.*index)')
+        self.assertUsesIndex(Sale.objects.filter(year=2026, month='Jan'), 'sale_year_month_idx')
+        self.assertUsesIndex(Sale.objects.filter(sale_date__gte=since, sale_date__lt=timezone.now())
+                             .values('product_id', 'store_id').annotate(units=Sum('quantity')), 'sale_date_cover_idx')
+        self.assertUsesIndex(Sale.objects.filter(store=self.store, sale_date__gte=since), 'sale_store_date_idx')
+        self.assertUsesIndex(Sale.objects.filter(period__gte=since.date().replace(day=1))
+                             .values('period', 'store_id').annotate(orders=Count('pk')), 'sale_period_store_idx')
+        self.assertUsesIndex(WarehouseLocation.objects.filter(warehouse__store__country='Germany'),
+                             'store_country_city_idx')
+
+
+class SalesTimeDimensionTest(SupplyDataMixin, TestCase):
+    """Sale.period month buckets and date-range sales API"""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def test_period_follows_sale_date(self):
+        sale = Sale.objects.create(product=self.fast, store=self.store, quantity=1, total_amount=Decimal('10.00'))
+        self.assertEqual(sale.period, timezone.localdate().replace(day=1))
+        self.assertEqual(sale.month, timezone.localdate().strftime('%b'))
+
+    def test_sales_are_grouped_by_period_in_order(self):
+        recent = self.create_sale(self.fast, self.store, 1, days_ago=1)
+        older = self.create_sale(self.slow, self.store, 2, days_ago=366)
+        self.create_sale(self.fast, self.other_store, 3, days_ago=366)
+        older.refresh_from_db()
+        recent.refresh_from_db()
+
+        data = self.client.get('/api/sales/').json()['data']
+        self.assertEqual([row['period'] for row in data], [older.period.isoformat(), recent.period.isoformat()])
+        self.assertEqual(data[0]['germany'], 70.0)
+        self.assertEqual(data[1]['germany'], 10.0)
+
+    def test_date_range(self):
+        self.create_sale(self.fast, self.store, 1, days_ago=1)
+        self.create_sale(self.slow, self.store, 2, days_ago=400)
+        start = (timezone.localdate() - timedelta(days=30)).isoformat()
+
+        data = self.client.get('/api/sales/', {'start': start, 'end': timezone.localdate().isoformat()}).json()['data']
+        self.assertEqual(sum(row['germany'] for row in data), 10.0)
+        self.assertEqual(self.client.get('/api/sales/', {'end': (timezone.localdate() - timedelta(days=399))
+                                                         .isoformat()}).json()['data'][0]['germany'], 40.0)
+        self.assertEqual(self.client.get('/api/sales/', {'start': '2026-13-01'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/sales/', {'end': 'yesterday'}).status_code, 400)
+
+
+class PickListTest(SupplyDataMixin, TestCase):
+    """Location choice and walking route for multi-line orders"""
+
+    def setUp(self):
+        super().setUp()
+        self.warehouse = Warehouse.objects.create(warehouse_id='WH-001', store=self.store, name='Main')
+        self.near = WarehouseLocation.objects.create(warehouse=self.warehouse, product=self.fast, aisle='A1',
+                                                     shelf='S2', box='B1', quantity=5)
+        self.far = WarehouseLocation.objects.create(warehouse=self.warehouse, product=self.fast, aisle='A3',
+                                                    shelf='S1', box='B1', quantity=50)
+        WarehouseLocation.objects.create(warehouse=self.warehouse, product=self.slow, aisle='A3', shelf='S1',
+                                         box='B2', quantity=10)
+        self.client.force_login(self.user)
+
+    def pick(self, lines, warehouse='WH-001'):
+        return self.client.post(f'/api/warehouses/{warehouse}/pick-list/', json.dumps({'lines': lines}),
+                                content_type='application/json')
+
+    def test_lines_share_a_covering_location(self):
+        data = self.pick([{'sku': 'SKU-0001', 'quantity': 10}, {'sku': 'SKU-0002', 'quantity': 3}]).json()
+
+        self.assertEqual(len(data['route']), 1)
+        self.assertEqual([(pick['location_id'], pick['quantity']) for pick in data['route'][0]['picks']],
+                         [(self.far.id, 10), (WarehouseLocation.objects.get(product=self.slow).id, 3)])
+        self.assertEqual(data['distance'], 2 * (2 * 3.0 + 1))
+
+    def test_split_and_short_lines(self):
+        data = self.pick([{'sku': 'SKU-0001', 'quantity': 52}]).json()
+        picks = [(pick['location_id'], pick['quantity']) for stop in data['route'] for pick in stop['picks']]
+        self.assertCountEqual(picks, [(self.near.id, 5), (self.far.id, 47)])
+
+        response = self.pick([{'sku': 'SKU-0001', 'quantity': 100}])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['lines'], [{'sku': 'SKU-0001', 'requested': 100, 'available': 55}])
+        self.assertEqual(self.pick([{'sku': 'SKU-0001', 'quantity': 0}]).status_code, 400)
+        self.assertEqual(self.pick([{'sku': 'SKU-0001', 'quantity': 1}], warehouse='WH-404').status_code, 404)
+        response = self.client.post('/api/warehouses/WH-001/pick-list/', '[]', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        for lines in (5, True):
+            self.assertEqual(self.pick(lines).status_code, 400)
+
+    def test_route_visits_every_stop(self):
+        rng = np.random.default_rng(7)
+        points = np.vstack([[1, 0], np.column_stack([rng.integers(1, 20, 300), rng.integers(1, 15, 300)])])
+        tour, distance, _ = plan_route(points, 15)
+
+        self.assertEqual((tour[0], tour[-1]), (0, 0))
+        self.assertEqual(sorted(tour[1:-1]), list(range(1, len(points))))
+        self.assertLessEqual(distance, route_length(s_shape_tour(points), distance_matrix(points, 15)))
+
+
+class SlottingTest(SupplyDataMixin, TestCase):
+    """Fast movers moved to the most accessible slots"""
+
+    def setUp(self):
+        super().setUp()
+        self.warehouse = Warehouse.objects.create(warehouse_id='WH-001', store=self.store, name='Main')
+        self.fast_far = WarehouseLocation.objects.create(warehouse=self.warehouse, product=self.fast, aisle='A5',
+                                                         shelf='S5', box='B1', quantity=10)
+        self.fast_near = WarehouseLocation.objects.create(warehouse=self.warehouse, product=self.fast, aisle='A2',
+                                                          shelf='S1', box='B1', quantity=10)
+        self.slow_near = WarehouseLocation.objects.create(warehouse=self.warehouse, product=self.slow, aisle='A1',
+                                                          shelf='S1', box='B3', quantity=10)
+        for _ in range(5):
+            self.create_sale(self.fast, self.store, 1)
+        self.create_sale(self.slow, self.store, 1)
+        self.client.force_login(self.user)
+
+    def slots(self):
+        return {location.id: (location.aisle, location.shelf, location.box)
+                for location in WarehouseLocation.objects.all()}
+
+    def test_plan_moves_fast_movers_forward(self):
+        plan = build_slotting_plan(period_days=30)
+        moves = plan[plan['moved']].set_index('id')
+
+        # The fast SKU already in a target slot stays, its other location takes the best slot
+        self.assertEqual(sorted(moves.index), [self.fast_far.id, self.slow_near.id])
+        self.assertEqual(tuple(moves.loc[self.fast_far.id, ['to_aisle', 'to_shelf', 'to_box']]), ('A1', 'S1', 'B3'))
+        self.assertEqual(tuple(moves.loc[self.slow_near.id, ['to_aisle', 'to_shelf', 'to_box']]), ('A5', 'S5', 'B1'))
+
+        self.assertEqual(apply_slotting(plan), 2)
+        self.assertEqual(self.slots()[self.fast_far.id], ('A1', 'S1', 'B3'))
+        self.assertFalse(build_slotting_plan(period_days=30)['moved'].any())
+
+    def test_applied_plan_is_stable_with_ties_and_duplicates(self):
+        products = [self.fast, self.slow] + [
+            Product.objects.create(sku=f'SKU-1{i:03d}', name=f'Part {i}', category=self.category, price=Decimal('1.00'))
+            for i in range(12)
+        ]
+        # Equal-score boxes, boxes shared by several SKUs and SKUs in several slots
+        for i, product in enumerate(products):
+            for copy in range(1 + i % 3):
+                WarehouseLocation.objects.get_or_create(
+                    warehouse=self.warehouse, product=product, aisle=f'A{1 + (i + copy) % 3}', shelf=f'S{1 + copy}',
+                    box=f'B{1 + (i * 7 + copy) % 4}', defaults={'quantity': 1})
+            for _ in range(i % 4):
+                self.create_sale(product, self.store, 1)
+
+        self.assertTrue(apply_slotting(build_slotting_plan(period_days=30)))
+        self.assertFalse(build_slotting_plan(period_days=30)['moved'].any())
+
+    def test_rerun_is_noop_with_multi_location_products(self):
+        rng = np.random.default_rng(3)
+        slots = [(f'A{a}', f'S{s}', f'B{b}') for a in range(1, 3) for s in range(1, 3) for b in range(1, 3)]
+        rows, picks = [], []
+        for w in range(60):
+            for p in range(int(rng.integers(3, 10))):
+                for k in rng.choice(len(slots), int(rng.integers(1, 4)), replace=False):
+                    rows.append((len(rows) + 1, f'WH-{w}', f'ST-{w}', f'P-{p}', *slots[k], 1))
+                picks.append((f'ST-{w}', f'P-{p}', int(rng.integers(0, 6))))
+        frame = pd.DataFrame(rows, columns=LOCATION_COLUMNS)
+        picks = pd.DataFrame(picks, columns=['store_id', 'product_id', 'picks'])
+
+        plan = compute_slotting(frame, picks)
+        self.assertFalse(plan.duplicated(['warehouse_id', 'product_id', 'to_aisle', 'to_shelf', 'to_box']).any())
+        distance = plan[['score', 'new_score']].mul(plan['picks'], axis=0).groupby(plan['warehouse_id']).sum()
+        self.assertTrue((distance['new_score'] <= distance['score']).all())
+
+        applied = frame.assign(**{column: plan[f'to_{column}'].to_numpy() for column in ('aisle', 'shelf', 'box')})
+        self.assertFalse(compute_slotting(applied, picks)['moved'].any())
+
+    def test_apply_skips_locations_changed_since_planning(self):
+        plan = build_slotting_plan(period_days=30)
+        WarehouseLocation.objects.filter(pk=self.fast_far.pk).update(box='B9')
+
+        self.assertEqual(apply_slotting(plan), 1)
+        self.assertEqual(self.slots()[self.fast_far.id], ('A5', 'S5', 'B9'))
+        self.assertEqual(self.slots()[self.slow_near.id], ('A5', 'S5', 'B1'))
+
+    def test_apply_skips_products_whose_other_location_changed(self):
+        plan = build_slotting_plan(period_days=30)
+        # fast_far's target now holds the product's other location
+        WarehouseLocation.objects.filter(pk=self.fast_near.pk).update(aisle='A1', shelf='S1', box='B3')
+
+        self.assertEqual(apply_slotting(plan), 1)
+        self.assertEqual(self.slots()[self.fast_far.id], ('A5', 'S5', 'B1'))
+        self.assertEqual(self.slots()[self.slow_near.id], ('A5', 'S5', 'B1'))
+
+    def test_api_and_command(self):
+        self.assertEqual(self.client.get('/api/warehouses/slotting/').status_code, 403)
+        self.grant(self.user, 'edit_inventory')
+        data = self.client.get('/api/warehouses/slotting/', {'period': 30}).json()
+        self.assertEqual(data['summary']['moves'], 2)
+        self.assertLess(data['summary']['pick_distance_after'], data['summary']['pick_distance_before'])
+        self.assertEqual(data['rows'][0]['sku'], 'SKU-0001')
+        self.assertEqual(self.client.get('/api/warehouses/slotting/', {'period': 'x'}).status_code, 400)
+
+        before = self.slots()
+        call_command('slot_warehouses', '--dry-run', stdout=io.StringIO())
+        self.assertEqual(self.slots(), before)
+        call_command('slot_warehouses', '--warehouse', 'WH-001', stdout=io.StringIO())
+        self.assertEqual(self.slots()[self.slow_near.id], ('A5', 'S5', 'B1'))
@@ -1,16 +1,34 @@
 # users/urls.py
 from django.urls import path, include
 from . import views
+from .metrics import metrics_view
+from .profiling import profile_download, profile_list
 
 urlpatterns = [
     path('login/', views.login_view, name='login'),
     path('dashboard/', views.dashboard_view, name='dashboard'),
     path('logout/', views.logout_view, name='logout'),
     path('register/', views.register_view, name='register'),
+    path('metrics', metrics_view, name='metrics'),
+    path('api/profiles/', profile_list, name='profile_list'),
+    path('api/profiles/<str:name>/', profile_download, name='profile_download'),
     
     # APIs de dados
     path('api/inventory/', views.inventory_data, name='inventory_data'),
+    path('api/inventory/facets/', views.inventory_facets, name='inventory_facets'),
+    path('api/search/products/', views.product_typeahead, name='product_typeahead'),
+    path('api/kpis/inventory/', views.inventory_kpis, name='inventory_kpis'),
+    path('api/dashboard/bootstrap/', views.dashboard_bootstrap, name='dashboard_bootstrap'),
+    path('api/forecast/', views.demand_forecast, name='demand_forecast'),
+    path('api/replenishment/', views.replenishment_plan, name='replenishment_plan'),
+    path('api/import/<str:entity>/', views.import_data, name='import_data'),
+    path('api/stock/bulk/', views.stock_bulk_update, name='stock_bulk_update'),
+    path('api/stock/reservations/', views.stock_reservation_create, name='stock_reservation_create'),
+    path('api/stock/reservations/<int:reservation_id>/<str:action>/', views.stock_reservation_action,
+         name='stock_reservation_action'),
     path('api/warehouse/<str:sku>/', views.warehouse_location_data, name='warehouse_location'),
+    path('api/warehouses/slotting/', views.warehouse_slotting, name='warehouse_slotting'),
+    path('api/warehouses/<str:warehouse_id>/pick-list/', views.warehouse_pick_list, name='warehouse_pick_list'),
     path('api/sales/', views.sales_data, name='sales_data'),
     path('api/companies/', views.companies_api, name='companies_api'),
     
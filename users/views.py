@@ -9,16 +9,41 @@ from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
 from django.db.models import Sum, Count, Q, F
 from django.views.decorators.http import require_http_methods
-from datetime import datetime, date
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from datetime import datetime, time, timedelta
 import json
 import csv
 import io
 import pandas as pd
 
+from .bulk_stock import BulkStockError, apply_stock_lines
+from .daily_metrics import dashboard_summary
+from .dashboard import (
+    build_bootstrap, company_row, inventory_facets as build_inventory_facets, inventory_filters, inventory_row,
+    DEFAULT_PAGE_SIZE, FACET_TABLES, MAX_PAGE_SIZE, TABLES as DASHBOARD_TABLES
+)
+from .importer import InvalidImportFile, detect_format, import_file, ENTITIES as IMPORT_ENTITIES
+from .forecasting import (
+    get_forecasts, summarize_forecasts, LEVEL_FIELDS, SERIES_PARAMS, DEFAULT_LEVEL, DEFAULT_HORIZON
+)
 from .forms import CustomUserCreationForm
+from .kpi_engine import (
+    build_inventory_kpis, summarize_inventory_kpis, kpi_rows, inventory_filter_q, DEFAULT_PERIOD_DAYS
+)
+from .pick_path import PickListError, build_pick_list
+from .replenishment import (
+    ReplenishmentPolicy, build_replenishment_plan, summarize_replenishment, plan_rows
+)
+from .reservations import (
+    ReservationError, reserve_stock, release_reservation, confirm_reservation, reservation_payload
+)
+from .response_cache import bump_models, cached_response
+from .slotting import build_slotting_plan, move_rows, period_days_from_settings, summarize_slotting
+from .search import product_search_q, search_products, DEFAULT_LIMIT as SEARCH_LIMIT, MAX_LIMIT as MAX_SEARCH_LIMIT
 from .models import (
     Company, Store, Product, Inventory, Sale, 
-    WarehouseLocation, Warehouse, DashboardMetrics, Category
+    WarehouseLocation, Warehouse, Category, StockReservation
 )
 
 def login_view(request):
@@ -49,18 +74,7 @@ def logout_view(request):
 @login_required
 def dashboard_view(request):
     """Main dashboard view"""
-    # Get metrics for today
-    today = date.today()
-    try:
-        metrics = DashboardMetrics.objects.get(metric_date=today)
-    except DashboardMetrics.DoesNotExist:
-        metrics = DashboardMetrics.objects.create(
-            metric_date=today,
-            total_revenue=245820.50,
-            total_orders=1834,
-            total_products=8456,
-            active_customers=342
-        )
+    metrics = dashboard_summary()
     
     context = {
         'user': request.user,
@@ -83,76 +97,239 @@ def register_view(request):
 
 
 @login_required
+@cached_response('inventory', 'product', 'category', 'store', 'company')
 def inventory_data(request):
     """API to retrieve inventory data with filters"""
-    # Get filter parameters
-    search_query = request.GET.get('search', '')
-    store_filter = request.GET.get('store', 'all')
-    category_filter = request.GET.get('category', 'all')
-    stock_filter = request.GET.get('stock', 'all')
-    city_filter = request.GET.get('city', 'all')
-    company_filter = request.GET.get('company', 'all')
+    # Filters: search, store, category, city, company, stock (see dashboard.inventory_filters)
+    inventory_items = Inventory.objects.select_related('product__category', 'store', 'store__company')
+    inventory_items = inventory_items.filter(inventory_filters(request.GET))
     
-    # Base query
-    inventory_items = Inventory.objects.select_related('product', 'store', 'store__company')
+    # Prepare response data
+    data = [inventory_row(item) for item in inventory_items[:500]]  # Aumentar limite para 500 para incluir todos os países
     
-    # Apply filters
-    if search_query:
-        inventory_items = inventory_items.filter(
-            Q(product__name__icontains=search_query) |
-            Q(product__sku__icontains=search_query) |
-            Q(product__category__name__icontains=search_query)
+    return JsonResponse({'data': data})
+
+
+@login_required
+@cached_response(*FACET_TABLES)
+def inventory_facets(request):
+    """API with the values and row counts of every inventory filter, each under the other active filters"""
+    return JsonResponse({'facets': build_inventory_facets(request.GET)})
+
+
+@login_required
+@cached_response('product', 'category')
+def product_typeahead(request):
+    """API with the best matching products for a search box (?q=...&limit=10)"""
+    try:
+        limit = min(max(1, int(request.GET.get('limit', SEARCH_LIMIT))), MAX_SEARCH_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+    
+    return JsonResponse({'results': search_products(request.GET.get('q', ''), limit)})
+
+
+@login_required
+def inventory_kpis(request):
+    """API with inventory KPIs (turnover, days of supply, ABC, aging) computed by the KPI engine"""
+    filters = inventory_filter_q(
+        country=request.GET.get('store', 'all'),
+        city=request.GET.get('city', 'all'),
+        category=request.GET.get('category', 'all'),
+        company=request.GET.get('company', 'all'),
+    )
+    try:
+        period_days = max(1, int(request.GET.get('period', DEFAULT_PERIOD_DAYS)))
+        limit = min(max(0, int(request.GET.get('rows', 0))), 1000)
+    except ValueError:
+        return JsonResponse({'error': 'period and rows must be integers'}, status=400)
+    
+    kpis = build_inventory_kpis(filters, period_days)
+    data = {'summary': summarize_inventory_kpis(kpis, period_days)}
+    if limit:
+        data['rows'] = kpi_rows(kpis, limit)
+    
+    return JsonResponse(data)
+
+
+@login_required
+@cached_response(*DASHBOARD_TABLES)
+def dashboard_bootstrap(request):
+    """API with everything the dashboard needs on load: KPIs, filter facets, first inventory page, companies"""
+    try:
+        page_size = min(max(1, int(request.GET.get('page_size', DEFAULT_PAGE_SIZE))), MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'error': 'page_size must be an integer'}, status=400)
+    
+    return JsonResponse(build_bootstrap(page_size))
+
+
+@login_required
+def replenishment_plan(request):
+    """API with reorder points and suggested order quantities per product/store"""
+    filters = inventory_filter_q(
+        country=request.GET.get('store', 'all'),
+        city=request.GET.get('city', 'all'),
+        category=request.GET.get('category', 'all'),
+        company=request.GET.get('company', 'all'),
+    )
+    try:
+        policy = ReplenishmentPolicy.from_settings(
+            lead_time_days=float(request.GET['lead_time']) if 'lead_time' in request.GET else None,
+            review_period_days=float(request.GET['review_period']) if 'review_period' in request.GET else None,
+            service_level=float(request.GET['service_level']) if 'service_level' in request.GET else None,
+            period_days=max(1, int(request.GET['period'])) if 'period' in request.GET else None,
         )
+        limit = min(max(0, int(request.GET.get('rows', 100))), 1000)
+    except ValueError:
+        return JsonResponse({'error': 'lead_time, review_period, service_level, period and rows must be numbers'}, status=400)
+    try:
+        policy.validate()
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     
-    if store_filter != 'all':
-        inventory_items = inventory_items.filter(store__country=store_filter)
+    plan = build_replenishment_plan(filters, policy)
+    data = {'summary': summarize_replenishment(plan, policy)}
+    if limit:
+        data['rows'] = plan_rows(plan, limit, only_orders=request.GET.get('all') != '1')
     
-    if category_filter != 'all':
-        inventory_items = inventory_items.filter(product__category__name=category_filter)
+    return JsonResponse(data)
+
+
+@login_required
+def demand_forecast(request):
+    """API with per-series demand forecasts (exponential smoothing / seasonal naive)"""
+    level = request.GET.get('level', DEFAULT_LEVEL)
+    if level not in LEVEL_FIELDS:
+        return JsonResponse({'error': f"level must be one of {', '.join(LEVEL_FIELDS)}"}, status=400)
+    try:
+        horizon = min(max(1, int(request.GET.get('horizon', DEFAULT_HORIZON))), 90)
+        limit = min(max(1, int(request.GET.get('rows', 100))), 1000)
+    except ValueError:
+        return JsonResponse({'error': 'horizon and rows must be integers'}, status=400)
+    
+    # Optional sku / store filters on the series key components
+    filters = {
+        param: request.GET[param]
+        for param in (SERIES_PARAMS[field] for field in LEVEL_FIELDS[level])
+        if request.GET.get(param, 'all') != 'all'
+    }
+    forecasts = get_forecasts(level=level, horizon=horizon, filters=filters)
+    series = sorted(forecasts.values(), key=lambda item: item['forecast_total'], reverse=True)[:limit]
     
-    if city_filter != 'all':
-        inventory_items = inventory_items.filter(store__city=city_filter)
+    return JsonResponse({
+        'level': level,
+        'horizon': horizon,
+        'summary': summarize_forecasts(forecasts),
+        'series': series,
+    })
+
+
+def _manages_reservations(user):
+    """Admins and managers may confirm or release other users' reservations"""
+    return user.is_superuser or user_has_role(user, 'admin') or user_has_role(user, 'manager')
+
+
+@login_required
+@require_http_methods(["POST"])
+def stock_reservation_create(request):
+    """Reserve (decrement) stock for a multi-line order; safe to retry with the same Idempotency-Key"""
+    if not user_has_permission(request.user, 'edit_inventory'):
+        return JsonResponse({'error': 'Permission denied: edit_inventory'}, status=403)
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'Body must be a JSON object with "lines"'}, status=400)
     
-    if company_filter != 'all':
-        inventory_items = inventory_items.filter(store__company__company_id=company_filter)
-    
-    if stock_filter != 'all':
-        if stock_filter == 'in-stock':
-            inventory_items = inventory_items.filter(quantity__gt=20)
-        elif stock_filter == 'low-stock':
-            inventory_items = inventory_items.filter(quantity__lte=20, quantity__gt=0)
-        elif stock_filter == 'out-of-stock':
-            inventory_items = inventory_items.filter(quantity=0)
-        elif stock_filter == 'Low':
-            inventory_items = inventory_items.filter(quantity__lt=50)
-        elif stock_filter == 'Medium':
-            inventory_items = inventory_items.filter(quantity__gte=50, quantity__lt=200)
-        elif stock_filter == 'High':
-            inventory_items = inventory_items.filter(quantity__gte=200)
+    key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+    try:
+        reservation, created = reserve_stock(key, str(data.get('store', '')), data.get('lines') or [],
+                                             user=request.user)
+    except ReservationError as e:
+        return JsonResponse(e.payload(), status=e.status_code)
     
-    # Prepare response data
-    data = []
-    for item in inventory_items[:500]:  # Aumentar limite para 500 para incluir todos os países
-        # Determinar status
-        if item.quantity >= 200:
-            status = 'High'
-        elif item.quantity >= 50:
-            status = 'Medium'
+    return JsonResponse({'success': True, 'replayed': not created, 'reservation': reservation_payload(reservation)},
+                        status=201 if created else 200)
+
+
+@login_required
+@require_http_methods(["POST"])
+def stock_reservation_action(request, reservation_id, action):
+    """Confirm (create sales) or release (restock) a reservation"""
+    if action not in ('confirm', 'release'):
+        return JsonResponse({'error': 'Action must be confirm or release'}, status=404)
+    # Confirming creates sales, releasing puts stock back
+    permission = 'edit_sales' if action == 'confirm' else 'edit_inventory'
+    if not user_has_permission(request.user, permission):
+        return JsonResponse({'error': f'Permission denied: {permission}'}, status=403)
+    owner = StockReservation.objects.filter(pk=reservation_id).values_list('user_id', flat=True).first()
+    if owner != request.user.pk and not _manages_reservations(request.user):
+        return JsonResponse({'error': 'Reservation not found'}, status=404)
+    try:
+        if action == 'confirm':
+            reservation, sales = confirm_reservation(reservation_id)
+            extra = {'sales': [sale.sale_id for sale in sales]}
         else:
-            status = 'Low'
-        
-        data.append({
-            'id': item.id,
-            'sku': item.product.sku,
-            'name': item.product.name,
-            'category': item.product.category.name if item.product.category else 'N/A',
-            'store': item.store.country,
-            'stock': item.quantity,
-            'price': float(item.product.price),
-            'status': status,
-        })
-    
-    return JsonResponse({'data': data})
+            reservation = release_reservation(reservation_id, user=request.user)
+            extra = {}
+    except StockReservation.DoesNotExist:
+        return JsonResponse({'error': 'Reservation not found'}, status=404)
+    except ReservationError as e:
+        return JsonResponse(e.payload(), status=e.status_code)
+    
+    return JsonResponse({'success': True, 'reservation': reservation_payload(reservation), **extra})
+
+
+@login_required
+@require_http_methods(["POST"])
+def stock_bulk_update(request):
+    """Apply thousands of stock adjustments/transfers/counts in one transaction with per-line results"""
+    if not user_has_permission(request.user, 'edit_inventory'):
+        return JsonResponse({'error': 'Permission denied: edit_inventory'}, status=403)
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            raise BulkStockError('Body must be a JSON object with "lines"')
+        result = apply_stock_lines(data.get('lines'), user=request.user, reference=str(data.get('reference', '')),
+                                   atomic=bool(data.get('atomic', False)))
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    except BulkStockError as e:
+        return JsonResponse({'error': str(e)}, status=e.status_code)
+    
+    if result['applied']:
+        log_audit(request.user, 'update', 'Inventory', object_id=result['reference'],
+                  description=f"Bulk stock update: {result['applied']} lines applied, {result['rejected']} rejected",
+                  ip_address=request.META.get('REMOTE_ADDR'))
+    status = 409 if data.get('atomic') and result['rejected'] else 200
+    return JsonResponse(result, status=status)
+
+
+@login_required
+@require_http_methods(["POST"])
+def import_data(request, entity):
+    """Upload a CSV/Parquet file (multipart field `file`) of products, inventory, locations or sales"""
+    if entity not in IMPORT_ENTITIES:
+        return JsonResponse({'error': f"Unknown entity. Use: {', '.join(IMPORT_ENTITIES)}"}, status=404)
+    permission = 'edit_sales' if entity == 'sale' else 'edit_inventory'
+    if not user_has_permission(request.user, permission):
+        return JsonResponse({'error': f'Permission denied: {permission}'}, status=403)
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'error': 'No file uploaded'}, status=400)
+    
+    file_format = request.POST.get('format') or detect_format(upload.name)
+    try:
+        report = import_file(entity, upload, file_format)
+    except InvalidImportFile as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    log_audit(request.user, 'create', entity.capitalize(), object_id=upload.name,
+              description=f"Imported {report.rows_written} rows ({report.rows_rejected} rejected)",
+              ip_address=request.META.get('REMOTE_ADDR'))
+    return JsonResponse(report.as_dict())
 
 
 @login_required
@@ -189,15 +366,77 @@ def warehouse_location_data(request, sku):
 
 
 @login_required
+@require_http_methods(["POST"])
+def warehouse_pick_list(request, warehouse_id):
+    """Locations and walking route for a multi-line order picked in one warehouse"""
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'Body must be a JSON object with "lines"'}, status=400)
+    
+    try:
+        pick_list = build_pick_list(warehouse_id, data.get('lines') or [])
+    except Warehouse.DoesNotExist:
+        return JsonResponse({'error': 'Warehouse not found'}, status=404)
+    except PickListError as e:
+        return JsonResponse(e.payload(), status=e.status_code)
+    
+    return JsonResponse(pick_list)
+
+
+@login_required
+def warehouse_slotting(request):
+    """API previewing the slotting plan: fast-moving SKUs moved to the most accessible slots"""
+    if not user_has_permission(request.user, 'edit_inventory'):
+        return JsonResponse({'error': 'Permission denied: edit_inventory'}, status=403)
+    try:
+        period_days = max(1, int(request.GET['period'])) if 'period' in request.GET else period_days_from_settings()
+        limit = min(max(0, int(request.GET.get('rows', 100))), 1000)
+    except ValueError:
+        return JsonResponse({'error': 'period and rows must be integers'}, status=400)
+    
+    plan = build_slotting_plan(request.GET.getlist('warehouse'), period_days)
+    data = {'summary': summarize_slotting(plan, period_days)}
+    if limit:
+        data['rows'] = move_rows(plan, limit)
+    
+    return JsonResponse(data)
+
+
+def _date_param(request, key):
+    """Optional ISO date query parameter (ValueError if malformed)"""
+    value = request.GET.get(key)
+    if not value:
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(f'{key} must be a date')
+    return parsed
+
+
+@login_required
+@cached_response('sale', 'store', 'company', 'product', 'category')
 def sales_data(request):
-    """API for sales data with filters"""
+    """API for sales data with filters, one row per month (`period`) in chronological order
+
+    `start` and `end` (ISO dates, inclusive) bound the sale dates: a range scan on the sale_date index.
+    """
     city_filter = request.GET.get('city', 'all')
     company_filter = request.GET.get('company', 'all')
     store_filter = request.GET.get('store', 'all')
     product_filter = request.GET.get('product', 'all')
+    try:
+        start, end = _date_param(request, 'start'), _date_param(request, 'end')
+    except ValueError:
+        return JsonResponse({'error': 'start and end must be dates (YYYY-MM-DD)'}, status=400)
     
-    # Base query - group sales by month and country
-    sales = Sale.objects.select_related('store', 'product')
+    sales = Sale.objects.all()
+    if start:
+        sales = sales.filter(sale_date__gte=timezone.make_aware(datetime.combine(start, time.min)))
+    if end:
+        sales = sales.filter(sale_date__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)))
     
     # Apply filters
     if city_filter != 'all':
@@ -212,15 +451,18 @@ def sales_data(request):
     if product_filter != 'all':
         sales = sales.filter(product__category__name=product_filter)
     
-    # Group by month and country
-    sales_by_month = {}
-    for sale in sales:
-        month = sale.month
-        country = sale.store.country.lower()
+    # Group by period and country in the database
+    totals = (sales.values('period', 'store__country').annotate(total=Sum('total_amount'))
+              .order_by('period', 'store__country'))
+    sales_by_period = {}
+    for row in totals:
+        period = row['period']
+        country = row['store__country'].lower()
         
-        if month not in sales_by_month:
-            sales_by_month[month] = {
-                'month': month,
+        if period not in sales_by_period:
+            sales_by_period[period] = {
+                'month': period.strftime('%b'),
+                'period': period.isoformat(),
                 'germany': 0,
                 'france': 0,
                 'italy': 0,
@@ -228,32 +470,24 @@ def sales_data(request):
                 'netherlands': 0,
             }
         
-        if country in sales_by_month[month]:
-            sales_by_month[month][country] += float(sale.total_amount)
+        if country in sales_by_period[period]:
+            sales_by_period[period][country] += float(row['total'])
     
-    data = list(sales_by_month.values())
+    data = list(sales_by_period.values())
     return JsonResponse({'data': data})
 
 
 @login_required
+@cached_response('company')
 def companies_api(request):
     """API para listar empresas em JSON"""
     companies = Company.objects.all().select_related('parent')
-    companies_list = []
-    for company in companies:
-        companies_list.append({
-            'id': str(company.company_id),
-            'name': company.name,
-            'parent_name': company.parent.name if company.parent else None,
-            'city': company.city,
-            'country': company.country,
-            'ownership': 100 if not company.parent else 50,  # Mock ownership %
-            'status': company.status
-        })
+    companies_list = [company_row(company) for company in companies]
     return JsonResponse(companies_list, safe=False)
 
 
 @login_required
+@cached_response('company')
 def company_list(request):
     """View para listar empresas"""
     country_filter = request.GET.get('country', 'all')
@@ -422,6 +656,7 @@ def company_merge(request):
     
     # Transferir subsidiárias
     Company.objects.filter(parent=source).update(parent=target)
+    bump_models(Store, Company)
     
     # Deletar source company
     source.delete()
@@ -447,7 +682,7 @@ def export_inventory(request):
     company_filter = request.GET.get('company', '').strip()
     
     if search:
-        filters &= Q(product__name__icontains=search) | Q(product__sku__icontains=search)
+        filters &= product_search_q(search)
     if store_filter:
         filters &= Q(store__country=store_filter)
     if category_filter:
@@ -543,7 +778,7 @@ from .serializers import (
     UserDetailSerializer, AuditLogSerializer, NotificationSerializer
 )
 from .models import Permission, Role, UserRole, AuditLog, Notification
-from .rbac_utils import require_permission, user_has_permission, log_audit
+from .rbac_utils import require_permission, user_has_permission, user_has_role, log_audit
 
 
 class PermissionViewSet(viewsets.ReadOnlyModelViewSet):